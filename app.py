@@ -5,21 +5,25 @@ import sys, os
 os.environ["G_MESSAGES_DEBUG"] = ""
 
 from app import create_app
-from app.database import init_db
 
-app = create_app()
-
-# ------------------------------------------------------------
-# SECRET KEY (required for flash messages, sessions, logins)
-# ------------------------------------------------------------
-app.secret_key = "rasesh_super_secret_key_2025"   # You can change this anytime
+# Spawned process-pool workers (OCR, batch redaction, invoice PDFs)
+# re-run this file as __mp_main__; they import only what their task
+# needs, so they skip building the app.
+if __name__ != "__mp_main__":
+    # With debug=True the reloader runs this file in a watcher process and
+    # again in the serving child (WERKZEUG_RUN_MAIN=true); only the child
+    # should spend memory preloading the AI models.
+    app = create_app(
+        preload_models=__name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    )
+
+    # ------------------------------------------------------------
+    # SECRET KEY (required for flash messages, sessions, logins)
+    # ------------------------------------------------------------
+    app.secret_key = "rasesh_super_secret_key_2025"   # You can change this anytime
 
 if __name__ == "__main__":
 
-    # Initialize DB inside app context
-    with app.app_context():
-        init_db()
-
     print("=" * 60)
     print("🚀 Rasesh IM PDF CRM Generator")
     print("=" * 60)
@@ -27,6 +31,7 @@ if __name__ == "__main__":
     print("📁 Uploads:   uploads/")
     print("📁 Output:    output/")
     print("📁 Database:  database.db")
+    print(f"⏱  Startup:   {app.config['STARTUP_SECONDS']:.3f}s")
     print("=" * 60)
 
     app.run(debug=True, host="0.0.0.0", port=5000)
@@ -1,8 +1,11 @@
 import os
+import time
 from flask import Flask, render_template
 
 
-def create_app():
+def create_app(preload_models=True):
+    started = time.perf_counter()
+
     # Root-level templates and static folders
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     template_dir = os.path.join(base_dir, "templates")
@@ -18,6 +21,19 @@ def create_app():
     app.config["OUTPUT_FOLDER"] = os.path.join(base_dir, "output")
     app.config["DATABASE"] = os.path.join(base_dir, "database.db")
 
+    # Per-file upload limit (storage.save_upload). Werkzeug refuses any
+    # request body beyond it (plus room for the multipart envelope) with
+    # 413 while parsing, before an oversized upload is spooled to disk.
+    app.config["MAX_UPLOAD_BYTES"] = 200 * 1024 * 1024
+    app.config["MAX_CONTENT_LENGTH"] = app.config["MAX_UPLOAD_BYTES"] + 1024 * 1024
+
+    # Server folders POST /redactor/batch may read a "directory" from;
+    # add more here (e.g. a certificates share) to allow them
+    app.config["BATCH_REDACTION_ROOTS"] = [
+        app.config["UPLOAD_FOLDER"],
+        app.config["OUTPUT_FOLDER"],
+    ]
+
     # ------------------------------------------------------------
     # Ensure required folders exist
     # ------------------------------------------------------------
@@ -31,7 +47,8 @@ def create_app():
     # ------------------------------------------------------------
     # Initialize database INSIDE app context
     # ------------------------------------------------------------
-    from .database import init_db
+    from .database import init_app, init_db
+    init_app(app)
     with app.app_context():
         init_db()
 
@@ -63,6 +80,15 @@ def create_app():
     app.register_blueprint(invoice_items_bp)
     app.register_blueprint(signature_bp)
 
+    # ------------------------------------------------------------
+    # Oversized request bodies (MAX_CONTENT_LENGTH)
+    # ------------------------------------------------------------
+    @app.errorhandler(413)
+    def request_too_large(e):
+        from .services.api import api_error
+        limit = app.config["MAX_UPLOAD_BYTES"] // (1024 * 1024)
+        return api_error(f"File too large (limit {limit} MB)"), 413
+
     # ------------------------------------------------------------
     # Dashboard page
     # ------------------------------------------------------------
@@ -76,5 +102,17 @@ def create_app():
     def settings_page():
         return render_template("settings.html")
 
+    # ------------------------------------------------------------
+    # Load + warm up AI models in the background
+    # ------------------------------------------------------------
+    if preload_models:
+        from .services.model_registry import preload_models as start_preload
+        from .services.settings import load_settings
+        with app.app_context():
+            if load_settings().get("preload_models", True):
+                start_preload(app)
+
+    app.config["STARTUP_SECONDS"] = time.perf_counter() - started
+    app.logger.info("App ready in %.3fs", app.config["STARTUP_SECONDS"])
 
     return app
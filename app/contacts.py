@@ -272,25 +272,20 @@ from flask import (
     Blueprint, render_template, request, redirect,
     url_for, current_app, send_file, jsonify, flash
 )
-import sqlite3
 import os
 from werkzeug.utils import secure_filename
 import xlsxwriter
 from datetime import datetime, date
 from io import BytesIO
 import csv
+import json
+from app.database import get_conn
+from app.services.api import api_ok
+from app.services.pagination import page_args, split_page, wants_json, pager
 
 contacts_bp = Blueprint("contacts", __name__, url_prefix="/contacts")
 
 
-def get_conn():
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    ensure_contact_extra_tables(conn)
-    return conn
-
-
 def get_upload_folder():
     base = os.path.join(current_app.root_path, "uploads", "contacts")
     os.makedirs(base, exist_ok=True)
@@ -312,107 +307,36 @@ def avatar_color(name):
     return f"rgb({r},{g},{b})"
 
 
-# ------------------------------------------------------------
-# DB: ENSURE EXTRA TABLES (ADD-ONLY, SAFE)
-# ------------------------------------------------------------
-def ensure_contact_extra_tables(conn: sqlite3.Connection):
-    c = conn.cursor()
-
-    # Tags (already used, but ensure)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS contact_tags (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS contact_tag_map (
-            contact_id INTEGER NOT NULL,
-            tag_id INTEGER NOT NULL,
-            UNIQUE(contact_id, tag_id)
-        )
-    """)
-
-    # Notes (already used, but ensure)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS contact_notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            contact_id INTEGER NOT NULL,
-            timestamp TEXT NOT NULL,
-            note_text TEXT NOT NULL
-        )
-    """)
-
-    # Files
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS contact_files (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            contact_id INTEGER NOT NULL,
-            filename TEXT NOT NULL,
-            stored_path TEXT NOT NULL,
-            uploaded_at TEXT NOT NULL
-        )
-    """)
-
-    # Reminders
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS contact_reminders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            contact_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            due_date TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'open'
-        )
-    """)
-
-    # Email templates
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS contact_email_templates (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            subject TEXT NOT NULL,
-            body TEXT NOT NULL
-        )
-    """)
-
-    # Activity log (for enhanced timeline)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS contact_activity_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            contact_id INTEGER NOT NULL,
-            timestamp TEXT NOT NULL,
-            type TEXT NOT NULL,
-            description TEXT NOT NULL
-        )
-    """)
-
-    # Merge log
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS contact_merge_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            primary_contact_id INTEGER NOT NULL,
-            merged_contact_id INTEGER NOT NULL,
-            merged_at TEXT NOT NULL
-        )
-    """)
-
-    conn.commit()
-
-
 # -------------------------
 # TAG HELPERS
 # -------------------------
-def get_tags_for_contact(contact_id):
+def get_tags_for_contacts(contact_ids):
+    """
+    Load tags for many contacts in a single query.
+    Returns {contact_id: [tag names sorted by name]}; contacts without
+    tags map to an empty list. The ids are passed as one JSON array
+    parameter, so the list size is not bound by SQLite's variable limit.
+    """
+    tags_by_contact = {cid: [] for cid in contact_ids}
+    if not tags_by_contact:
+        return tags_by_contact
+
     with get_conn() as conn:
-        c = conn.cursor()
-        rows = c.execute("""
-            SELECT t.name
-            FROM contact_tags t
-            JOIN contact_tag_map m ON m.tag_id = t.id
-            WHERE m.contact_id = ?
+        rows = conn.execute("""
+            SELECT m.contact_id, t.name
+            FROM contact_tag_map m
+            JOIN contact_tags t ON t.id = m.tag_id
+            WHERE m.contact_id IN (SELECT value FROM json_each(?))
             ORDER BY t.name
-        """, (contact_id,)).fetchall()
-    return [r["name"] for r in rows]
+        """, (json.dumps(list(tags_by_contact)),)).fetchall()
+
+    for r in rows:
+        tags_by_contact[r["contact_id"]].append(r["name"])
+    return tags_by_contact
+
+
+def get_tags_for_contact(contact_id):
+    return get_tags_for_contacts([contact_id])[contact_id]
 
 
 def set_tags_for_contact(contact_id, tags_csv):
@@ -478,10 +402,15 @@ def get_activity_for_contact(contact_id):
     return rows
 
 # ------------------------------------------------------------
-# CONTACT LIST (WITH TAG FILTERING)
+# CONTACT LIST (WITH TAG FILTERING, KEYSET PAGINATION)
 # ------------------------------------------------------------
 @contacts_bp.route("/")
 def contacts_list():
+    """
+    Contact list, newest first.
+    Query params: ?search=&tag= plus ?cursor=<last id>&limit=<n>&format=json
+    """
+    cursor, limit = page_args()
     search = request.args.get("search", "").strip()
     tag_filter = request.args.get("tag", "").strip()
 
@@ -489,7 +418,7 @@ def contacts_list():
         c = conn.cursor()
 
         base_query = """
-            SELECT id, first_name_contact, last_name_contact,
+            SELECT contacts.id AS id, first_name_contact, last_name_contact,
                    email_contact, phone_contact, company_contact, position_contact,
                    status, pipeline_stage
             FROM contacts
@@ -513,16 +442,24 @@ def contacts_list():
             where_clauses.append("t.name = ?")
             params.append(tag_filter)
 
+        if cursor is not None:
+            where_clauses.append("contacts.id < ?")
+            params.append(cursor)
+
         if where_clauses:
             base_query += " WHERE " + " AND ".join(where_clauses)
 
-        base_query += " ORDER BY contacts.id DESC"
+        base_query += " ORDER BY contacts.id DESC LIMIT ?"
+        params.append(limit + 1)
 
         rows = c.execute(base_query, tuple(params)).fetchall()
+        rows, next_cursor = split_page(rows, limit)
+
+    tags_by_contact = get_tags_for_contacts([r["id"] for r in rows])
 
     contacts = []
     for r in rows:
-        tags = get_tags_for_contact(r["id"])
+        tags = tags_by_contact[r["id"]]
 
         # SAFE ACCESS — sqlite3.Row does NOT support .get()
         status = r["status"] if "status" in r.keys() else "active"
@@ -544,6 +481,9 @@ def contacts_list():
             }
         )
 
+    if wants_json():
+        return api_ok(contacts=contacts, next_cursor=next_cursor, limit=limit)
+
     all_tags = get_all_tags()
 
     return render_template(
@@ -551,7 +491,8 @@ def contacts_list():
         contacts=contacts,
         search=search,
         tag_filter=tag_filter,
-        all_tags=all_tags
+        all_tags=all_tags,
+        pager=pager(cursor, next_cursor)
     )
 
 # ------------------------------------------------------------
@@ -1007,10 +948,15 @@ def export_all_contacts():
     headers = rows[0].keys() if rows else []
     for col, h in enumerate(headers):
         sheet.write(0, col, h)
+    if headers:
+        sheet.write(0, len(headers), "tags")
+
+    tags_by_contact = get_tags_for_contacts([r["id"] for r in rows])
 
     for row_idx, r in enumerate(rows, start=1):
         for col_idx, h in enumerate(headers):
             sheet.write(row_idx, col_idx, r[h])
+        sheet.write(row_idx, len(headers), ", ".join(tags_by_contact[r["id"]]))
 
     workbook.close()
 
@@ -1293,6 +1239,7 @@ def pipeline_board():
 
     stages = ["new", "contacted", "qualified", "proposal", "won", "lost"]
     board = {s: [] for s in stages}
+    tags_by_contact = get_tags_for_contacts([r["id"] for r in rows])
 
     for r in rows:
         full_name = f"{r['first_name_contact']} {r['last_name_contact']}".strip()
@@ -1301,6 +1248,7 @@ def pipeline_board():
             "name": full_name,
             "company": r["company_contact"],
             "status": r["status"],
+            "tags": tags_by_contact[r["id"]],
             "avatar_color": avatar_color(full_name)
         })
 
@@ -1311,29 +1259,83 @@ def pipeline_board():
 # ------------------------------------------------------------
 @contacts_bp.route("/companies")
 def companies():
+    """
+    Contacts grouped by company, companies sorted case-insensitively.
+    Pages count companies, not contacts: ?cursor=<last company>&limit=<n>
+    (plus &format=json).
+    """
+    cursor, limit = page_args(cast=str)
+
     with get_conn() as conn:
         c = conn.cursor()
-        rows = c.execute("""
-            SELECT
-                COALESCE(company_contact, '') AS company,
-                id, first_name_contact, last_name_contact,
-                email_contact, phone_contact, position_contact
+
+        # 1) One page of company names: a range seek on idx_contacts_company
+        # (keyed on the sort key), so the cost does not grow with the table
+        company_query = """
+            SELECT COALESCE(company_contact, '') AS company
             FROM contacts
-            ORDER BY company_contact, last_name_contact, first_name_contact
-        """).fetchall()
+        """
+        params = {"limit": limit + 1}
+        if cursor is not None:
+            company_query += """
+            WHERE lower(COALESCE(company_contact, '')) >= lower(:cursor)
+              AND (lower(COALESCE(company_contact, '')) > lower(:cursor)
+                   OR COALESCE(company_contact, '') > :cursor)
+            """
+            params["cursor"] = cursor
+        company_query += """
+            GROUP BY lower(COALESCE(company_contact, '')), COALESCE(company_contact, '')
+            ORDER BY lower(COALESCE(company_contact, '')), COALESCE(company_contact, '')
+            LIMIT :limit
+        """
 
-    companies_map = {}
+        company_rows = c.execute(company_query, params).fetchall()
+        company_rows, next_cursor = split_page(company_rows, limit, key="company")
+        page_companies = [r["company"] for r in company_rows]
+
+        # 2) Contacts for just those companies (same index, bounded by the page)
+        rows = []
+        if page_companies:
+            rows = c.execute("""
+                SELECT
+                    COALESCE(company_contact, '') AS company,
+                    id, first_name_contact, last_name_contact,
+                    email_contact, phone_contact, position_contact
+                FROM contacts
+                WHERE lower(COALESCE(company_contact, '')) BETWEEN lower(:first) AND lower(:last)
+                  AND COALESCE(company_contact, '') IN (SELECT value FROM json_each(:companies))
+                ORDER BY last_name_contact, first_name_contact
+            """, {
+                "first": page_companies[0],
+                "last": page_companies[-1],
+                "companies": json.dumps(page_companies),
+            }).fetchall()
+
+    tags_by_contact = get_tags_for_contacts([r["id"] for r in rows])
+
+    companies_map = {company: [] for company in page_companies}
     for r in rows:
-        company = r["company"] or "(No Company)"
-        companies_map.setdefault(company, [])
-        companies_map[company].append(r)
+        companies_map[r["company"]].append(dict(r, tags=tags_by_contact[r["id"]]))
 
-    # Sort companies by name
-    sorted_companies = sorted(companies_map.items(), key=lambda x: x[0].lower())
+    sorted_companies = [
+        (company or "(No Company)", people)
+        for company, people in companies_map.items()
+    ]
+
+    if wants_json():
+        return api_ok(
+            companies=[
+                {"company": company, "contacts": people}
+                for company, people in sorted_companies
+            ],
+            next_cursor=next_cursor,
+            limit=limit,
+        )
 
     return render_template(
         "contacts/companies.html",
-        companies=sorted_companies
+        companies=sorted_companies,
+        pager=pager(cursor, next_cursor)
     )
 
 # ------------------------------------------------------------
@@ -1504,3 +1506,87 @@ def use_email_template(template_id, contact_id):
         template=template,
         filled_body=filled_body
     )
+
+
+# ------------------------------------------------------------
+# TAG LOADER BENCHMARK
+# ------------------------------------------------------------
+def benchmark_tag_loading(app, contacts=10000, tags_per_contact=3):
+    """
+    Seed a scratch copy of the database with `contacts` contacts and
+    `tags_per_contact` tags each, then load every contact's tags one
+    contact at a time (the old N+1 pattern) and with the batched
+    loader. Returns {"per_contact_s", "batched_s", "queries_saved"}.
+    """
+    import shutil
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        shutil.copyfile(app.config["DATABASE"], db_path)
+        original_db = app.config["DATABASE"]
+        app.config["DATABASE"] = db_path
+        try:
+            with app.app_context():
+                conn = get_conn()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO contact_tags(name) VALUES (?)",
+                    [(f"bench-tag-{i}",) for i in range(20)],
+                )
+                tag_ids = [
+                    r["id"] for r in conn.execute(
+                        "SELECT id FROM contact_tags WHERE name LIKE 'bench-tag-%'"
+                    )
+                ]
+                first_id = conn.execute(
+                    "SELECT COALESCE(MAX(id), 0) + 1 FROM contacts"
+                ).fetchone()[0]
+                ids = list(range(first_id, first_id + contacts))
+                conn.executemany(
+                    "INSERT INTO contacts(id, first_name_contact, last_name_contact) VALUES (?, ?, ?)",
+                    [(cid, "Bench", f"Contact {cid}") for cid in ids],
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO contact_tag_map(contact_id, tag_id) VALUES (?, ?)",
+                    [
+                        (cid, tag_ids[(cid + k) % len(tag_ids)])
+                        for cid in ids
+                        for k in range(tags_per_contact)
+                    ],
+                )
+                conn.commit()
+
+                started = time.perf_counter()
+                one_by_one = {cid: get_tags_for_contact(cid) for cid in ids}
+                per_contact = time.perf_counter() - started
+
+                started = time.perf_counter()
+                batched = get_tags_for_contacts(ids)
+                batched_s = time.perf_counter() - started
+
+                if batched != one_by_one:
+                    raise AssertionError("batched tag loader returned different tags")
+        finally:
+            app.config["DATABASE"] = original_db
+
+    return {
+        "per_contact_s": round(per_contact, 4),
+        "batched_s": round(batched_s, 4),
+        "queries_saved": contacts - 1,
+    }
+
+
+if __name__ == "__main__":
+    # python -m app.contacts [contacts] [tags_per_contact]
+    import sys
+
+    from app import create_app
+
+    args = [int(a) for a in sys.argv[1:3]]
+    contacts, tags = args + [10000, 3][len(args):]
+
+    r = benchmark_tag_loading(create_app(preload_models=False), contacts, tags)
+    print(f"{contacts} contacts x {tags} tags")
+    print(f"one query per contact   {r['per_contact_s']}s")
+    print(f"batched loader          {r['batched_s']}s ({r['queries_saved']} fewer queries)")
@@ -1,101 +1,46 @@
-import sqlite3
-import os
-from flask import current_app
 from datetime import datetime, timedelta
-
-
-def get_conn():
-    """Return a SQLite connection using the app's configured DB path."""
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+from app.database import get_conn
 
 
 def get_dashboard_stats():
-    """Return all dashboard statistics."""
+    """
+    Return all dashboard statistics.
+    Counts and revenue come from the trigger-maintained summary tables
+    (dashboard_counters and revenue_rollup, see migrations 008 and 009),
+    so the cost does not grow with the invoices table.
+    """
     conn = get_conn()
     c = conn.cursor()
 
-    # -----------------------------
-    # TOTAL COUNTS
-    # -----------------------------
-    try:
-        c.execute("SELECT COUNT(*) AS c FROM vendors")
-        total_vendors = c.fetchone()["c"]
-    except:
-        total_vendors = 0
-
-    try:
-        c.execute("SELECT COUNT(*) AS c FROM contacts")
-        total_contacts = c.fetchone()["c"]
-    except:
-        total_contacts = 0
-
-    try:
-        c.execute("SELECT COUNT(*) AS c FROM invoices")
-        total_invoices = c.fetchone()["c"]
-    except:
-        total_invoices = 0
-
-    try:
-        c.execute("SELECT COUNT(*) AS c FROM manifests")
-        total_manifests = c.fetchone()["c"]
-    except:
-        total_manifests = 0
-
-    # -----------------------------
-    # REVENUE TOTAL
-    # -----------------------------
-    try:
-        c.execute("SELECT SUM(total) AS s FROM invoices")
-        total_revenue = c.fetchone()["s"] or 0
-    except:
-        total_revenue = 0
+    cutoff = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
 
     # -----------------------------
-    # REVENUE LAST 30 DAYS
+    # COUNTS + REVENUE (one query)
     # -----------------------------
-    try:
-        cutoff = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-        c.execute(
-            "SELECT SUM(total) AS s FROM invoices WHERE date >= ?",
-            (cutoff,)
-        )
-        monthly_revenue = c.fetchone()["s"] or 0
-    except:
-        monthly_revenue = 0
+    c.execute("""
+        SELECT
+            MAX(CASE WHEN name = 'vendors' THEN value END) AS total_vendors,
+            MAX(CASE WHEN name = 'contacts' THEN value END) AS total_contacts,
+            MAX(CASE WHEN name = 'invoices' THEN value END) AS total_invoices,
+            MAX(CASE WHEN name = 'manifests' THEN value END) AS total_manifests,
+            MAX(CASE WHEN name = 'revenue' THEN value END) AS total_revenue,
+            (SELECT SUM(revenue) FROM revenue_rollup WHERE day >= ?) AS monthly_revenue
+        FROM dashboard_counters
+    """, (cutoff,))
+    row = c.fetchone()
 
     # -----------------------------
     # RECENT INVOICES (limit 10)
     # -----------------------------
-    try:
-        c.execute("""
-            SELECT invoices.id,
-                   invoices.num,
-                   invoices.date,
-                   invoices.total,
-                   invoices.invoice_type,
-                   invoices.pdf,
-                   vendors.name AS vendor
-            FROM invoices
-            LEFT JOIN vendors ON vendors.id = invoices.vendor_id
-            ORDER BY invoices.id DESC
-            LIMIT 10
-        """)
-        recent_invoices = c.fetchall()
-    except:
-        recent_invoices = []
-
-    conn.close()
+    recent_invoices = get_recent_invoices()
 
     return {
-        "total_vendors": total_vendors,
-        "total_contacts": total_contacts,
-        "total_invoices": total_invoices,
-        "total_manifests": total_manifests,
-        "total_revenue": total_revenue,
-        "monthly_revenue": monthly_revenue,
+        "total_vendors": int(row["total_vendors"] or 0),
+        "total_contacts": int(row["total_contacts"] or 0),
+        "total_invoices": int(row["total_invoices"] or 0),
+        "total_manifests": int(row["total_manifests"] or 0),
+        "total_revenue": round(row["total_revenue"] or 0, 2),
+        "monthly_revenue": round(row["monthly_revenue"] or 0, 2),
         "recent_invoices": recent_invoices,
     }
 
@@ -119,5 +64,4 @@ def get_recent_invoices():
     """)
 
     rows = c.fetchall()
-    conn.close()
     return rows
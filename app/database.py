@@ -1,319 +1,1004 @@
 import sqlite3
 import os
-from flask import current_app
+from datetime import datetime
+from flask import current_app, g
 
 
-def get_conn():
-    """Return a SQLite connection using the app's configured DB path."""
-    db_path = current_app.config["DATABASE"]
+# ------------------------------------------------------------
+# CONNECTION TUNING
+# ------------------------------------------------------------
+# Applied to every new connection. journal_mode=WAL is persistent in the
+# database file, so it is set once in init_db() instead.
+SQLITE_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -20000,        # ~20 MB page cache (negative = KiB)
+    "mmap_size": 268435456,      # 256 MB memory-mapped reads
+    "temp_store": "MEMORY",
+}
+
+
+def connect(db_path=None):
+    """
+    Open a new, tuned SQLite connection.
+    Only use this directly for work that runs outside a Flask
+    app context (worker processes, CLI scripts); routes and helpers
+    should call get_conn() so they share one connection.
+    """
+    db_path = db_path or current_app.config["DATABASE"]
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
+    for name, value in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
     return conn
 
 
-def init_db():
-    """Create all required tables if they do not exist and align schemas."""
-    with get_conn() as conn:
-        c = conn.cursor()
-
-        # -------------------------
-        # INVOICES
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS invoices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                num TEXT,
-                date TEXT,
-                vendor_id INTEGER,
-                invoice_type TEXT,
-                comments TEXT,
-                terms_conditions TEXT,
-                sig_id INTEGER,
-                ship_cost REAL,
-                tax_rate REAL,
-                tax REAL,
-                subtotal REAL,
-                total REAL,
-                pdf TEXT,
-                gst_number TEXT,
-                ship_method TEXT,
-                ship_terms TEXT,
-                delivery_date TEXT,
-                template TEXT,
-                FOREIGN KEY(vendor_id) REFERENCES vendors(id)
-            )
-        """)
+def get_conn():
+    """
+    Return the SQLite connection for the current app context.
+    The connection is opened on first use and reused by every helper
+    during the same request (or thread with its own app context), then
+    closed by close_conn() on teardown.
+    """
+    conn = g.get("_db_conn")
+    if conn is None:
+        conn = g._db_conn = connect()
+    return conn
 
-        # -------------------------
-        # INVOICE ITEMS
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS invoice_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                invoice_id INTEGER,
-                lot_number TEXT,
-                item TEXT,
-                qty REAL,
-                units TEXT,
-                unit_price REAL,
-                line_total REAL,
-                FOREIGN KEY(invoice_id) REFERENCES invoices(id)
-            )
-        """)
 
-        # -------------------------
-        # MANIFESTS
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS manifests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                num TEXT,
-                date TEXT,
-                carrier TEXT,
-                delivery TEXT,
-                ship_from TEXT,
-                ship_to TEXT,
-                contact_name TEXT,
-                ship_method TEXT,
-                sig_id INTEGER,
-                total_weight REAL,
-                pdf TEXT
-            )
-        """)
+def close_conn(exc=None):
+    """Close the app-context connection, if one was opened."""
+    conn = g.pop("_db_conn", None)
+    if conn is not None:
+        conn.close()
 
-        # -------------------------
-        # MANIFEST ITEMS
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS manifest_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                manifest_id INTEGER,
-                item TEXT,
-                lot TEXT,
-                weight REAL,
-                FOREIGN KEY(manifest_id) REFERENCES manifests(id)
-            )
-        """)
 
-        # -------------------------
-        # CONTACTS
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                phone TEXT,
-                email TEXT,
-                address TEXT,
-                first_name_contact TEXT,
-                last_name_contact TEXT,
-                email_contact TEXT,
-                phone_contact TEXT,
-                company_contact TEXT,
-                position_contact TEXT,
-                address_contact TEXT,
-                notes_contact TEXT,
-                website_contact TEXT,
-                business_card_front_contact TEXT,
-                business_card_back_contact TEXT,
-                face_image_contact TEXT,
-                company_logo_contact TEXT
-            )
-        """)
+def init_app(app):
+    """Register connection teardown on the Flask app."""
+    app.teardown_appcontext(close_conn)
 
-        # CONTACT MIGRATIONS
-        existing_contact_cols = {
-            row[1] for row in c.execute("PRAGMA table_info(contacts);").fetchall()
-        }
-
-        required_contact_cols = {
-            "first_name_contact": "TEXT",
-            "last_name_contact": "TEXT",
-            "email_contact": "TEXT",
-            "phone_contact": "TEXT",
-            "company_contact": "TEXT",
-            "position_contact": "TEXT",
-            "address_contact": "TEXT",
-            "notes_contact": "TEXT",
-            "website_contact": "TEXT",
-            "business_card_front_contact": "TEXT",
-            "business_card_back_contact": "TEXT",
-            "face_image_contact": "TEXT",
-            "company_logo_contact": "TEXT",
-        }
-
-        for col, col_type in required_contact_cols.items():
-            if col not in existing_contact_cols:
-                c.execute(f"ALTER TABLE contacts ADD COLUMN {col} {col_type};")
-
-        # -------------------------
-        # CONTACT NOTES
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS contact_notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                contact_id INTEGER NOT NULL,
-                timestamp TEXT NOT NULL,
-                note_text TEXT NOT NULL,
-                FOREIGN KEY(contact_id) REFERENCES contacts(id)
-            )
-        """)
 
-        # -------------------------
-        # CONTACT TAGS
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS contact_tags (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL
-            )
-        """)
+# ------------------------------------------------------------
+# MIGRATIONS
+# ------------------------------------------------------------
+# Each migration runs once, in order, inside its own transaction, and is
+# recorded in schema_version. Never edit a migration that has shipped;
+# append a new one instead.
 
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS contact_tag_map (
-                contact_id INTEGER NOT NULL,
-                tag_id INTEGER NOT NULL,
-                PRIMARY KEY (contact_id, tag_id),
-                FOREIGN KEY(contact_id) REFERENCES contacts(id),
-                FOREIGN KEY(tag_id) REFERENCES contact_tags(id)
-            )
-        """)
+def _add_missing_columns(c, table, columns):
+    """ALTER TABLE ... ADD COLUMN for each column the table does not have yet."""
+    existing = {
+        row[1] for row in c.execute(f"PRAGMA table_info({table});").fetchall()
+    }
+    for col, col_type in columns.items():
+        if col not in existing:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type};")
 
-        # -------------------------
-        # VENDORS
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS vendors (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                gst_number TEXT,
-                address TEXT,
-                phone TEXT,
-                email TEXT
-            )
-        """)
 
-        # -------------------------
-        # GST
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS gst (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                gst_number TEXT,
-                description TEXT,
-                is_default INTEGER DEFAULT 0
-            )
-        """)
+def _migration_001_base_schema(c):
+    """Tables that existed before versioned migrations."""
+    # -------------------------
+    # INVOICES
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS invoices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            num TEXT,
+            date TEXT,
+            vendor_id INTEGER,
+            invoice_type TEXT,
+            comments TEXT,
+            terms_conditions TEXT,
+            sig_id INTEGER,
+            ship_cost REAL,
+            tax_rate REAL,
+            tax REAL,
+            subtotal REAL,
+            total REAL,
+            pdf TEXT,
+            gst_number TEXT,
+            ship_method TEXT,
+            ship_terms TEXT,
+            delivery_date TEXT,
+            template TEXT,
+            FOREIGN KEY(vendor_id) REFERENCES vendors(id)
+        )
+    """)
 
-        # -------------------------
-        # ITEMS
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                default_units TEXT,
-                default_price REAL
-            )
-        """)
+    # -------------------------
+    # INVOICE ITEMS
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_id INTEGER,
+            lot_number TEXT,
+            item TEXT,
+            qty REAL,
+            units TEXT,
+            unit_price REAL,
+            line_total REAL,
+            FOREIGN KEY(invoice_id) REFERENCES invoices(id)
+        )
+    """)
 
-        # -------------------------
-        # INVOICE SEQUENCES
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS invoice_sequences (
-                prefix TEXT PRIMARY KEY,
-                last_number INTEGER
-            )
-        """)
+    # -------------------------
+    # MANIFESTS
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS manifests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            num TEXT,
+            date TEXT,
+            carrier TEXT,
+            delivery TEXT,
+            ship_from TEXT,
+            ship_to TEXT,
+            contact_name TEXT,
+            ship_method TEXT,
+            sig_id INTEGER,
+            total_weight REAL,
+            pdf TEXT
+        )
+    """)
 
-        # -------------------------
-        # SIGNATURES
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS signatures (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                position TEXT,
-                filename TEXT NOT NULL,
-                is_default INTEGER DEFAULT 0
-            )
-        """)
+    # -------------------------
+    # MANIFEST ITEMS
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS manifest_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            manifest_id INTEGER,
+            item TEXT,
+            lot TEXT,
+            weight REAL,
+            FOREIGN KEY(manifest_id) REFERENCES manifests(id)
+        )
+    """)
 
-        # -------------------------
-        # REDACTIONS (UPDATED)
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS redactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT,
-                output_file TEXT,
-                changes TEXT,
-                timestamp TEXT
-            )
-        """)
+    # -------------------------
+    # CONTACTS
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            phone TEXT,
+            email TEXT,
+            address TEXT,
+            first_name_contact TEXT,
+            last_name_contact TEXT,
+            email_contact TEXT,
+            phone_contact TEXT,
+            company_contact TEXT,
+            position_contact TEXT,
+            address_contact TEXT,
+            notes_contact TEXT,
+            website_contact TEXT,
+            business_card_front_contact TEXT,
+            business_card_back_contact TEXT,
+            face_image_contact TEXT,
+            company_logo_contact TEXT
+        )
+    """)
 
-        existing_redaction_cols = {
-            row[1] for row in c.execute("PRAGMA table_info(redactions);").fetchall()
-        }
-
-        required_redaction_cols = {
-            "output_file": "TEXT",
-            "changes": "TEXT"
-        }
-
-        for col, col_type in required_redaction_cols.items():
-            if col not in existing_redaction_cols:
-                c.execute(f"ALTER TABLE redactions ADD COLUMN {col} {col_type};")
-
-        # -------------------------
-        # REDACTION TEMPLATES
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS redaction_templates (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                company TEXT,
-                doc_type TEXT,
-                boxes_json TEXT NOT NULL,
-                created_at TEXT
-            )
+    # -------------------------
+    # CONTACT NOTES
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contact_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contact_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            note_text TEXT NOT NULL,
+            FOREIGN KEY(contact_id) REFERENCES contacts(id)
+        )
+    """)
+
+    # -------------------------
+    # CONTACT TAGS
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contact_tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contact_tag_map (
+            contact_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            PRIMARY KEY (contact_id, tag_id),
+            FOREIGN KEY(contact_id) REFERENCES contacts(id),
+            FOREIGN KEY(tag_id) REFERENCES contact_tags(id)
+        )
+    """)
+
+    # -------------------------
+    # VENDORS
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS vendors (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            gst_number TEXT,
+            address TEXT,
+            phone TEXT,
+            email TEXT
+        )
+    """)
+
+    # -------------------------
+    # GST
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS gst (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            gst_number TEXT,
+            description TEXT,
+            is_default INTEGER DEFAULT 0
+        )
+    """)
+
+    # -------------------------
+    # ITEMS
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            default_units TEXT,
+            default_price REAL
+        )
+    """)
+
+    # -------------------------
+    # INVOICE SEQUENCES
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_sequences (
+            prefix TEXT PRIMARY KEY,
+            last_number INTEGER
+        )
+    """)
+
+    # -------------------------
+    # SIGNATURES
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS signatures (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            position TEXT,
+            filename TEXT NOT NULL,
+            is_default INTEGER DEFAULT 0
+        )
+    """)
+
+    # -------------------------
+    # REDACTIONS (UPDATED)
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS redactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            output_file TEXT,
+            changes TEXT,
+            timestamp TEXT
+        )
+    """)
+
+    # -------------------------
+    # REDACTION TEMPLATES
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS redaction_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            company TEXT,
+            doc_type TEXT,
+            boxes_json TEXT NOT NULL,
+            created_at TEXT
+        )
+    """)
+
+    # -------------------------
+    # REDACTION TEMPLATE VERSIONS (NEW)
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS redaction_template_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            template_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            name TEXT,
+            company TEXT,
+            doc_type TEXT,
+            boxes_json TEXT NOT NULL,
+            created_at TEXT,
+            FOREIGN KEY(template_id) REFERENCES redaction_templates(id)
+        )
+    """)
+
+    # -------------------------
+    # REDACTION PREVIEW (previously created lazily by the redactor routes)
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS redaction_preview (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            page INTEGER,
+            x REAL,
+            y REAL,
+            width REAL,
+            height REAL,
+            type TEXT,
+            text TEXT
+        )
+    """)
+
+
+def _migration_002_align_columns(c):
+    """Bring databases created by older builds up to the current columns."""
+    _add_missing_columns(c, "contacts", {
+        "first_name_contact": "TEXT",
+        "last_name_contact": "TEXT",
+        "email_contact": "TEXT",
+        "phone_contact": "TEXT",
+        "company_contact": "TEXT",
+        "position_contact": "TEXT",
+        "address_contact": "TEXT",
+        "notes_contact": "TEXT",
+        "website_contact": "TEXT",
+        "business_card_front_contact": "TEXT",
+        "business_card_back_contact": "TEXT",
+        "face_image_contact": "TEXT",
+        "company_logo_contact": "TEXT",
+        "status": "TEXT DEFAULT 'active'",
+        "pipeline_stage": "TEXT DEFAULT 'new'",
+    })
+
+    _add_missing_columns(c, "redactions", {
+        "output_file": "TEXT",
+        "changes": "TEXT",
+    })
+
+    _add_missing_columns(c, "invoices", {
+        "gst_number": "TEXT",
+        "ship_method": "TEXT",
+        "ship_terms": "TEXT",
+        "delivery_date": "TEXT",
+        "template": "TEXT",
+    })
+
+
+def _migration_003_hot_query_indexes(c):
+    """Secondary indexes for the filters and joins used on hot paths."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_invoices_invoice_type ON invoices(invoice_type)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_invoices_vendor_id ON invoices(vendor_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice_id ON invoice_items(invoice_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_manifest_items_manifest_id ON manifest_items(manifest_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_redaction_preview_filename ON redaction_preview(filename)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_contact_tag_map_tag_id ON contact_tag_map(tag_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_contact_notes_contact_id ON contact_notes(contact_id)")
+
+
+def _migration_004_feature_tables(c):
+    """
+    Tables that used to be created on demand inside request handlers
+    (workspace and the contacts CRM extras), plus their lookup indexes.
+    """
+    # -------------------------
+    # WORKSPACE
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS open_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            display_name TEXT,
+            active INTEGER,
+            opened TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_open_documents_filename ON open_documents(filename)")
+
+    # -------------------------
+    # CONTACT FILES
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contact_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contact_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            stored_path TEXT NOT NULL,
+            uploaded_at TEXT NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_contact_files_contact_id ON contact_files(contact_id)")
+
+    # -------------------------
+    # CONTACT REMINDERS
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contact_reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contact_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open'
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_contact_reminders_contact_id ON contact_reminders(contact_id)")
+
+    # -------------------------
+    # CONTACT EMAIL TEMPLATES
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contact_email_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL
+        )
+    """)
+
+    # -------------------------
+    # CONTACT ACTIVITY LOG
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contact_activity_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contact_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            type TEXT NOT NULL,
+            description TEXT NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_contact_activity_log_contact_id ON contact_activity_log(contact_id)")
+
+    # -------------------------
+    # CONTACT MERGE LOG
+    # -------------------------
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contact_merge_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            primary_contact_id INTEGER NOT NULL,
+            merged_contact_id INTEGER NOT NULL,
+            merged_at TEXT NOT NULL
+        )
+    """)
+
+
+def _migration_005_suggestion_jobs(c):
+    """Background suggestion jobs and their per-page results."""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS suggestion_jobs (
+            id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            options TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            pages_total INTEGER,
+            pages_done INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_suggestion_jobs_created_at ON suggestion_jobs(created_at)")
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS suggestion_job_pages (
+            job_id TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            suggestions TEXT NOT NULL,
+            report TEXT,
+            PRIMARY KEY (job_id, page)
+        )
+    """)
+
+
+def _migration_006_suggestion_cache(c):
+    """Finished suggestion runs keyed by document, models and options."""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS suggestion_cache (
+            cache_key TEXT PRIMARY KEY,
+            pdf_sha256 TEXT NOT NULL,
+            model_version TEXT NOT NULL,
+            options TEXT NOT NULL,
+            pages TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+
+
+def _migration_007_upload_blobs(c):
+    """Content-addressed upload store: one blob per SHA-256, many aliases."""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS upload_blobs (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            ext TEXT NOT NULL,
+            refs INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS upload_aliases (
+            filename TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            original_name TEXT,
+            module TEXT,
+            created_at TEXT NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_upload_aliases_sha ON upload_aliases(sha256)")
+
+
+def _migration_008_dashboard_summary(c):
+    """
+    Running totals for the dashboard, kept current by triggers so it
+    never scans invoices: row counts and total revenue in
+    dashboard_counters, revenue per invoice day in revenue_daily.
+    """
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS dashboard_counters (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS revenue_daily (
+            day TEXT PRIMARY KEY,
+            revenue REAL NOT NULL DEFAULT 0,
+            invoices INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    # Row counts for the simple tables
+    for table in ("vendors", "contacts", "manifests", "invoices"):
+        c.execute(
+            "INSERT OR REPLACE INTO dashboard_counters (name, value) "
+            f"SELECT '{table}', COUNT(*) FROM {table}"
+        )
+        if table == "invoices":
+            continue
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_ins AFTER INSERT ON {table}
+            BEGIN
+                UPDATE dashboard_counters SET value = value + 1 WHERE name = '{table}';
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_del AFTER DELETE ON {table}
+            BEGIN
+                UPDATE dashboard_counters SET value = value - 1 WHERE name = '{table}';
+            END
         """)
 
-        # -------------------------
-        # REDACTION TEMPLATE VERSIONS (NEW)
-        # -------------------------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS redaction_template_versions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                template_id INTEGER NOT NULL,
-                version INTEGER NOT NULL,
-                name TEXT,
-                company TEXT,
-                doc_type TEXT,
-                boxes_json TEXT NOT NULL,
-                created_at TEXT,
-                FOREIGN KEY(template_id) REFERENCES redaction_templates(id)
+    c.execute("""
+        INSERT OR REPLACE INTO dashboard_counters (name, value)
+        SELECT 'revenue', COALESCE(SUM(total), 0) FROM invoices
+    """)
+    c.execute("""
+        INSERT OR REPLACE INTO revenue_daily (day, revenue, invoices)
+        SELECT substr(date, 1, 10), COALESCE(SUM(total), 0), COUNT(*)
+        FROM invoices
+        WHERE date IS NOT NULL
+        GROUP BY substr(date, 1, 10)
+    """)
+
+    # Invoices: count, revenue and the day bucket follow every write
+    add = """
+        UPDATE dashboard_counters SET value = value + 1 WHERE name = 'invoices';
+        UPDATE dashboard_counters SET value = value + COALESCE(NEW.total, 0) WHERE name = 'revenue';
+        INSERT INTO revenue_daily (day, revenue, invoices)
+        SELECT substr(NEW.date, 1, 10), COALESCE(NEW.total, 0), 1 WHERE NEW.date IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET
+            revenue = revenue + excluded.revenue,
+            invoices = invoices + 1;
+    """
+    remove = """
+        UPDATE dashboard_counters SET value = value - 1 WHERE name = 'invoices';
+        UPDATE dashboard_counters SET value = value - COALESCE(OLD.total, 0) WHERE name = 'revenue';
+        UPDATE revenue_daily
+        SET revenue = revenue - COALESCE(OLD.total, 0), invoices = invoices - 1
+        WHERE day = substr(OLD.date, 1, 10);
+    """
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_summary_ins AFTER INSERT ON invoices
+        BEGIN {add} END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_summary_del AFTER DELETE ON invoices
+        BEGIN {remove} END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_summary_upd AFTER UPDATE OF total, date ON invoices
+        BEGIN {remove} {add} END
+    """)
+
+
+def _migration_009_revenue_rollup(c):
+    """
+    Revenue per (day, vendor, invoice type) for the analytics API,
+    kept current by triggers and backfilled from invoices.
+    NULL vendor_id / invoice_type are stored as 0 / ''.
+    """
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS revenue_rollup (
+            day TEXT NOT NULL,
+            vendor_id INTEGER NOT NULL,
+            invoice_type TEXT NOT NULL,
+            revenue REAL NOT NULL DEFAULT 0,
+            invoices INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, vendor_id, invoice_type)
+        ) WITHOUT ROWID
+    """)
+
+    key = """
+        day = substr(OLD.date, 1, 10)
+        AND vendor_id = COALESCE(OLD.vendor_id, 0)
+        AND invoice_type = COALESCE(OLD.invoice_type, '')
+    """
+    add = """
+        INSERT INTO revenue_rollup (day, vendor_id, invoice_type, revenue, invoices)
+        SELECT substr(NEW.date, 1, 10), COALESCE(NEW.vendor_id, 0),
+               COALESCE(NEW.invoice_type, ''), COALESCE(NEW.total, 0), 1
+        WHERE NEW.date IS NOT NULL
+        ON CONFLICT(day, vendor_id, invoice_type) DO UPDATE SET
+            revenue = revenue + excluded.revenue,
+            invoices = invoices + 1;
+    """
+    remove = f"""
+        UPDATE revenue_rollup
+        SET revenue = revenue - COALESCE(OLD.total, 0), invoices = invoices - 1
+        WHERE {key};
+        DELETE FROM revenue_rollup WHERE {key} AND invoices <= 0;
+    """
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_rollup_ins AFTER INSERT ON invoices
+        BEGIN {add} END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_rollup_del AFTER DELETE ON invoices
+        BEGIN {remove} END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_rollup_upd
+        AFTER UPDATE OF total, date, vendor_id, invoice_type ON invoices
+        BEGIN {remove} {add} END
+    """)
+
+    c.execute("""
+        INSERT OR REPLACE INTO revenue_rollup (day, vendor_id, invoice_type, revenue, invoices)
+        SELECT substr(date, 1, 10), COALESCE(vendor_id, 0), COALESCE(invoice_type, ''),
+               COALESCE(SUM(total), 0), COUNT(*)
+        FROM invoices
+        WHERE date IS NOT NULL
+        GROUP BY substr(date, 1, 10), COALESCE(vendor_id, 0), COALESCE(invoice_type, '')
+    """)
+
+
+def _migration_010_invoice_import_jobs(c):
+    """Background PDF rendering for bulk invoice imports."""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_import_jobs (
+            id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            invoices_total INTEGER NOT NULL DEFAULT 0,
+            pdfs_done INTEGER NOT NULL DEFAULT 0,
+            pdfs_failed INTEGER NOT NULL DEFAULT 0,
+            errors TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_invoice_import_jobs_created_at ON invoice_import_jobs(created_at)")
+
+
+def _migration_011_contact_company_index(c):
+    """Company directory sort key, so its keyset pages are range seeks."""
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_contacts_company ON contacts(
+            lower(COALESCE(company_contact, '')), COALESCE(company_contact, '')
+        )
+    """)
+
+
+def _migration_012_batch_redaction_jobs(c):
+    """Background template batches started from POST /redactor/batch."""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS batch_redaction_jobs (
+            id TEXT PRIMARY KEY,
+            template_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'queued',
+            files_total INTEGER NOT NULL DEFAULT 0,
+            files_done INTEGER NOT NULL DEFAULT 0,
+            files_failed INTEGER NOT NULL DEFAULT 0,
+            zip_name TEXT,
+            files TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_batch_redaction_jobs_created_at ON batch_redaction_jobs(created_at)")
+
+
+def _migration_013_drop_revenue_daily(c):
+    """
+    revenue_rollup (migration 009) already has revenue per day, so
+    revenue_daily only doubled the trigger work on every invoice write.
+    The invoice triggers go back to keeping just the counters.
+    """
+    for event in ("ins", "del", "upd"):
+        c.execute(f"DROP TRIGGER IF EXISTS trg_invoices_summary_{event}")
+    c.execute("DROP TABLE IF EXISTS revenue_daily")
+
+    add = """
+        UPDATE dashboard_counters SET value = value + 1 WHERE name = 'invoices';
+        UPDATE dashboard_counters SET value = value + COALESCE(NEW.total, 0) WHERE name = 'revenue';
+    """
+    remove = """
+        UPDATE dashboard_counters SET value = value - 1 WHERE name = 'invoices';
+        UPDATE dashboard_counters SET value = value - COALESCE(OLD.total, 0) WHERE name = 'revenue';
+    """
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_summary_ins AFTER INSERT ON invoices
+        BEGIN {add} END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_summary_del AFTER DELETE ON invoices
+        BEGIN {remove} END
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_summary_upd AFTER UPDATE OF total ON invoices
+        BEGIN {remove} {add} END
+    """)
+
+
+MIGRATIONS = [
+    (1, "base schema", _migration_001_base_schema),
+    (2, "align legacy columns", _migration_002_align_columns),
+    (3, "hot query indexes", _migration_003_hot_query_indexes),
+    (4, "workspace and contact feature tables", _migration_004_feature_tables),
+    (5, "suggestion jobs", _migration_005_suggestion_jobs),
+    (6, "suggestion cache", _migration_006_suggestion_cache),
+    (7, "upload blob store", _migration_007_upload_blobs),
+    (8, "dashboard summary", _migration_008_dashboard_summary),
+    (9, "revenue rollups", _migration_009_revenue_rollup),
+    (10, "invoice import jobs", _migration_010_invoice_import_jobs),
+    (11, "contact company index", _migration_011_contact_company_index),
+    (12, "batch redaction jobs", _migration_012_batch_redaction_jobs),
+    (13, "drop revenue_daily", _migration_013_drop_revenue_daily),
+]
+
+
+def schema_version(conn):
+    """Return the highest applied migration version (0 for a new database)."""
+    row = conn.execute("SELECT MAX(version) AS v FROM schema_version").fetchone()
+    return row["v"] or 0
+
+
+def migrate(conn):
+    """
+    Apply every migration newer than the recorded schema version.
+    BEGIN IMMEDIATE takes the write lock before the version is re-read,
+    so two processes starting at once cannot apply the same migration.
+    Returns the list of versions applied.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+
+    applied = []
+    for version, name, migration in MIGRATIONS:
+        if version <= schema_version(conn):
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= schema_version(conn):
+                conn.rollback()
+                continue
+            migration(conn.cursor())
+            conn.execute(
+                "INSERT INTO schema_version(version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, datetime.now().isoformat(timespec="seconds")),
             )
-        """)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    return applied
+
+
+# Database paths this process has already migrated. Schema work happens
+# once at startup; request handlers never run DDL.
+_schema_ready = set()
+
+
+def init_db():
+    """
+    Create all required tables and apply pending schema migrations.
+    Runs once per database per process; later calls return immediately.
+    """
+    db_path = current_app.config["DATABASE"]
+    if db_path in _schema_ready:
+        return
+
+    conn = get_conn()
+    conn.execute("PRAGMA journal_mode=WAL")
+    migrate(conn)
+    _schema_ready.add(db_path)
+
+
+# ------------------------------------------------------------
+# CONNECTION BENCHMARK
+# ------------------------------------------------------------
+
+# A typical per-row helper query (the contacts list used to run one per contact)
+_BENCH_QUERY = """
+    SELECT t.name
+    FROM contact_tags t
+    JOIN contact_tag_map m ON m.tag_id = t.id
+    WHERE m.contact_id = ?
+    ORDER BY t.name
+"""
+
+
+def benchmark_connections(app, requests=200, queries_per_request=25):
+    """
+    Simulate `requests` requests that each run `queries_per_request`
+    helper queries, first opening a plain connection per query (the old
+    per-module get_conn() copies), then sharing one tuned get_conn()
+    connection per app context.
+    Returns {"per_query_connect": req/s, "shared_connection": req/s}.
+    """
+    import time
+
+    db_path = app.config["DATABASE"]
+    results = {}
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        for contact_id in range(1, queries_per_request + 1):
+            conn = sqlite3.connect(db_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute(_BENCH_QUERY, (contact_id,)).fetchall()
+            conn.close()
+    results["per_query_connect"] = requests / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        with app.app_context():
+            for contact_id in range(1, queries_per_request + 1):
+                get_conn().execute(_BENCH_QUERY, (contact_id,)).fetchall()
+    results["shared_connection"] = requests / (time.perf_counter() - started)
+
+    return {k: round(v, 1) for k, v in results.items()}
+
+
+# ------------------------------------------------------------
+# QUERY PLAN CHECK
+# ------------------------------------------------------------
+
+# (name, query, params, index the plan must use). Keep these in step with
+# the queries in the routes; a missing index shows up as a table SCAN.
+HOT_QUERIES = [
+    ("invoice list by type",
+     "SELECT id, num, date, vendor_id, invoice_type, total, pdf FROM invoices"
+     " WHERE 1=1 AND invoice_type = ? ORDER BY id DESC LIMIT ?",
+     ("Invoice", 51), "idx_invoices_invoice_type"),
+    ("invoice list by vendor",
+     "SELECT id, num, date, vendor_id, invoice_type, total, pdf FROM invoices"
+     " WHERE 1=1 AND vendor_id = ? ORDER BY id DESC LIMIT ?",
+     (1, 51), "idx_invoices_vendor_id"),
+    ("invoice list by date range",
+     "SELECT id, num, date, vendor_id, invoice_type, total, pdf FROM invoices"
+     " WHERE 1=1 AND date >= ? AND date <= ? ORDER BY id DESC LIMIT ?",
+     ("2025-01-01", "2025-01-31", 51), "idx_invoices_date"),
+    ("invoice items",
+     "SELECT lot_number, item, qty, units, unit_price, line_total FROM invoice_items"
+     " WHERE invoice_id=?",
+     (1,), "idx_invoice_items_invoice_id"),
+    ("manifest items",
+     "SELECT item, lot, weight FROM manifest_items WHERE manifest_id=?",
+     (1,), "idx_manifest_items_manifest_id"),
+    ("redaction preview",
+     "SELECT page, x, y, width, height, type, text FROM redaction_preview"
+     " WHERE filename=? ORDER BY id ASC",
+     ("x.pdf",), "idx_redaction_preview_filename"),
+    ("contacts by tag",
+     "SELECT contacts.id FROM contacts"
+     " JOIN contact_tag_map m ON m.contact_id = contacts.id"
+     " JOIN contact_tags t ON t.id = m.tag_id"
+     " WHERE t.name = ? ORDER BY contacts.id DESC LIMIT ?",
+     ("vip", 51), "idx_contact_tag_map_tag_id"),
+    ("contact notes",
+     "SELECT id, contact_id, timestamp, note_text FROM contact_notes"
+     " WHERE contact_id=? ORDER BY timestamp DESC, id DESC",
+     (1,), "idx_contact_notes_contact_id"),
+    ("company directory page",
+     "SELECT COALESCE(company_contact, '') AS company FROM contacts"
+     " WHERE lower(COALESCE(company_contact, '')) >= lower(:cursor)"
+     "   AND (lower(COALESCE(company_contact, '')) > lower(:cursor)"
+     "        OR COALESCE(company_contact, '') > :cursor)"
+     " GROUP BY lower(COALESCE(company_contact, '')), COALESCE(company_contact, '')"
+     " ORDER BY lower(COALESCE(company_contact, '')), COALESCE(company_contact, '')"
+     " LIMIT :limit",
+     {"cursor": "Acme", "limit": 51}, "idx_contacts_company"),
+]
+
+
+def check_query_plans(conn):
+    """
+    EXPLAIN every HOT_QUERIES entry and return a list of failures: the
+    expected index is not used (USING INDEX / USING COVERING INDEX), or
+    a table is read with a full SCAN.
+    """
+    failures = []
+    for name, query, params, index in HOT_QUERIES:
+        details = [r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        plan = "; ".join(details)
+
+        if not any(
+            f"USING INDEX {index}" in d or f"USING COVERING INDEX {index}" in d
+            for d in details
+        ):
+            failures.append(f"{name}: does not use {index} ({plan})")
+
+        full_scans = [
+            d for d in details
+            if d.startswith("SCAN ") and "INDEX" not in d and "VIRTUAL TABLE" not in d
+        ]
+        if full_scans:
+            failures.append(f"{name}: full table scan ({plan})")
+    return failures
+
+
+if __name__ == "__main__":
+    # python -m app.database [requests] [queries_per_request]
+    # python -m app.database plans
+    import sys
+    import tempfile
+
+    from app import create_app
+
+    app = create_app(preload_models=False)
+
+    if sys.argv[1:2] == ["plans"]:
+        # The shipped database and a freshly migrated one
+        failures = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for label, db_path in (
+                ("database", app.config["DATABASE"]),
+                ("fresh", os.path.join(tmp, "fresh.db")),
+            ):
+                conn = connect(db_path)
+                try:
+                    migrate(conn)
+                    failures += [f"[{label}] {f}" for f in check_query_plans(conn)]
+                finally:
+                    conn.close()
+
+        for f in failures:
+            print(f"❌ {f}")
+        print(f"{len(HOT_QUERIES)} hot queries, {len(failures)} plan failures")
+        sys.exit(1 if failures else 0)
+
+    args = [int(a) for a in sys.argv[1:3]]
+    requests, queries = args + [200, 25][len(args):]
 
-        # -------------------------
-        # INVOICE MIGRATIONS
-        # -------------------------
-        existing_cols = {
-            row[1] for row in c.execute("PRAGMA table_info(invoices);").fetchall()
-        }
-
-        required_invoice_cols = {
-            "gst_number": "TEXT",
-            "ship_method": "TEXT",
-            "ship_terms": "TEXT",
-            "delivery_date": "TEXT",
-            "template": "TEXT"
-        }
-
-        for col, col_type in required_invoice_cols.items():
-            if col not in existing_cols:
-                c.execute(f"ALTER TABLE invoices ADD COLUMN {col} {col_type};")
-
-        conn.commit()
+    r = benchmark_connections(app, requests, queries)
+    print(f"{requests} requests x {queries} queries")
+    print(f"connection per query    {r['per_query_connect']} req/s")
+    print(f"shared connection       {r['shared_connection']} req/s")
@@ -1,17 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, current_app
-import sqlite3
+from flask import Blueprint, render_template, request, redirect, url_for
+from app.database import get_conn
 
 gst_bp = Blueprint("gst", __name__, url_prefix="/gst")
 
 
-def get_conn():
-    """Return a SQLite connection using the app's configured DB path."""
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 # ------------------------------------------------------------
 # GST LIST (now includes is_default)
 # ------------------------------------------------------------
@@ -1,58 +1,20 @@
 from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify
-import sqlite3
 from datetime import date
+from app.database import get_conn
 from app.services.invoice_pdf import generate_invoice_pdf
 from app.services.settings import load_settings
+from app.services.invoice_numbers import (
+    DEFAULT_INVOICE_PREFIX,
+    allocate_numbers,
+    peek_next_number,
+)
 from app.services.emailer import send_invoice_email  # will implement separately
+from app.services.api import api_ok, api_error
+from app.services.invoice_import import import_invoices, start_render_job, job_status
 
 invoice_bp = Blueprint("invoice", __name__, url_prefix="/invoice")
 
 
-def get_conn():
-    """Return a SQLite connection using the app's configured DB path."""
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-# -------------------------
-# Invoice number sequence helpers (Prefix + Number)
-# -------------------------
-DEFAULT_INVOICE_PREFIX = "MWR"
-
-
-def get_next_invoice_number_preview(conn, prefix=DEFAULT_INVOICE_PREFIX):
-    row = conn.execute(
-        "SELECT last_number FROM invoice_sequences WHERE prefix=?",
-        (prefix,)
-    ).fetchone()
-    last = row["last_number"] if row else 0
-    return last + 1
-
-
-def consume_next_invoice_number(conn, prefix=DEFAULT_INVOICE_PREFIX):
-    row = conn.execute(
-        "SELECT last_number FROM invoice_sequences WHERE prefix=?",
-        (prefix,)
-    ).fetchone()
-
-    if row:
-        next_num = row["last_number"] + 1
-        conn.execute(
-            "UPDATE invoice_sequences SET last_number=? WHERE prefix=?",
-            (next_num, prefix)
-        )
-    else:
-        next_num = 1
-        conn.execute(
-            "INSERT INTO invoice_sequences(prefix, last_number) VALUES(?, ?)",
-            (prefix, next_num)
-        )
-
-    return next_num
-
-
 # -------------------------
 # PREVIEW
 # -------------------------
@@ -246,7 +208,7 @@ def invoice_create():
             if user_num:
                 num = user_num
             else:
-                next_seq = consume_next_invoice_number(conn, DEFAULT_INVOICE_PREFIX)
+                next_seq = allocate_numbers(conn, DEFAULT_INVOICE_PREFIX)
                 num = f"{DEFAULT_INVOICE_PREFIX} - {next_seq}"
 
             # INSERT INVOICE HEADER
@@ -363,7 +325,7 @@ def invoice_create():
     # GET: defaults
     today_str = date.today().isoformat()
     with get_conn() as conn_preview:
-        next_preview = get_next_invoice_number_preview(conn_preview, DEFAULT_INVOICE_PREFIX)
+        next_preview = peek_next_number(conn_preview, DEFAULT_INVOICE_PREFIX)
         suggested_invoice_number = f"{DEFAULT_INVOICE_PREFIX} - {next_preview}"
 
     return render_template(
@@ -380,6 +342,45 @@ def invoice_create():
     )
 
 
+# -------------------------
+# BULK IMPORT (CSV / XLSX)
+# -------------------------
+@invoice_bp.route("/import", methods=["GET", "POST"])
+def invoice_import():
+    """
+    GET: upload page. POST: validate and insert every invoice in the
+    file, then render the PDFs in the background; poll the status route.
+    """
+    if request.method == "GET":
+        return render_template("invoice/import.html")
+
+    file = request.files.get("file")
+    if not file or file.filename == "":
+        return api_error("No file selected")
+
+    try:
+        invoices, errors = import_invoices(file.stream, file.filename)
+    except ValueError as e:
+        return api_error(str(e))
+    if errors:
+        return api_error("The file has invalid rows; nothing was imported", rows=errors)
+
+    job_id = start_render_job(file.filename, invoices)
+    return api_ok(
+        job_id=job_id,
+        invoices=len(invoices),
+        status_url=url_for("invoice.invoice_import_status", job_id=job_id),
+    )
+
+
+@invoice_bp.route("/import/status/<job_id>")
+def invoice_import_status(job_id):
+    status = job_status(job_id)
+    if status is None:
+        return api_error("Unknown import job")
+    return api_ok(**status)
+
+
 # -------------------------
 # SEND INVOICE BY EMAIL
 # -------------------------
@@ -1,16 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify
-import sqlite3
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify
+from app.database import get_conn
 
 invoice_items_bp = Blueprint("invoice_items", __name__, url_prefix="/invoice/items")
 
 
-def get_conn():
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 # ------------------------------------------------------------
 # LIST ITEMS
 # ------------------------------------------------------------
@@ -1,22 +1,24 @@
 from flask import Blueprint, render_template, request, redirect, url_for, send_file, current_app, flash
-import sqlite3
 import os
+from datetime import date
+from app.database import get_conn
+from app.services.api import api_ok, api_error
+from app.services.revenue import BUCKETS, GROUP_COLUMNS, revenue_series
+from app.services.pagination import page_args, split_page, wants_json, pager
 
 invoice_routes_bp = Blueprint("invoice_routes", __name__, url_prefix="/invoice")
 
 
-def get_conn():
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 # ------------------------------------------------------------
-# LIST INVOICES (Module 8: Filters)
+# LIST INVOICES (Module 8: Filters, keyset pagination)
 # ------------------------------------------------------------
 @invoice_routes_bp.route("/list")
 def invoice_list():
+    """
+    Invoice registry, newest first.
+    Query params: filters below plus ?cursor=<last id>&limit=<n>&format=json
+    """
+    cursor, limit = page_args()
     vendor_filter = request.args.get("vendor", "")
     search = request.args.get("search", "")
     date_from = request.args.get("from", "")
@@ -50,10 +52,16 @@ def invoice_list():
         query += " AND date <= ?"
         params.append(date_to)
 
-    query += " ORDER BY id DESC"
+    if cursor is not None:
+        query += " AND id < ?"
+        params.append(cursor)
+
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit + 1)
 
     with get_conn() as conn:
         rows = conn.execute(query, params).fetchall()
+        rows, next_cursor = split_page(rows, limit)
 
         vendors = {
             r["id"]: r["name"]
@@ -72,6 +80,9 @@ def invoice_list():
             "pdf": r["pdf"]
         })
 
+    if wants_json():
+        return api_ok(invoices=invoices, next_cursor=next_cursor, limit=limit)
+
     return render_template(
         "invoice/list.html",
         invoices=invoices,
@@ -80,7 +91,57 @@ def invoice_list():
         search=search,
         date_from=date_from,
         date_to=date_to,
-        invoice_type=invoice_type
+        invoice_type=invoice_type,
+        pager=pager(cursor, next_cursor)
+    )
+
+
+# ------------------------------------------------------------
+# REVENUE ANALYTICS (rollup-backed)
+# ------------------------------------------------------------
+@invoice_routes_bp.route("/analytics/revenue")
+def revenue_analytics():
+    """
+    Revenue per day/week/month from the revenue_rollup table.
+    Query params:
+      granularity=day|week|month (default month)
+      start, end=YYYY-MM-DD (default: the last 365 days)
+      vendor_id, type: filters
+      group_by=vendor,invoice_type: split each bucket
+    """
+    granularity = request.args.get("granularity", "month")
+    if granularity not in BUCKETS:
+        return api_error("granularity must be day, week or month")
+
+    start = request.args.get("start") or None
+    end = request.args.get("end") or None
+    try:
+        for d in (start, end):
+            if d:
+                date.fromisoformat(d)
+    except ValueError:
+        return api_error("start and end must be YYYY-MM-DD")
+
+    vendor_id = request.args.get("vendor_id", type=int)
+    invoice_type = request.args.get("type") or None
+    group_by = [g for g in request.args.get("group_by", "").split(",") if g]
+    if any(g not in GROUP_COLUMNS for g in group_by):
+        return api_error("group_by may contain vendor and invoice_type")
+
+    series = revenue_series(
+        granularity,
+        start=start,
+        end=end,
+        vendor_id=vendor_id,
+        invoice_type=invoice_type,
+        group_by=group_by,
+    )
+
+    return api_ok(
+        granularity=granularity,
+        series=series,
+        total_revenue=round(sum(r["revenue"] or 0 for r in series), 2),
+        total_invoices=sum(r["invoices"] or 0 for r in series),
     )
 
 
@@ -1,28 +1,35 @@
-import sqlite3
-from flask import Blueprint, render_template, request, redirect, url_for, current_app
+from flask import Blueprint, render_template, request, redirect, url_for
+from app.database import get_conn
+from app.services.api import api_ok
+from app.services.pagination import page_args, split_page, wants_json, pager
 
 manifest_bp = Blueprint("manifest", __name__, url_prefix="/manifest")
 
 
-def get_conn():
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 # ------------------------------------------------------------
-# REGISTRY
+# REGISTRY (keyset pagination: ?cursor=<last id>&limit=<n>)
 # ------------------------------------------------------------
 @manifest_bp.route("/")
 def manifest_registry():
+    cursor, limit = page_args()
+
+    query = """
+        SELECT id, num, date, carrier, ship_from, ship_to,
+               total_weight AS weight, pdf
+        FROM manifests
+    """
+    params = []
+
+    if cursor is not None:
+        query += " WHERE id < ?"
+        params.append(cursor)
+
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit + 1)
+
     with get_conn() as conn:
-        rows = conn.execute("""
-            SELECT id, num, date, carrier, ship_from, ship_to,
-                   total_weight AS weight, pdf
-            FROM manifests
-            ORDER BY id DESC
-        """).fetchall()
+        rows = conn.execute(query, params).fetchall()
+    rows, next_cursor = split_page(rows, limit)
 
     manifests = [
         {
@@ -38,7 +45,14 @@ def manifest_registry():
         for r in rows
     ]
 
-    return render_template("manifest/registry.html", manifests=manifests)
+    if wants_json():
+        return api_ok(manifests=manifests, next_cursor=next_cursor, limit=limit)
+
+    return render_template(
+        "manifest/registry.html",
+        manifests=manifests,
+        pager=pager(cursor, next_cursor)
+    )
 
 
 # ------------------------------------------------------------
@@ -1,22 +1,33 @@
 import os
-import sqlite3
 import json
-import fitz
 from io import BytesIO
 from datetime import datetime
 from flask import (
     request,
     render_template,
     send_file,
+    session,
     url_for,
     current_app,
 )
+from werkzeug.utils import secure_filename
 from app.redactor import redactor_bp
-from app.storage import save_upload
+from app.database import get_conn
+from app.storage import save_upload, save_alias, UploadTooLarge
 from app.services.api import api_ok, api_error
-from app.services.pdf import render_page
-from app.services.suggestions import extract_suggestions
+from app.services.doc_pool import open_pdf, pool_stats
+from app.services.blob_store import blob_stats, collect_garbage, remove_alias
+from app.services.pdf import render_page, render_cache_stats, file_digest
+from app.services.suggestion_cache import cached_suggestions
+from app.services.suggestion_jobs import start_job, job_status
+from app.services.model_registry import model_status, reload_models
 from app.services.redaction import apply_redactions
+from app.services.batch_redaction import (
+    load_template_changes,
+    directory_pdfs,
+    start_batch_job,
+    batch_job_status,
+)
 from app.services.history import log_redaction
 from app.state.workspace import (
     open_document,
@@ -25,66 +36,11 @@ from app.state.workspace import (
     close_document,
 )
 
+PREVIEW_CHARS = 1000
 
-def get_conn():
-    """Return a SQLite connection using the app's configured DB path."""
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-def ensure_preview_table(conn):
-    """Ensure the redaction_preview table exists."""
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS redaction_preview (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT,
-            page INTEGER,
-            x REAL,
-            y REAL,
-            width REAL,
-            height REAL,
-            type TEXT,
-            text TEXT
-        )
-        """
-    )
-
-
-def ensure_templates_table(conn):
-    """Ensure the redaction_templates table exists."""
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS redaction_templates (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            company TEXT,
-            doc_type TEXT,
-            boxes_json TEXT NOT NULL,
-            created_at TEXT
-        )
-        """
-    )
-
-
-def ensure_template_versions_table(conn):
-    """Ensure the redaction_template_versions table exists."""
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS redaction_template_versions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            template_id INTEGER NOT NULL,
-            version INTEGER NOT NULL,
-            name TEXT,
-            company TEXT,
-            doc_type TEXT,
-            boxes_json TEXT NOT NULL,
-            created_at TEXT
-        )
-        """
-    )
+# Upload hashes remembered per browser session for /upload/by_hash
+# (kept small: the session lives in a cookie)
+SESSION_UPLOAD_HASHES = 20
 
 
 # ------------------------------------------------------------
@@ -106,17 +62,89 @@ def upload_pdf():
         return api_error("No file uploaded")
 
     module = request.args.get("module", "default")
-    fname, path = save_upload(file, module=module)
+    try:
+        fname, path = save_upload(file, module=module)
+    except UploadTooLarge as e:
+        return api_error(str(e))
+
+    remember_upload(file_digest(path))
+    return upload_response(fname, path)
+
+
+def remember_upload(sha256):
+    """Record content this browser session has sent, for upload_by_hash()."""
+    if not current_app.secret_key:
+        return
+    hashes = [h for h in session.get("upload_hashes", []) if h != sha256]
+    session["upload_hashes"] = (hashes + [sha256])[-SESSION_UPLOAD_HASHES:]
+
+
+@redactor_bp.route("/upload/by_hash", methods=["POST"])
+def upload_by_hash():
+    """
+    Re-upload without sending the file: if this browser session has
+    uploaded the content before, a new upload is created from it at once.
+    A digest alone is not proof of having the file, so content uploaded
+    by anyone else is reported as not stored and must be sent in full.
+    JSON body: { "sha256": "...", "filename": "scan.pdf", "module": "default" }
+    """
+    data = request.json or {}
+    sha256 = (data.get("sha256") or "").lower()
+    if len(sha256) != 64:
+        return api_error("sha256 is required")
+    if sha256 not in session.get("upload_hashes", []):
+        return api_error("Not stored", missing=True)
+
+    fname, path = save_alias(
+        sha256,
+        data.get("filename"),
+        module=data.get("module", "default"),
+    )
+    if not fname:
+        return api_error("Not stored", missing=True)
+
+    return upload_response(fname, path)
+
 
+@redactor_bp.route("/upload/delete", methods=["POST"])
+def upload_delete():
+    """
+    Delete an upload for good: close it in the workspace and drop its
+    alias, so collect_garbage() can reclaim the blob once no other
+    upload shares it. JSON body: { "filename": "redaction_1a2b3c4d.pdf" }
+    """
+    filename = (request.json or {}).get("filename")
+    if not filename:
+        return api_error("No filename provided")
+
+    close_document(filename)
+    if not remove_alias(filename):
+        return api_error("Upload not found")
+    return api_ok()
+
+
+def upload_response(fname, path):
+    """Page count, content hash and a short text preview of a new upload."""
     try:
-        doc = fitz.open(path)
-        pages = doc.page_count
-        text_preview = "".join(p.get_text() for p in doc)[:1000]
-        doc.close()
+        with open_pdf(path) as doc:
+            pages = doc.page_count
+
+            # Only read as many pages as the preview needs
+            text_preview = ""
+            for p in doc:
+                text_preview += p.get_text()
+                if len(text_preview) >= PREVIEW_CHARS:
+                    break
+            text_preview = text_preview[:PREVIEW_CHARS]
     except Exception as e:
         return api_error(str(e))
 
-    return api_ok(filename=fname, pages=pages, text_preview=text_preview)
+    return api_ok(
+        filename=fname,
+        pages=pages,
+        sha256=file_digest(path),
+        text_preview=text_preview,
+    )
 
 
 # ------------------------------------------------------------
@@ -128,40 +156,50 @@ def viewer(filename):
 
     pdf_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
     try:
-        doc = fitz.open(pdf_path)
-        pages = doc.page_count
-        doc.close()
+        with open_pdf(pdf_path) as doc:
+            pages = doc.page_count
     except Exception:
         pages = 1
 
     return render_template("redactor/viewer.html", filename=filename, pages=pages)
 
 
+def send_render(out, pdf_path):
+    """
+    Send a cached page render with a content-derived ETag so the browser
+    revalidates with If-None-Match and gets a 304 instead of the PNG.
+    """
+    return send_file(
+        out,
+        mimetype="image/png",
+        etag=os.path.splitext(os.path.basename(out))[0],
+        last_modified=os.path.getmtime(pdf_path),
+        conditional=True,
+    )
+
+
 @redactor_bp.route("/get_page/<filename>/<int:p>")
 def get_page(filename, p):
     pdf_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
     out = render_page(pdf_path, p)
     if not out:
         return api_error("Invalid page")
-    return send_file(out, mimetype="image/png")
+    return send_render(out, pdf_path)
 
 
 # ------------------------------------------------------------
 # SUGGESTIONS (AI + OCR FLAG + CONFIDENCE FILTER)
 # ------------------------------------------------------------
-@redactor_bp.route("/suggestions/<filename>")
-def suggestions(filename):
+def suggestion_options():
     """
-    Return AI suggestions for a PDF.
-
-    Query params:
-      ?ocr=0|1           -> enable OCR fusion into spaCy text
+    Read suggestion options from the query string:
+      ?ocr=0|1|force     -> OCR fusion into spaCy text; 1 only OCRs pages
+                            without a usable text layer, force OCRs all
       ?min_conf=0.0-1.0  -> filter YOLO suggestions by confidence
+    Returns (use_ocr, min_conf).
     """
-    pdf_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-
     ocr_flag = request.args.get("ocr", "0")
-    use_ocr = ocr_flag == "1"
+    use_ocr = "force" if ocr_flag == "force" else ocr_flag == "1"
 
     min_conf_str = request.args.get("min_conf", "").strip()
     try:
@@ -169,12 +207,54 @@ def suggestions(filename):
     except ValueError:
         min_conf = 0.0
 
-    sugg = extract_suggestions(
+    return use_ocr, min_conf
+
+
+@redactor_bp.route("/suggestions/<filename>")
+def suggestions(filename):
+    """
+    Return AI suggestions for a PDF, computed inside the request.
+    Takes the query params described in suggestion_options().
+    Long documents should use /suggestions/start instead.
+    """
+    pdf_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
+    use_ocr, min_conf = suggestion_options()
+
+    pages = []
+    hit = {}
+    sugg = cached_suggestions(
         pdf_path,
         use_ocr=use_ocr,
         min_conf=min_conf,
+        report=pages,
+        hit=hit,
     )
-    return api_ok(suggestions=sugg)
+    return api_ok(suggestions=sugg, pages=pages, cached=hit["cached"])
+
+
+@redactor_bp.route("/suggestions/start/<filename>", methods=["POST"])
+def suggestions_start(filename):
+    """Start a background suggestion job; returns its job_id immediately."""
+    pdf_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
+    if not os.path.exists(pdf_path):
+        return api_error("File not found")
+
+    use_ocr, min_conf = suggestion_options()
+    job_id = start_job(pdf_path, filename, use_ocr=use_ocr, min_conf=min_conf)
+    return api_ok(job_id=job_id)
+
+
+@redactor_bp.route("/suggestions/status/<job_id>")
+def suggestions_status(job_id):
+    """
+    Poll a suggestion job. ?after=<last_page> returns only the
+    suggestions of pages finished since the previous poll.
+    """
+    after = request.args.get("after", -1, type=int)
+    status = job_status(job_id, after=after)
+    if status is None:
+        return api_error("Job not found")
+    return api_ok(**status)
 
 
 # ------------------------------------------------------------
@@ -187,7 +267,6 @@ def preview_save():
     changes = data["changes"]
 
     with get_conn() as conn:
-        ensure_preview_table(conn)
         for ch in changes:
             conn.execute(
                 """
@@ -214,7 +293,6 @@ def preview_save():
 @redactor_bp.route("/preview/load/<filename>")
 def preview_load(filename):
     with get_conn() as conn:
-        ensure_preview_table(conn)
         rows = conn.execute(
             """
             SELECT page, x, y, width, height, type, text
@@ -246,7 +324,6 @@ def preview_undo():
     filename = request.json["filename"]
 
     with get_conn() as conn:
-        ensure_preview_table(conn)
         conn.execute(
             """
             DELETE FROM redaction_preview
@@ -269,7 +346,6 @@ def preview_clear():
     filename = request.json["filename"]
 
     with get_conn() as conn:
-        ensure_preview_table(conn)
         conn.execute("DELETE FROM redaction_preview WHERE filename=?", (filename,))
         conn.commit()
 
@@ -285,7 +361,6 @@ def apply_preview():
     orig = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
 
     with get_conn() as conn:
-        ensure_preview_table(conn)
         rows = conn.execute(
             """
             SELECT page, x, y, width, height, type, text
@@ -316,7 +391,6 @@ def apply_preview():
     log_redaction(filename, out_name, changes)
 
     with get_conn() as conn:
-        ensure_preview_table(conn)
         conn.execute("DELETE FROM redaction_preview WHERE filename=?", (filename,))
         conn.commit()
 
@@ -347,7 +421,43 @@ def thumbnail(filename, p):
     if not out:
         return api_error("Invalid page")
 
-    return send_file(out, mimetype="image/png")
+    return send_render(out, pdf_path)
+
+
+@redactor_bp.route("/render_cache/stats")
+def render_cache_stats_api():
+    return api_ok(**render_cache_stats())
+
+
+@redactor_bp.route("/doc_pool/stats")
+def doc_pool_stats_api():
+    return api_ok(**pool_stats())
+
+
+@redactor_bp.route("/blobs/stats")
+def blob_stats_api():
+    return api_ok(**blob_stats())
+
+
+@redactor_bp.route("/blobs/gc", methods=["POST"])
+def blob_gc():
+    return api_ok(**collect_garbage())
+
+
+# ------------------------------------------------------------
+# AI MODELS
+# ------------------------------------------------------------
+@redactor_bp.route("/models/health")
+def models_health():
+    """Model readiness, load and warm-up times, and load errors."""
+    return api_ok(**model_status())
+
+
+@redactor_bp.route("/models/reload", methods=["POST"])
+def models_reload():
+    """Reload the models from the configured paths (after retraining)."""
+    reload_models()
+    return api_ok(**model_status())
 
 
 # ------------------------------------------------------------
@@ -409,10 +519,6 @@ def template_save():
         return api_error("Filename and template name are required")
 
     with get_conn() as conn:
-        ensure_preview_table(conn)
-        ensure_templates_table(conn)
-        ensure_template_versions_table(conn)
-
         rows = conn.execute(
             """
             SELECT page, x, y, width, height, type, text
@@ -477,8 +583,6 @@ def template_list():
     doc_type = request.args.get("doc_type")
 
     with get_conn() as conn:
-        ensure_templates_table(conn)
-
         query = "SELECT id, name, company, doc_type, created_at FROM redaction_templates WHERE 1=1"
         params = []
 
@@ -530,9 +634,6 @@ def template_apply():
         return api_error("filename and template_id are required")
 
     with get_conn() as conn:
-        ensure_preview_table(conn)
-        ensure_templates_table(conn)
-
         row = conn.execute(
             "SELECT boxes_json FROM redaction_templates WHERE id=?",
             (template_id,),
@@ -599,7 +700,6 @@ def template_load(template_id):
     Load a template's boxes for editing.
     """
     with get_conn() as conn:
-        ensure_templates_table(conn)
         row = conn.execute(
             "SELECT boxes_json FROM redaction_templates WHERE id=?",
             (template_id,),
@@ -634,10 +734,6 @@ def template_update():
         return api_error("template_id and filename required")
 
     with get_conn() as conn:
-        ensure_preview_table(conn)
-        ensure_templates_table(conn)
-        ensure_template_versions_table(conn)
-
         # current template (for versioning)
         cur_tpl = conn.execute(
             "SELECT name, company, doc_type, boxes_json, created_at FROM redaction_templates WHERE id=?",
@@ -723,11 +819,10 @@ def template_auto_detect(filename):
         return api_error("File not found")
 
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        if doc.page_count > 0:
-            text = doc[0].get_text()[:5000]
-        doc.close()
+        with open_pdf(pdf_path) as doc:
+            text = ""
+            if doc.page_count > 0:
+                text = doc[0].get_text()[:5000]
     except Exception as e:
         return api_error(str(e))
 
@@ -756,6 +851,83 @@ def template_auto_detect(filename):
     return api_ok(company=company, doc_type=doc_type)
 
 
+# ------------------------------------------------------------
+# REDACTION TEMPLATES — BATCH
+# ------------------------------------------------------------
+@redactor_bp.route("/batch", methods=["POST"])
+def template_batch():
+    """
+    Apply a template to many PDFs in the background; returns a job id
+    and a status URL to poll for progress and, at the end, the zip.
+    Either multipart form data:
+      template_id=1, pdfs=<file>, pdfs=<file>, ...
+    or JSON for files already on the server, in a folder under one of
+    the BATCH_REDACTION_ROOTS:
+      { "template_id": 1, "directory": "uploads/certificates/2025-06" }
+    """
+    if request.files:
+        template_id = request.form.get("template_id")
+        uploads = [f for f in request.files.getlist("pdfs") if f.filename]
+        directory = None
+    else:
+        data = request.json or {}
+        template_id = data.get("template_id")
+        uploads = []
+        directory = data.get("directory")
+
+    if not template_id:
+        return api_error("template_id is required")
+
+    changes = load_template_changes(template_id)
+    if changes is None:
+        return api_error("Template not found")
+    if not changes:
+        return api_error("No boxes to apply from template")
+
+    if uploads:
+        pdf_paths, labels, uploaded = [], [], []
+        for file in uploads:
+            try:
+                fname, path = save_upload(file, module="batch")
+            except UploadTooLarge as e:
+                for fname in uploaded:
+                    remove_alias(fname)
+                return api_error(f"{file.filename}: {e}")
+            uploaded.append(fname)
+            pdf_paths.append(path)
+            labels.append(secure_filename(file.filename) or os.path.basename(path))
+    elif directory:
+        try:
+            pdf_paths = directory_pdfs(directory)
+        except ValueError as e:
+            return api_error(str(e))
+        labels = None
+    else:
+        return api_error("Upload PDFs or give a directory")
+
+    if not pdf_paths:
+        return api_error("No PDF files found")
+
+    job_id = start_batch_job(template_id, changes, pdf_paths, labels=labels)
+
+    return api_ok(
+        job_id=job_id,
+        files_total=len(pdf_paths),
+        status_url=url_for("redactor.template_batch_status", job_id=job_id),
+    )
+
+
+@redactor_bp.route("/batch/status/<job_id>")
+def template_batch_status(job_id):
+    """Poll a batch; once status is "done" the zip is at download_url."""
+    status = batch_job_status(job_id)
+    if status is None:
+        return api_error("Job not found")
+    if status["zip_name"]:
+        status["download_url"] = url_for("redactor.download", filename=status["zip_name"])
+    return api_ok(**status)
+
+
 # ------------------------------------------------------------
 # REDACTION TEMPLATES — VERSIONS
 # ------------------------------------------------------------
@@ -765,7 +937,6 @@ def template_versions(template_id):
     List versions for a template.
     """
     with get_conn() as conn:
-        ensure_template_versions_table(conn)
         rows = conn.execute(
             """
             SELECT id, version, created_at
@@ -797,7 +968,6 @@ def template_export(template_id):
     Export a template as a JSON file.
     """
     with get_conn() as conn:
-        ensure_templates_table(conn)
         row = conn.execute(
             """
             SELECT id, name, company, doc_type, boxes_json, created_at
@@ -858,9 +1028,6 @@ def template_import():
     ts = datetime.now().isoformat(timespec="seconds")
 
     with get_conn() as conn:
-        ensure_templates_table(conn)
-        ensure_template_versions_table(conn)
-
         cur = conn.execute(
             """
             INSERT INTO redaction_templates (name, company, doc_type, boxes_json, created_at)
@@ -905,9 +1072,6 @@ def template_duplicate():
         return api_error("template_id and new_name required")
 
     with get_conn() as conn:
-        ensure_templates_table(conn)
-        ensure_template_versions_table(conn)
-
         row = conn.execute(
             """
             SELECT name, company, doc_type, boxes_json
@@ -963,7 +1127,6 @@ def template_rename():
         return api_error("template_id and new_name required")
 
     with get_conn() as conn:
-        ensure_templates_table(conn)
         conn.execute(
             "UPDATE redaction_templates SET name=? WHERE id=?",
             (new_name, template_id),
@@ -0,0 +1,367 @@
+"""
+batch_redaction.py – Apply a redaction template to many PDFs at once.
+
+run_batch() redacts every file with the template's boxes on a process
+pool (BATCH_REDACTION_WORKERS, default: one per core), logs each output
+with log_redaction() and packs the results into a single zip in
+OUTPUT_FOLDER/redactions, next to the individual redacted files.
+
+POST /redactor/batch (uploads, or a server directory under one of the
+BATCH_REDACTION_ROOTS folders) hands the batch to start_batch_job(),
+which runs it on a background thread and records progress in
+batch_redaction_jobs for batch_job_status(), so large overnight runs
+never hold the request open. Uploaded PDFs are kept like any other
+upload, since the redaction history names them as the source. Large
+runs can also go through the command line, where any readable path may
+be given:
+
+    python -m app.services.batch_redaction <template_id> <dir or pdf>...
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app.database import get_conn
+from app.services.history import log_redaction
+from app.services.redaction import apply_redactions
+
+JOB_RETENTION = timedelta(days=7)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# One background thread drives web batches, one batch at a time; the
+# process pool above does the redacting
+_job_executor = None
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Started from the job thread of a threaded server: spawn, so
+            # workers never inherit a lock another thread was holding
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config.get("BATCH_REDACTION_WORKERS") or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _reset_executor(broken):
+    """
+    Discard a pool whose worker died (e.g. MuPDF crashing on a malformed
+    PDF) so the next batch starts a new one instead of failing.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _get_job_executor():
+    global _job_executor
+    with _executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-redaction")
+        return _job_executor
+
+
+def load_template_changes(template_id):
+    """
+    Return the template's boxes as apply_redactions() changes, or None
+    if the template does not exist or its data is unreadable.
+    """
+    row = get_conn().execute(
+        "SELECT boxes_json FROM redaction_templates WHERE id=?",
+        (template_id,),
+    ).fetchone()
+    if not row:
+        return None
+
+    try:
+        boxes = json.loads(row["boxes_json"])
+    except Exception:
+        return None
+
+    return [
+        {
+            "page": b.get("page", 0),
+            "x": b.get("x", 0.0),
+            "y": b.get("y", 0.0),
+            "width": b.get("width", 0.0),
+            "height": b.get("height", 0.0),
+            "type": b.get("type", "area"),
+            "text": b.get("text"),
+        }
+        for b in boxes
+    ]
+
+
+def collect_pdfs(paths):
+    """Expand directories (top level only) into their PDFs, sorted by name."""
+    pdfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            pdfs.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.lower().endswith(".pdf") and os.path.isfile(os.path.join(path, name))
+            )
+        else:
+            pdfs.append(path)
+    return pdfs
+
+
+def _within(path, root):
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:      # different drives
+        return False
+
+
+def directory_pdfs(directory):
+    """
+    PDFs in a server directory for a web batch. The directory (and
+    every file, after following links) must lie under one of the
+    BATCH_REDACTION_ROOTS folders; raises ValueError otherwise.
+    """
+    roots = [os.path.realpath(r) for r in current_app.config.get("BATCH_REDACTION_ROOTS") or ()]
+    # Relative paths are taken from the app folder, not the server's cwd
+    path = os.path.realpath(os.path.join(current_app.config["BASE_DIR"], directory))
+
+    if not any(_within(path, root) for root in roots):
+        raise ValueError("Directory is outside the allowed batch folders")
+    if not os.path.isdir(path):
+        raise ValueError("Directory not found")
+
+    return [
+        pdf for pdf in collect_pdfs([path])
+        if any(_within(os.path.realpath(pdf), root) for root in roots)
+    ]
+
+
+def _redact_worker(pdf_path, changes, output_dir):
+    """Process-pool task: redact one file. Returns (output_path, error)."""
+    try:
+        _, out_path = apply_redactions(pdf_path, changes, output_dir=output_dir)
+    except Exception as e:
+        return None, str(e)
+    if not out_path:
+        return None, "Redaction failed"
+    return out_path, None
+
+
+def run_batch(changes, pdf_paths, labels=None, progress=None):
+    """
+    Redact every file in pdf_paths with the same changes.
+    `labels` (parallel to pdf_paths) names each file inside the zip;
+    defaults to the file's own name. progress(done, failed, total) is
+    called as each file is finished.
+
+    Returns {"batch_id", "zip_name", "zip_path", "ok", "failed",
+    "seconds", "files": [{"source", "output", "error"}, ...]}.
+    """
+    started = time.perf_counter()
+    labels = labels or [os.path.basename(p) for p in pdf_paths]
+
+    batch_id = f"batch_{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+    redactions_dir = os.path.join(current_app.config["OUTPUT_FOLDER"], "redactions")
+    batch_dir = os.path.join(redactions_dir, batch_id)
+
+    # Files sharing a name go to numbered subfolders so outputs never collide
+    seen = {}
+    output_dirs = []
+    for label in labels:
+        n = seen[label] = seen.get(label, 0) + 1
+        output_dirs.append(batch_dir if n == 1 else os.path.join(batch_dir, str(n)))
+
+    executor = _get_executor()
+    try:
+        futures = [
+            executor.submit(_redact_worker, path, changes, out_dir)
+            for path, out_dir in zip(pdf_paths, output_dirs)
+        ]
+    except BrokenProcessPool:
+        # Broken since the last batch: start over on a fresh pool
+        _reset_executor(executor)
+        executor = _get_executor()
+        futures = [
+            executor.submit(_redact_worker, path, changes, out_dir)
+            for path, out_dir in zip(pdf_paths, output_dirs)
+        ]
+
+    files = []
+    zip_name = f"{batch_id}.zip"
+    zip_path = os.path.join(redactions_dir, zip_name)
+    os.makedirs(redactions_dir, exist_ok=True)
+
+    # PDFs are already deflated by apply_redactions; store them as-is
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zf:
+        for path, label, out_dir, fut in zip(pdf_paths, labels, output_dirs, futures):
+            try:
+                out_path, error = fut.result()
+            except BrokenProcessPool:
+                # A worker died; the files still queued fail with it
+                _reset_executor(executor)
+                out_path, error = None, "Redaction worker crashed"
+            except Exception as e:
+                out_path, error = None, str(e)
+
+            entry = {"source": label, "output": None, "error": error}
+            if out_path:
+                rel = os.path.relpath(out_path, redactions_dir).replace(os.sep, "/")
+                base, ext = os.path.splitext(label)
+                arcname = os.path.relpath(
+                    os.path.join(out_dir, f"{base}_Redacted{ext or '.pdf'}"), batch_dir
+                ).replace(os.sep, "/")
+
+                zf.write(out_path, arcname)
+                log_redaction(os.path.basename(path), rel, changes)
+                entry["output"] = rel
+            files.append(entry)
+
+            if progress:
+                done = sum(1 for f in files if f["output"])
+                progress(done, len(files) - done, len(pdf_paths))
+
+    ok = sum(1 for f in files if f["output"])
+    return {
+        "batch_id": batch_id,
+        "zip_name": zip_name,
+        "zip_path": zip_path,
+        "ok": ok,
+        "failed": len(files) - ok,
+        "seconds": round(time.perf_counter() - started, 3),
+        "files": files,
+    }
+
+
+# ------------------------------------------------------------
+# BACKGROUND JOBS
+# ------------------------------------------------------------
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _set_job(conn, job_id, **fields):
+    fields["updated_at"] = _now()
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    conn.execute(f"UPDATE batch_redaction_jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+
+
+def _run_batch_job(app, job_id, changes, pdf_paths, labels):
+    with app.app_context():
+        conn = get_conn()
+        try:
+            _set_job(conn, job_id, status="running")
+            result = run_batch(
+                changes, pdf_paths, labels=labels,
+                progress=lambda done, failed, total: _set_job(
+                    conn, job_id, files_done=done, files_failed=failed
+                ),
+            )
+            _set_job(
+                conn, job_id,
+                status="done",
+                zip_name=result["zip_name"],
+                files=json.dumps(result["files"]),
+            )
+        except Exception as e:
+            conn.rollback()
+            _set_job(conn, job_id, status="error", error=str(e))
+
+
+def start_batch_job(template_id, changes, pdf_paths, labels=None):
+    """Queue a batch for the background thread and return its job id."""
+    job_id = uuid.uuid4().hex
+    now = _now()
+
+    conn = get_conn()
+    cutoff = (datetime.now() - JOB_RETENTION).isoformat(timespec="seconds")
+    conn.execute("DELETE FROM batch_redaction_jobs WHERE created_at < ?", (cutoff,))
+    conn.execute("""
+        INSERT INTO batch_redaction_jobs (id, template_id, status, files_total, created_at, updated_at)
+        VALUES (?, ?, 'queued', ?, ?, ?)
+    """, (job_id, template_id, len(pdf_paths), now, now))
+    conn.commit()
+
+    app = current_app._get_current_object()
+    _get_job_executor().submit(_run_batch_job, app, job_id, changes, pdf_paths, labels)
+    return job_id
+
+
+def batch_job_status(job_id):
+    """Return the batch's progress and, once done, its files; None if unknown."""
+    job = get_conn().execute(
+        "SELECT * FROM batch_redaction_jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    if not job:
+        return None
+
+    return {
+        "job_id": job["id"],
+        "template_id": job["template_id"],
+        "status": job["status"],
+        "error": job["error"],
+        "files_total": job["files_total"],
+        "files_done": job["files_done"],
+        "files_failed": job["files_failed"],
+        "zip_name": job["zip_name"],
+        "files": json.loads(job["files"]) if job["files"] else [],
+    }
+
+
+def main(argv=None):
+    import argparse
+
+    from app import create_app
+
+    parser = argparse.ArgumentParser(
+        description="Apply a redaction template to a folder of PDFs."
+    )
+    parser.add_argument("template_id", type=int)
+    parser.add_argument("paths", nargs="+", help="PDF files and/or directories")
+    parser.add_argument("--workers", type=int, help="process pool size (default: one per core)")
+    args = parser.parse_args(argv)
+
+    app = create_app(preload_models=False)
+    if args.workers:
+        app.config["BATCH_REDACTION_WORKERS"] = args.workers
+
+    with app.app_context():
+        changes = load_template_changes(args.template_id)
+        if changes is None:
+            parser.error(f"template {args.template_id} not found")
+
+        pdfs = collect_pdfs(args.paths)
+        if not pdfs:
+            parser.error("no PDF files found")
+
+        result = run_batch(changes, pdfs)
+
+    for f in result["files"]:
+        if f["error"]:
+            print(f"❌ {f['source']}: {f['error']}")
+    print(
+        f"✅ {result['ok']} redacted, {result['failed']} failed "
+        f"in {result['seconds']}s -> {result['zip_path']}"
+    )
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
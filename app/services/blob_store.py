@@ -0,0 +1,209 @@
+"""
+blob_store.py – Content-addressed storage for uploads.
+
+Each distinct file is kept once, as UPLOAD_FOLDER/blobs/<sha256><ext>
+(upload_blobs). Every upload still gets its own filename in
+UPLOAD_FOLDER (upload_aliases), but that file is a hard link to the
+blob, so the rest of the app keeps opening uploads by name while
+uploading the same PDF five times costs the disk space of one. Where
+hard links are unavailable the alias falls back to a copy.
+
+upload_blobs.refs counts the aliases of each blob. Deleting an upload
+(POST /redactor/upload/delete) releases it with remove_alias();
+collect_garbage() also drops aliases whose file has gone, then deletes
+blobs nobody refers to.
+
+Render, OCR and suggestion caches are keyed on the SHA-256, and the
+document pool on the file's inode, so every alias of a blob shares them.
+"""
+
+import os
+import shutil
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from app.database import get_conn
+from app.services.pdf import remember_digest
+
+BLOB_DIRNAME = "blobs"
+
+# Blob files with no table row (an upload interrupted mid-way) are only
+# removed once they are this old, so uploads in flight are left alone
+ORPHAN_MIN_AGE_SECONDS = 3600
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def blob_dir():
+    path = os.path.join(current_app.config["UPLOAD_FOLDER"], BLOB_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _alias_path(filename):
+    return os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
+
+
+def _link(blob_path, alias_path):
+    try:
+        os.link(blob_path, alias_path)
+    except OSError:
+        shutil.copyfile(blob_path, alias_path)
+
+
+def has_blob(sha256):
+    """Return the blob row for sha256 if its file is present, else None."""
+    row = get_conn().execute(
+        "SELECT sha256, size, ext FROM upload_blobs WHERE sha256 = ?", (sha256,)
+    ).fetchone()
+    if row and os.path.exists(os.path.join(blob_dir(), row["sha256"] + row["ext"])):
+        return row
+    return None
+
+
+def add_alias(filename, sha256, src_path=None, size=None, ext="",
+              original_name=None, module=None):
+    """
+    Register `filename` in UPLOAD_FOLDER as an alias of blob sha256.
+    src_path is a freshly written copy of the content; it becomes the
+    blob if the blob is new and is deleted otherwise. Without src_path
+    the blob must already exist.
+    Returns True when the content was already stored (a dedup hit).
+    """
+    conn = get_conn()
+    alias_path = _alias_path(filename)
+
+    # The write lock keeps collect_garbage() from deleting the blob
+    # between the lookup and the link
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT ext FROM upload_blobs WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        if row:
+            ext = row["ext"]
+        blob_path = os.path.join(blob_dir(), sha256 + ext)
+        hit = row is not None and os.path.exists(blob_path)
+
+        if not hit:
+            if src_path is None:
+                raise FileNotFoundError(f"No stored upload with SHA-256 {sha256}")
+            os.replace(src_path, blob_path)
+            size = os.path.getsize(blob_path)
+        elif src_path is not None:
+            os.remove(src_path)
+
+        _link(blob_path, alias_path)
+
+        conn.execute("""
+            INSERT OR IGNORE INTO upload_blobs (sha256, size, ext, refs, created_at)
+            VALUES (?, ?, ?, 0, ?)
+        """, (sha256, size or 0, ext, _now()))
+        conn.execute("UPDATE upload_blobs SET refs = refs + 1 WHERE sha256 = ?", (sha256,))
+        conn.execute("""
+            INSERT INTO upload_aliases (filename, sha256, original_name, module, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (filename, sha256, original_name, module, _now()))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if src_path is not None and os.path.exists(src_path):
+            os.remove(src_path)
+        raise
+
+    remember_digest(alias_path, sha256)
+    return hit
+
+
+def remove_alias(filename):
+    """Delete an upload alias; its blob is freed by the next collect_garbage()."""
+    conn = get_conn()
+    row = conn.execute(
+        "SELECT sha256 FROM upload_aliases WHERE filename = ?", (filename,)
+    ).fetchone()
+    if not row:
+        return False
+
+    conn.execute("DELETE FROM upload_aliases WHERE filename = ?", (filename,))
+    conn.execute("UPDATE upload_blobs SET refs = refs - 1 WHERE sha256 = ?", (row["sha256"],))
+    conn.commit()
+
+    try:
+        os.remove(_alias_path(filename))
+    except OSError:
+        pass
+    return True
+
+
+def collect_garbage(orphan_min_age=ORPHAN_MIN_AGE_SECONDS):
+    """
+    Drop aliases whose file was deleted, then delete unreferenced blobs
+    and stray blob files. Returns counts and the bytes freed.
+    """
+    conn = get_conn()
+    result = {"aliases_dropped": 0, "blobs_deleted": 0, "bytes_freed": 0}
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for r in conn.execute("SELECT filename, sha256 FROM upload_aliases").fetchall():
+            if not os.path.exists(_alias_path(r["filename"])):
+                conn.execute("DELETE FROM upload_aliases WHERE filename = ?", (r["filename"],))
+                conn.execute(
+                    "UPDATE upload_blobs SET refs = refs - 1 WHERE sha256 = ?", (r["sha256"],)
+                )
+                result["aliases_dropped"] += 1
+
+        directory = blob_dir()
+        for r in conn.execute(
+            "SELECT sha256, ext, size FROM upload_blobs WHERE refs <= 0"
+        ).fetchall():
+            try:
+                os.remove(os.path.join(directory, r["sha256"] + r["ext"]))
+                result["bytes_freed"] += r["size"]
+            except OSError:
+                pass
+            conn.execute("DELETE FROM upload_blobs WHERE sha256 = ?", (r["sha256"],))
+            result["blobs_deleted"] += 1
+
+        known = {
+            r["sha256"] + r["ext"]
+            for r in conn.execute("SELECT sha256, ext FROM upload_blobs").fetchall()
+        }
+        cutoff = time.time() - orphan_min_age
+        for entry in os.scandir(directory):
+            if entry.name in known or not entry.is_file():
+                continue
+            st = entry.stat()
+            if st.st_mtime < cutoff:
+                os.remove(entry.path)
+                result["blobs_deleted"] += 1
+                result["bytes_freed"] += st.st_size
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return result
+
+
+def blob_stats():
+    """Blob and alias counts, bytes stored and bytes saved by deduplication."""
+    row = get_conn().execute("""
+        SELECT
+            (SELECT COUNT(*) FROM upload_blobs) AS blobs,
+            (SELECT COUNT(*) FROM upload_aliases) AS aliases,
+            (SELECT COALESCE(SUM(size), 0) FROM upload_blobs) AS stored_bytes,
+            (SELECT COALESCE(SUM(b.size), 0)
+             FROM upload_aliases a JOIN upload_blobs b ON b.sha256 = a.sha256) AS logical_bytes
+    """).fetchone()
+    return {
+        "blobs": row["blobs"],
+        "aliases": row["aliases"],
+        "stored_bytes": row["stored_bytes"],
+        "saved_bytes": row["logical_bytes"] - row["stored_bytes"],
+    }
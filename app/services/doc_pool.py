@@ -0,0 +1,190 @@
+"""
+doc_pool.py – Process-wide pool of open fitz.Document handles.
+
+The viewer, thumbnails, suggestions and OCR all read the same uploads
+over and over. Instead of re-parsing a large PDF on every request, they
+borrow a shared parsed document:
+
+    with open_pdf(pdf_path) as doc:
+        page = doc[0]
+
+Documents are keyed by (file identity, mtime, size), so a file replaced
+on disk gets a fresh handle. The identity is the inode where the
+filesystem has one: upload aliases hard-linked to the same blob (see
+blob_store.py) share a single parsed document. Each document is used
+by one thread at a time (the same thread may borrow it again while
+holding it). The pool keeps at most DOC_POOL_SIZE documents and closes
+any left idle for DOC_POOL_IDLE_SECONDS.
+
+Borrowed documents are shared: callers must not modify them. Code that
+edits a PDF (e.g. apply_redactions) opens its own handle.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import fitz
+from flask import current_app, has_app_context
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_IDLE_SECONDS = 300
+
+
+class _Entry:
+    __slots__ = ("doc", "lock", "users", "last_used", "closed")
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.lock = threading.RLock()
+        self.users = 0
+        self.last_used = time.monotonic()
+        self.closed = False
+
+
+_pool = OrderedDict()   # (identity, mtime_ns, size) -> _Entry
+_pool_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _limits():
+    if has_app_context():
+        cfg = current_app.config
+        return (
+            cfg.get("DOC_POOL_SIZE", DEFAULT_POOL_SIZE),
+            cfg.get("DOC_POOL_IDLE_SECONDS", DEFAULT_IDLE_SECONDS),
+        )
+    return DEFAULT_POOL_SIZE, DEFAULT_IDLE_SECONDS
+
+
+def _try_lock_idle(entry):
+    """
+    Lock an entry nobody is using. The lock is re-entrant, so the
+    borrow count also guards against the owning thread evicting it.
+    """
+    if not entry.lock.acquire(blocking=False):
+        return False
+    if entry.users:
+        entry.lock.release()
+        return False
+    return True
+
+
+def _close(key, entry):
+    """Close and drop an entry. Caller holds _pool_lock and entry.lock."""
+    entry.closed = True
+    _pool.pop(key, None)
+    try:
+        entry.doc.close()
+    except Exception:
+        pass
+    _stats["evictions"] += 1
+
+
+def _evict(keep=None):
+    """
+    Close idle documents and trim the pool to its size cap, least
+    recently used first. Documents currently borrowed are skipped.
+    """
+    size, idle = _limits()
+    now = time.monotonic()
+
+    with _pool_lock:
+        over = len(_pool) - size
+        for key, entry in list(_pool.items()):
+            if key == keep:
+                continue
+            if over <= 0 and now - entry.last_used < idle:
+                continue
+            if not _try_lock_idle(entry):
+                continue
+            try:
+                _close(key, entry)
+                over -= 1
+            finally:
+                entry.lock.release()
+
+
+def _checkout(path):
+    """Return the pool entry for path, parsing the PDF on a miss."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    ident = (st.st_dev, st.st_ino) if st.st_ino else path
+    key = (ident, st.st_mtime_ns, st.st_size)
+
+    with _pool_lock:
+        entry = _pool.get(key)
+        if entry is not None:
+            _pool.move_to_end(key)
+            _stats["hits"] += 1
+            return key, entry
+        _stats["misses"] += 1
+
+    # Parse outside the pool lock so other documents stay available
+    doc = fitz.open(path)
+
+    with _pool_lock:
+        entry = _pool.get(key)
+        if entry is not None:
+            doc.close()
+            return key, entry
+        entry = _Entry(doc)
+        _pool[key] = entry
+
+        # Older versions of the same file will never be asked for again
+        for old in [k for k in _pool if k[0] == ident and k != key]:
+            stale = _pool[old]
+            if _try_lock_idle(stale):
+                try:
+                    _close(old, stale)
+                finally:
+                    stale.lock.release()
+
+    _evict(keep=key)
+    return key, entry
+
+
+@contextmanager
+def open_pdf(path):
+    """
+    Borrow the pooled fitz.Document for path.
+    Raises like fitz.open() (or os.stat) if the file is missing or unreadable.
+    """
+    while True:
+        key, entry = _checkout(path)
+        entry.lock.acquire()
+        if not entry.closed:
+            break
+        # Evicted between checkout and lock; fetch a fresh handle
+        entry.lock.release()
+
+    entry.users += 1
+    try:
+        entry.last_used = time.monotonic()
+        yield entry.doc
+    finally:
+        entry.users -= 1
+        entry.last_used = time.monotonic()
+        entry.lock.release()
+
+
+def pool_stats():
+    """Return hit/miss/eviction counters and the number of open documents."""
+    with _pool_lock:
+        stats = dict(_stats)
+        stats["open"] = len(_pool)
+    return stats
+
+
+def close_pool():
+    """Close every pooled document (e.g. at shutdown or in tests)."""
+    with _pool_lock:
+        entries = list(_pool.items())
+
+    # Lock order is always entry.lock -> _pool_lock
+    for key, entry in entries:
+        with entry.lock:
+            with _pool_lock:
+                _close(key, entry)
@@ -1,15 +1,6 @@
-import sqlite3
 import json
 from datetime import datetime
-from flask import current_app
-
-
-def get_conn():
-    """Return a SQLite connection using the app's configured DB path."""
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+from app.database import get_conn
 
 
 def log_redaction(original, redacted, changes):
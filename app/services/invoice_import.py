@@ -0,0 +1,642 @@
+"""
+invoice_import.py – Bulk invoice creation from CSV / XLSX.
+
+One row per line item; rows sharing an invoice_ref make one invoice and
+the invoice-level columns are read from the first row of each group:
+
+    invoice_ref, vendor (name or id), invoice_type, date, delivery_date,
+    tax_rate, ship_cost, comments, terms_conditions, gst_number,
+    template, sig_id, invoice_number,
+    lot_number, item, qty, units, unit_price
+
+import_invoices() validates every row before touching the database and
+imports nothing if any row is bad, including an invoice_number that is
+repeated in the file or already taken (the PDF is named after it).
+Otherwise the invoices and their items go in with executemany in one
+transaction, numbered from a single block of the invoice sequence.
+
+PDFs are rendered afterwards on a process pool (INVOICE_RENDER_WORKERS,
+default: one per core) of spawned workers: the web server is threaded,
+and a child forked from one of its threads could inherit a lock held by
+another. start_render_job() runs that in the background and records
+progress in invoice_import_jobs for job_status(); the command line
+prints it instead:
+
+    python -m app.services.invoice_import <file.csv|file.xlsx> [--workers N]
+"""
+
+import csv
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+from app.database import get_conn
+from app.services.invoice_numbers import DEFAULT_INVOICE_PREFIX, allocate_numbers
+from app.services.settings import load_settings
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+INVOICE_TYPES = ("Invoice", "Estimate", "Quote")
+
+# Invoices per process-pool task: large enough to amortise the IPC,
+# small enough for smooth progress
+RENDER_CHUNK = 20
+
+JOB_RETENTION = timedelta(days=7)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _get_executor():
+    """One background thread drives the render jobs, one job at a time."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="invoice-import")
+        return _executor
+
+
+# ------------------------------------------------------------
+# READING
+# ------------------------------------------------------------
+
+def _clean_header(name):
+    return str(name or "").strip().lower().replace(" ", "_")
+
+
+def read_rows(stream, filename):
+    """
+    Read a CSV or XLSX upload (binary stream) into [(row_number, {column: value})].
+    Blank rows are skipped. Raises ValueError for other file types.
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+
+    if ext == ".xlsx":
+        if openpyxl is None:
+            raise ValueError("openpyxl is not installed; save the sheet as CSV")
+        wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [_clean_header(h) for h in next(rows, ())]
+            records = [
+                (n, dict(zip(header, values)))
+                for n, values in enumerate(rows, start=2)
+                if any(v not in (None, "") for v in values)
+            ]
+        finally:
+            wb.close()
+        return records
+
+    if ext == ".csv":
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        reader = csv.reader(text)
+        header = [_clean_header(h) for h in next(reader, [])]
+        return [
+            (n, dict(zip(header, values)))
+            for n, values in enumerate(reader, start=2)
+            if any(v.strip() for v in values)
+        ]
+
+    raise ValueError("Upload a .csv or .xlsx file")
+
+
+# ------------------------------------------------------------
+# VALIDATION
+# ------------------------------------------------------------
+
+def _text(row, key):
+    value = row.get(key)
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _number(row, key, default=None):
+    value = row.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return default
+    return float(str(value).replace(",", "").strip())
+
+
+def _iso_date(value):
+    """ISO date string from a cell (date, datetime or YYYY-MM-DD text)."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return date.fromisoformat(str(value).strip()[:10]).isoformat()
+
+
+def _existing_numbers(conn, nums):
+    """The subset of nums already used by an invoice."""
+    if not nums:
+        return set()
+    return {
+        r[0] for r in conn.execute(
+            "SELECT num FROM invoices WHERE num IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(nums)),),
+        )
+    }
+
+
+def build_invoices(conn, rows, settings=None):
+    """
+    Validate rows and group them into invoices.
+    Returns (invoices, errors); errors is a list of "Row n: ..." strings
+    and invoices should not be imported unless it is empty.
+    """
+    settings = settings if settings is not None else load_settings()
+
+    vendors_by_name = {}
+    vendor_ids = set()
+    for r in conn.execute("SELECT id, name FROM vendors"):
+        vendor_ids.add(r["id"])
+        vendors_by_name.setdefault((r["name"] or "").strip().lower(), r["id"])
+
+    signatures = {
+        r["id"]: dict(r)
+        for r in conn.execute("SELECT id, name, position, filename, is_default FROM signatures")
+    }
+
+    # Same defaults as invoice_create: settings override the DB
+    default_template = settings.get("default_template", "classic")
+    default_sig_id = settings.get("default_signature_id") or next(
+        (sid for sid, s in signatures.items() if s["is_default"]), None
+    )
+    gst_row = conn.execute("SELECT gst_number FROM gst WHERE is_default=1 LIMIT 1").fetchone()
+    default_gst = settings.get("default_gst") or (gst_row["gst_number"] if gst_row else "")
+
+    invoices = {}
+    errors = []
+    num_rows = {}   # explicit invoice_number -> row that claimed it
+
+    for n, row in rows:
+        ref = _text(row, "invoice_ref") or _text(row, "invoice_number") or f"row-{n}"
+        invoice = invoices.get(ref)
+
+        try:
+            if invoice is None:
+                vendor = _text(row, "vendor") or _text(row, "vendor_id")
+                if vendor.isdigit() and int(vendor) in vendor_ids:
+                    vendor_id = int(vendor)
+                else:
+                    vendor_id = vendors_by_name.get(vendor.lower())
+                if vendor_id is None:
+                    raise ValueError(f"unknown vendor '{vendor}'")
+
+                invoice_type = _text(row, "invoice_type") or "Invoice"
+                if invoice_type not in INVOICE_TYPES:
+                    raise ValueError(f"invoice_type must be one of {', '.join(INVOICE_TYPES)}")
+
+                if row.get("date") in (None, ""):
+                    raise ValueError("date is required")
+                try:
+                    invoice_date = _iso_date(row["date"])
+                except ValueError:
+                    raise ValueError("date must be YYYY-MM-DD")
+
+                delivery = row.get("delivery_date")
+                if delivery in (None, "") or str(delivery).strip().upper() == "TBD":
+                    delivery_date = None
+                else:
+                    try:
+                        delivery_date = _iso_date(delivery)
+                    except ValueError:
+                        raise ValueError("delivery_date must be YYYY-MM-DD or TBD")
+
+                sig = _text(row, "sig_id")
+                if sig:
+                    if not sig.isdigit() or int(sig) not in signatures:
+                        raise ValueError(f"unknown sig_id '{sig}'")
+                    sig_id = int(sig)
+                else:
+                    sig_id = int(default_sig_id) if default_sig_id else None
+
+                try:
+                    tax_rate = _number(row, "tax_rate", 0.0)
+                    ship_cost = _number(row, "ship_cost", 0.0)
+                except ValueError:
+                    raise ValueError("tax_rate and ship_cost must be numbers")
+
+                num = _text(row, "invoice_number") or None
+                if num:
+                    if num in num_rows:
+                        raise ValueError(
+                            f"invoice_number '{num}' is already used by row {num_rows[num]}"
+                        )
+                    num_rows[num] = n
+
+                invoice = invoices[ref] = {
+                    "ref": ref,
+                    "num": num,
+                    "date": invoice_date,
+                    "vendor_id": vendor_id,
+                    "invoice_type": invoice_type,
+                    "comments": _text(row, "comments"),
+                    "terms_conditions": _text(row, "terms_conditions"),
+                    "sig_id": sig_id,
+                    "ship_cost": ship_cost,
+                    "tax_rate": tax_rate,
+                    "delivery_date": delivery_date,
+                    "gst_number": _text(row, "gst_number") or default_gst or "",
+                    "template": _text(row, "template") or default_template,
+                    "items": [],
+                }
+
+            item = _text(row, "item")
+            if not item:
+                raise ValueError("item is required")
+            try:
+                qty = _number(row, "qty", 0.0)
+                unit_price = _number(row, "unit_price", 0.0)
+            except ValueError:
+                raise ValueError("qty and unit_price must be numbers")
+
+            invoice["items"].append({
+                "lot_number": _text(row, "lot_number"),
+                "item": item,
+                "qty": qty,
+                "units": _text(row, "units"),
+                "unit_price": unit_price,
+                "line_total": qty * unit_price,
+            })
+        except ValueError as e:
+            errors.append(f"Row {n}: {e}")
+
+    for num in sorted(_existing_numbers(conn, num_rows), key=num_rows.get):
+        errors.append(f"Row {num_rows[num]}: invoice_number '{num}' already exists")
+
+    # Totals as the invoice form computes them
+    for invoice in invoices.values():
+        subtotal = sum(i["line_total"] for i in invoice["items"])
+        tax = subtotal * invoice["tax_rate"] / 100
+        invoice["subtotal"] = round(subtotal, 2)
+        invoice["tax"] = round(tax, 2)
+        invoice["total"] = round(subtotal + tax + invoice["ship_cost"], 2)
+
+    return list(invoices.values()), errors
+
+
+# ------------------------------------------------------------
+# INSERT
+# ------------------------------------------------------------
+
+def insert_invoices(conn, invoices):
+    """
+    Insert invoices and their items in one transaction, allocating one
+    block of numbers for those without an invoice_number.
+    Sets invoice["id"] and invoice["num"] on each dict. Raises
+    ValueError if an invoice_number was taken since validation.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        taken = _existing_numbers(conn, [inv["num"] for inv in invoices if inv["num"]])
+        if taken:
+            raise ValueError(f"Invoice numbers already exist: {', '.join(sorted(taken))}")
+
+        unnumbered = [inv for inv in invoices if not inv["num"]]
+        if unnumbered:
+            first = allocate_numbers(conn, DEFAULT_INVOICE_PREFIX, len(unnumbered))
+            for n, inv in enumerate(unnumbered, start=first):
+                inv["num"] = f"{DEFAULT_INVOICE_PREFIX} - {n}"
+
+        # The write lock is held, so every id above this one is ours,
+        # handed out in insertion order
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM invoices").fetchone()[0]
+
+        conn.executemany(
+            """
+            INSERT INTO invoices(
+                num, date, vendor_id, invoice_type,
+                comments, terms_conditions, sig_id,
+                ship_cost, tax_rate, tax, subtotal, total,
+                delivery_date, gst_number, template
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                (
+                    inv["num"], inv["date"], inv["vendor_id"], inv["invoice_type"],
+                    inv["comments"], inv["terms_conditions"], inv["sig_id"],
+                    inv["ship_cost"], inv["tax_rate"], inv["tax"], inv["subtotal"], inv["total"],
+                    inv["delivery_date"], inv["gst_number"], inv["template"],
+                )
+                for inv in invoices
+            ),
+        )
+
+        ids = [
+            r[0] for r in conn.execute(
+                "SELECT id FROM invoices WHERE id > ? ORDER BY id", (last_id,)
+            )
+        ]
+        if len(ids) != len(invoices):
+            raise RuntimeError("Inserted invoice ids do not match the import")
+        for inv, invoice_id in zip(invoices, ids):
+            inv["id"] = invoice_id
+
+        conn.executemany(
+            """
+            INSERT INTO invoice_items(
+                invoice_id, lot_number, item, qty, units, unit_price, line_total
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                (
+                    inv["id"], i["lot_number"], i["item"], i["qty"],
+                    i["units"], i["unit_price"], i["line_total"],
+                )
+                for inv in invoices
+                for i in inv["items"]
+            ),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return invoices
+
+
+def import_invoices(stream, filename):
+    """
+    Read, validate and insert an upload.
+    Returns (invoices, errors); nothing is inserted when errors is non-empty.
+    """
+    rows = read_rows(stream, filename)
+    if not rows:
+        return [], ["The file has no data rows"]
+
+    conn = get_conn()
+    invoices, errors = build_invoices(conn, rows)
+    if errors:
+        return [], errors
+
+    insert_invoices(conn, invoices)
+    return invoices, []
+
+
+# ------------------------------------------------------------
+# PDF RENDERING
+# ------------------------------------------------------------
+
+def pdf_tasks(conn, invoices):
+    """
+    (invoice_id, invoice, vendor, items) for generate_invoice_pdf(),
+    built in the parent so the workers never touch the database.
+    """
+    vendors = {
+        r["id"]: {k: r[k] for k in ("name", "gst_number", "address", "phone", "email")}
+        for r in conn.execute("SELECT id, name, gst_number, address, phone, email FROM vendors")
+    }
+    signatures = {
+        r["id"]: r for r in conn.execute("SELECT id, name, position, filename FROM signatures")
+    }
+
+    tasks = []
+    for inv in invoices:
+        sig = signatures.get(inv["sig_id"])
+        signature_name = signature_image_path = None
+        if sig:
+            signature_name = sig["name"]
+            if sig["position"]:
+                signature_name = f"{sig['name']} ({sig['position']})"
+            signature_image_path = f"static/signatures/{sig['filename']}"
+
+        invoice_obj = {
+            k: inv[k] for k in (
+                "num", "date", "invoice_type", "comments", "terms_conditions",
+                "ship_cost", "tax_rate", "tax", "subtotal", "total",
+                "delivery_date", "gst_number", "template",
+            )
+        }
+        invoice_obj.update(
+            signature_name=signature_name,
+            signature_position=sig["position"] if sig else None,
+            signature_image_path=signature_image_path,
+        )
+        tasks.append((inv["id"], invoice_obj, vendors.get(inv["vendor_id"], {}), inv["items"]))
+    return tasks
+
+
+_worker_app = None
+_worker_renderer = None
+
+
+def _init_render_worker(config, renderer):
+    """
+    Process-pool initializer. Rendering needs only the templates, the
+    static folder (url_for) and the parent's paths, so each worker gets
+    a bare Flask app built from the parent's config rather than
+    create_app(), which would migrate the database and import every
+    blueprint. renderer is the backend the parent resolved.
+    """
+    global _worker_app, _worker_renderer
+    from flask import Flask
+
+    base_dir = config["BASE_DIR"]
+    _worker_app = Flask(
+        "app",
+        template_folder=os.path.join(base_dir, "templates"),
+        static_folder=os.path.join(base_dir, "static"),
+    )
+    _worker_app.config.update(config)
+    _worker_renderer = renderer
+
+
+def _render_worker(tasks):
+    """Process-pool task: render a chunk. Returns [(invoice_id, pdf_name, error)]."""
+    from app.services.invoice_pdf import generate_invoice_pdf
+
+    results = []
+    with _worker_app.test_request_context():
+        for invoice_id, invoice, vendor, items in tasks:
+            try:
+                pdf_name, _ = generate_invoice_pdf(
+                    invoice, vendor, items, renderer=_worker_renderer
+                )
+                results.append((invoice_id, pdf_name, None))
+            except Exception as e:
+                results.append((invoice_id, None, str(e)))
+    return results
+
+
+def render_pdfs(invoices, workers=None, progress=None):
+    """
+    Render the PDFs of freshly inserted invoices on a process pool and
+    store their file names. progress(done, failed, total) is called as
+    each chunk finishes.
+    Returns {"rendered", "failed", "errors": [{"num", "error"}], "seconds"}.
+    """
+    started = time.perf_counter()
+    conn = get_conn()
+    tasks = pdf_tasks(conn, invoices)
+    nums = {inv["id"]: inv["num"] for inv in invoices}
+    workers = workers or current_app.config.get("INVOICE_RENDER_WORKERS") or os.cpu_count() or 1
+    config = {k: current_app.config[k] for k in ("BASE_DIR", "OUTPUT_FOLDER")}
+    renderer = load_settings().get("pdf_renderer") or "auto"
+
+    chunks = [tasks[i:i + RENDER_CHUNK] for i in range(0, len(tasks), RENDER_CHUNK)]
+
+    done = failed = 0
+    errors = []
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(workers, len(chunks))),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_render_worker,
+        initargs=(config, renderer),
+    ) as pool:
+        futures = [pool.submit(_render_worker, chunk) for chunk in chunks]
+        for fut in as_completed(futures):
+            results = fut.result()
+            conn.executemany(
+                "UPDATE invoices SET pdf=? WHERE id=?",
+                [(pdf_name, invoice_id) for invoice_id, pdf_name, _ in results if pdf_name],
+            )
+            conn.commit()
+
+            for invoice_id, pdf_name, error in results:
+                if error:
+                    failed += 1
+                    errors.append({"num": nums[invoice_id], "error": error})
+                else:
+                    done += 1
+            if progress:
+                progress(done, failed, len(tasks))
+
+    return {
+        "rendered": done,
+        "failed": failed,
+        "errors": errors,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+# ------------------------------------------------------------
+# BACKGROUND JOBS
+# ------------------------------------------------------------
+
+def _prune(conn):
+    cutoff = (datetime.now() - JOB_RETENTION).isoformat(timespec="seconds")
+    conn.execute("DELETE FROM invoice_import_jobs WHERE created_at < ?", (cutoff,))
+
+
+def _set_job(conn, job_id, **fields):
+    fields["updated_at"] = _now()
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    conn.execute(f"UPDATE invoice_import_jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+
+
+def _run_render_job(app, job_id, invoices):
+    with app.app_context():
+        conn = get_conn()
+        try:
+            _set_job(conn, job_id, status="running")
+            result = render_pdfs(
+                invoices,
+                progress=lambda done, failed, total: _set_job(
+                    conn, job_id, pdfs_done=done, pdfs_failed=failed
+                ),
+            )
+            _set_job(conn, job_id, status="done", errors=json.dumps(result["errors"]))
+        except Exception as e:
+            conn.rollback()
+            _set_job(conn, job_id, status="error", error=str(e))
+
+
+def start_render_job(filename, invoices):
+    """Queue PDF rendering for imported invoices and return the job id."""
+    job_id = uuid.uuid4().hex
+    now = _now()
+
+    conn = get_conn()
+    _prune(conn)
+    conn.execute("""
+        INSERT INTO invoice_import_jobs (id, filename, status, invoices_total, created_at, updated_at)
+        VALUES (?, ?, 'queued', ?, ?, ?)
+    """, (job_id, filename, len(invoices), now, now))
+    conn.commit()
+
+    app = current_app._get_current_object()
+    _get_executor().submit(_run_render_job, app, job_id, invoices)
+    return job_id
+
+
+def job_status(job_id):
+    """Return the job's progress, or None if it does not exist."""
+    job = get_conn().execute(
+        "SELECT * FROM invoice_import_jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    if not job:
+        return None
+
+    return {
+        "job_id": job["id"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "error": job["error"],
+        "invoices_total": job["invoices_total"],
+        "pdfs_done": job["pdfs_done"],
+        "pdfs_failed": job["pdfs_failed"],
+        "errors": json.loads(job["errors"]) if job["errors"] else [],
+    }
+
+
+def main(argv=None):
+    import argparse
+
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Create invoices from a CSV or XLSX file.")
+    parser.add_argument("path", help="CSV or XLSX file, one row per line item")
+    parser.add_argument("--workers", type=int, help="process pool size (default: one per core)")
+    args = parser.parse_args(argv)
+
+    app = create_app(preload_models=False)
+    if args.workers:
+        app.config["INVOICE_RENDER_WORKERS"] = args.workers
+
+    with app.app_context():
+        started = time.perf_counter()
+        with open(args.path, "rb") as f:
+            invoices, errors = import_invoices(f, args.path)
+        if errors:
+            for error in errors:
+                print(f"❌ {error}")
+            print("Nothing imported")
+            return 1
+        print(f"Inserted {len(invoices)} invoices in {time.perf_counter() - started:.3f}s")
+
+        def progress(done, failed, total):
+            print(f"\r{done + failed}/{total} PDFs ({failed} failed)", end="", flush=True)
+
+        result = render_pdfs(invoices, progress=progress)
+        print()
+
+    for e in result["errors"]:
+        print(f"❌ {e['num']}: {e['error']}")
+    print(f"✅ {result['rendered']} PDFs rendered, {result['failed']} failed in {result['seconds']}s")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,19 +1,139 @@
+"""
+invoice_numbers.py – Invoice number allocation.
+
+Numbers come from invoice_sequences (prefix -> last_number). A number
+is taken with a single UPSERT ... RETURNING, which reads and bumps the
+counter under SQLite's write lock, so concurrent requests (threads or
+processes) can never receive the same number. When allocate_numbers()
+runs inside the caller's transaction, the number is committed or
+rolled back together with the invoice that uses it.
+
+Batch jobs can take numbers in blocks with NumberBlock: one database
+write reserves `size` numbers, which are then handed out from memory.
+Numbers of a block that is never used up are skipped, not reused.
+
+    python -m app.services.invoice_numbers [threads] [processes] [count]
+
+hammers the allocator from many threads and processes, on a throwaway
+copy of the schema, and reports duplicate numbers and gaps.
+"""
+
 import sqlite3
-from flask import current_app
+import threading
+
+from app.database import get_conn
+
+# Prefix of numbers allocated by invoice_create and the bulk import
+DEFAULT_INVOICE_PREFIX = "MWR"
+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def allocate_numbers(conn, prefix, count=1):
+    """
+    Reserve `count` consecutive numbers for prefix and return the first.
+    Does not commit: the reservation belongs to the caller's transaction.
+    """
+    if _HAS_RETURNING:
+        row = conn.execute("""
+            INSERT INTO invoice_sequences (prefix, last_number) VALUES (?, ?)
+            ON CONFLICT(prefix) DO UPDATE
+                SET last_number = COALESCE(last_number, 0) + excluded.last_number
+            RETURNING last_number
+        """, (prefix, count)).fetchone()
+        return row[0] - count + 1
+
+    # SQLite < 3.35: write first, so the lock is held before the read
+    conn.execute(
+        "INSERT OR IGNORE INTO invoice_sequences (prefix, last_number) VALUES (?, 0)",
+        (prefix,)
+    )
+    conn.execute(
+        "UPDATE invoice_sequences SET last_number = COALESCE(last_number, 0) + ? WHERE prefix = ?",
+        (count, prefix)
+    )
+    row = conn.execute(
+        "SELECT last_number FROM invoice_sequences WHERE prefix = ?", (prefix,)
+    ).fetchone()
+    return row[0] - count + 1
+
+
+def peek_next_number(conn, prefix):
+    """The number the next allocation would return (for form previews only)."""
+    row = conn.execute(
+        "SELECT last_number FROM invoice_sequences WHERE prefix=?",
+        (prefix,)
+    ).fetchone()
+    last = row["last_number"] if row else 0
+    return (last or 0) + 1
+
+
+class NumberBlock:
+    """
+    Hands out numbers for one prefix from blocks reserved `size` at a
+    time, for high-volume batch invoicing. Thread-safe; use one
+    instance per worker process. Each refill commits on its own
+    connection, so the block is reserved even if the batch fails.
+    """
+
+    def __init__(self, prefix, size=100, connect=None):
+        self.prefix = prefix
+        self.size = size
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0       # exclusive
+
+    def _refill(self):
+        if self._connect is not None:
+            conn = self._connect()
+            try:
+                first = allocate_numbers(conn, self.prefix, self.size)
+                conn.commit()
+            finally:
+                conn.close()
+        else:
+            conn = get_conn()
+            if conn.in_transaction:
+                # Do not commit (or roll back) the caller's pending work
+                raise RuntimeError("NumberBlock refill needs a connection with no open transaction")
+            first = allocate_numbers(conn, self.prefix, self.size)
+            conn.commit()
 
+        self._next, self._end = first, first + self.size
 
-def get_conn():
-    """Return a SQLite connection using the app's configured DB path."""
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    def next(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._refill()
+            n = self._next
+            self._next += 1
+            return n
+
+
+def _seed_sequence(conn, prefix):
+    """
+    Start a new prefix's sequence after the highest "<prefix>-<n>"
+    number already in invoices, so it never reissues one.
+    """
+    if conn.execute(
+        "SELECT 1 FROM invoice_sequences WHERE prefix = ?", (prefix,)
+    ).fetchone():
+        return
+    conn.execute("""
+        INSERT OR IGNORE INTO invoice_sequences (prefix, last_number)
+        SELECT ?, COALESCE(MAX(CAST(substr(num, length(?) + 2) AS INTEGER)), 0)
+        FROM invoices
+        WHERE substr(num, 1, length(?) + 1) = ? || '-'
+    """, (prefix, prefix, prefix, prefix))
 
 
 def next_invoice_number(invoice_type="Invoice"):
     """
-    Generate the next invoice/estimate/quote number.
+    Allocate the next invoice/estimate/quote number.
     invoice_type: "Invoice", "Estimate", "Quote"
+    Does not commit: like allocate_numbers(), the number belongs to the
+    caller's transaction and is committed with the invoice that uses it.
     """
 
     prefix_map = {
@@ -24,21 +144,113 @@ def next_invoice_number(invoice_type="Invoice"):
 
     prefix = prefix_map.get(invoice_type, "INV")
 
-    with get_conn() as conn:
-        row = conn.execute(
-            "SELECT num FROM invoices WHERE invoice_type=? ORDER BY id DESC LIMIT 1",
-            (invoice_type,)
-        ).fetchone()
+    conn = get_conn()
+    _seed_sequence(conn, prefix)
+    n = allocate_numbers(conn, prefix)
+    return f"{prefix}-{n:04d}"
+
+
+# ------------------------------------------------------------
+# CONCURRENCY CHECK
+# ------------------------------------------------------------
+
+def _hammer(db_path, prefix, threads, count, block):
+    """Allocate `count` numbers from each of `threads` threads."""
+    from app.database import connect
+
+    results = []
+    lock = threading.Lock()
+    shared = NumberBlock(prefix, size=block, connect=lambda: connect(db_path)) if block else None
+
+    def run():
+        got = []
+        conn = connect(db_path)
+        try:
+            for _ in range(count):
+                if shared:
+                    got.append(shared.next())
+                else:
+                    got.append(allocate_numbers(conn, prefix))
+                    conn.commit()
+        finally:
+            conn.close()
+        with lock:
+            results.extend(got)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return results
+
+
+def check_concurrency(db_path=None, threads=8, processes=4, count=200, block=0):
+    """
+    Allocate threads x processes x count numbers at once (optionally
+    through NumberBlocks of `block`) and return
+    {"allocated", "duplicates", "gaps", "seconds", "per_second"}.
+    Gaps are expected with blocks (unused tails), never without.
+    db_path defaults to a freshly migrated temporary database, so the
+    real invoice sequences are never touched.
+    """
+    import os
+    import tempfile
+    import time
+    import uuid
+    from concurrent.futures import ProcessPoolExecutor
+
+    from app.database import connect, migrate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if db_path is None:
+            db_path = os.path.join(tmp, "numbers.db")
+            conn = connect(db_path)
+            try:
+                migrate(conn)
+            finally:
+                conn.close()
+
+        prefix = f"TEST-{uuid.uuid4().hex[:8]}"
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(_hammer, db_path, prefix, threads, count, block)
+                for _ in range(processes)
+            ]
+            numbers = [n for f in futures for n in f.result()]
+        elapsed = time.perf_counter() - started
+
+        conn = connect(db_path)
+        try:
+            conn.execute("DELETE FROM invoice_sequences WHERE prefix = ?", (prefix,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    unique = set(numbers)
+    return {
+        "allocated": len(numbers),
+        "duplicates": len(numbers) - len(unique),
+        "gaps": max(unique) - min(unique) + 1 - len(unique) if unique else 0,
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(numbers) / elapsed, 1) if elapsed else None,
+    }
+
 
-    # No previous invoices of this type
-    if not row or not row["num"]:
-        return f"{prefix}-0001"
+if __name__ == "__main__":
+    # python -m app.services.invoice_numbers [threads] [processes] [count]
+    # Runs against a temporary database, never database.db
+    import sys
 
-    # Extract numeric part
-    try:
-        last_num = int(row["num"].split("-")[-1])
-    except Exception:
-        last_num = 0
+    args = [int(a) for a in sys.argv[1:4]]
+    threads, processes, count = args + [8, 4, 200][len(args):]
 
-    new_num = last_num + 1
-    return f"{prefix}-{new_num:04d}"
+    for block in (0, 100):
+        r = check_concurrency(None, threads, processes, count, block=block)
+        label = f"blocks of {block}" if block else "one at a time"
+        print(
+            f"{label:14s} {r['allocated']} numbers, {r['duplicates']} duplicates, "
+            f"{r['gaps']} gaps, "
+            f"{r['seconds']}s ({r['per_second']}/s)"
+        )
@@ -1,11 +1,214 @@
+"""
+invoice_pdf.py – Invoice / estimate / quote PDFs.
+
+The invoice HTML is turned into a PDF by one of several backends,
+chosen by the "pdf_renderer" setting:
+
+  weasyprint   in process; print.css and the font configuration are
+               parsed once and reused for every invoice
+  xhtml2pdf    in process (ReportLab based); print.css is read once
+  wkhtmltopdf  the external binary ("wkhtmltopdf_path", else PATH,
+               else the default Windows install location)
+  auto         the first of the above that is available (default)
+
+The in-process backends read static files (signature images) straight
+from disk instead of fetching them back from this server over HTTP.
+"""
+
+import contextlib
+import io
 import os
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
 from flask import render_template, current_app
 
+from app.services.settings import load_settings
+
+try:
+    # WeasyPrint prints an install-help banner before raising OSError
+    # when the Pango libraries are missing; keep it out of the app log
+    with contextlib.redirect_stdout(io.StringIO()):
+        import weasyprint
+        from weasyprint.text.fonts import FontConfiguration
+except (ImportError, OSError):
+    weasyprint = None
+
+try:
+    from xhtml2pdf import pisa
+    from xhtml2pdf.default import DEFAULT_CSS as PISA_DEFAULT_CSS
+except ImportError:
+    pisa = None
+
+WINDOWS_WKHTMLTOPDF = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
+
+
+def _print_css_path():
+    return os.path.join(current_app.config["BASE_DIR"], "static", "css", "print.css")
+
+
+def _static_file(url):
+    """Map a /static/... URL (absolute or not) to a file on disk, or None."""
+    path = urlparse(url).path
+    if not path.startswith("/static/"):
+        return None
+    local = os.path.join(current_app.config["BASE_DIR"], *path.split("/")[1:])
+    return local if os.path.isfile(local) else None
+
+
+# ------------------------------------------------------------
+# BACKENDS
+# ------------------------------------------------------------
+
+class WeasyPrintRenderer:
+    name = "weasyprint"
+
+    def __init__(self):
+        # Pango/fontconfig state is not safe to share between threads
+        self._lock = threading.Lock()
+        self._font_config = None
+        self._css = None    # (path, mtime_ns, weasyprint.CSS)
+
+    def available(self):
+        return weasyprint is not None
+
+    def _stylesheet(self):
+        path = _print_css_path()
+        mtime = os.stat(path).st_mtime_ns
+        if self._css is None or self._css[:2] != (path, mtime):
+            css = weasyprint.CSS(filename=path, font_config=self._font_config)
+            self._css = (path, mtime, css)
+        return self._css[2]
+
+    def render(self, html, pdf_path):
+        def fetch(url):
+            local = _static_file(url)
+            if local:
+                url = Path(local).resolve().as_uri()
+            return weasyprint.default_url_fetcher(url)
+
+        with self._lock:
+            if self._font_config is None:
+                self._font_config = FontConfiguration()
+            weasyprint.HTML(
+                string=html,
+                base_url=current_app.config["BASE_DIR"],
+                url_fetcher=fetch,
+            ).write_pdf(
+                pdf_path,
+                stylesheets=[self._stylesheet()],
+                font_config=self._font_config,
+            )
+
+
+class XHtml2PdfRenderer:
+    name = "xhtml2pdf"
+
+    def __init__(self):
+        self._css = None    # (path, mtime_ns, default css + print.css)
+
+    def available(self):
+        return pisa is not None
+
+    def _default_css(self):
+        path = _print_css_path()
+        mtime = os.stat(path).st_mtime_ns
+        if self._css is None or self._css[:2] != (path, mtime):
+            with open(path, "r", encoding="utf-8") as f:
+                self._css = (path, mtime, PISA_DEFAULT_CSS + "\n" + f.read())
+        return self._css[2]
+
+    def render(self, html, pdf_path):
+        def link_callback(uri, rel):
+            return _static_file(uri) or uri
+
+        with open(pdf_path, "wb") as out:
+            result = pisa.CreatePDF(
+                html,
+                dest=out,
+                link_callback=link_callback,
+                default_css=self._default_css(),
+            )
+        if result.err:
+            raise RuntimeError(f"xhtml2pdf reported {result.err} error(s)")
+
+
+class WkhtmltopdfRenderer:
+    name = "wkhtmltopdf"
+
+    def _binary(self):
+        configured = load_settings().get("wkhtmltopdf_path")
+        if configured:
+            return configured
+        return shutil.which("wkhtmltopdf") or WINDOWS_WKHTMLTOPDF
 
-def generate_invoice_pdf(invoice, vendor, items):
+    def available(self):
+        return os.path.exists(self._binary())
+
+    def render(self, html, pdf_path):
+        # Temporary HTML file next to the output
+        temp_html_path = f"{pdf_path}.html"
+        with open(temp_html_path, "w", encoding="utf-8") as f:
+            f.write(html)
+
+        command = [
+            self._binary(),
+            "--enable-local-file-access",
+            "--print-media-type",
+            temp_html_path,
+            pdf_path
+        ]
+
+        try:
+            subprocess.run(command, check=True)
+        except Exception as e:
+            raise RuntimeError(f"wkhtmltopdf failed: {e}")
+        finally:
+            if os.path.exists(temp_html_path):
+                os.remove(temp_html_path)
+
+
+# Preference order for "auto"
+RENDERERS = {
+    r.name: r for r in (WeasyPrintRenderer(), XHtml2PdfRenderer(), WkhtmltopdfRenderer())
+}
+
+
+def get_renderer(name=None):
+    """
+    Return the backend called `name` (default: the "pdf_renderer"
+    setting). Raises RuntimeError if it is unknown or unavailable.
+    """
+    name = name or load_settings().get("pdf_renderer") or "auto"
+
+    if name == "auto":
+        for renderer in RENDERERS.values():
+            if renderer.available():
+                return renderer
+        raise RuntimeError(
+            "No PDF renderer available: install WeasyPrint or xhtml2pdf, or wkhtmltopdf"
+        )
+
+    renderer = RENDERERS.get(name)
+    if renderer is None:
+        raise RuntimeError(f"Unknown PDF renderer: {name}")
+    if not renderer.available():
+        raise RuntimeError(f"PDF renderer {name} is not available")
+    return renderer
+
+
+# ------------------------------------------------------------
+# INVOICE PDF
+# ------------------------------------------------------------
+
+def generate_invoice_pdf(invoice, vendor, items, renderer=None):
     """
-    Generate invoice/estimate/quote PDF using wkhtmltopdf (Windows‑safe).
+    Generate invoice/estimate/quote PDF with the configured renderer
+    (or the backend named by `renderer`).
     Returns: (filename, full_path)
     """
 
@@ -37,39 +240,89 @@ def generate_invoice_pdf(invoice, vendor, items):
 
     pdf_path = os.path.join(output_dir, filename)
 
-    # Temporary HTML file
-    temp_html_path = os.path.join(output_dir, f"{filename}.html")
-    with open(temp_html_path, "w", encoding="utf-8") as f:
-        f.write(html)
+    get_renderer(renderer).render(html, pdf_path)
 
-    # Path to wkhtmltopdf
-    wkhtml_path = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
+    return filename, pdf_path
 
-    # CSS file
-    css_path = os.path.join(
-        current_app.config["BASE_DIR"],
-        "static",
-        "css",
-        "print.css"
-    )
 
-    # Build wkhtmltopdf command
-    command = [
-        wkhtml_path,
-        "--enable-local-file-access",
-        "--print-media-type",
-        temp_html_path,
-        pdf_path
+def benchmark_renderers(count=20, item_count=15):
+    """
+    Render the same sample invoice `count` times with every available
+    backend. Needs a request context (the template uses url_for).
+    Returns {name: {"first_s", "per_invoice_s", "invoices_per_s"}}.
+    """
+    invoice = {
+        "num": "BENCH-0001",
+        "date": "2025-01-01",
+        "invoice_type": "Invoice",
+        "comments": "Benchmark invoice",
+        "terms_conditions": "Net 30",
+        "ship_cost": 25.0,
+        "tax_rate": 8.0,
+        "tax": 80.0,
+        "subtotal": 1000.0,
+        "total": 1105.0,
+        "delivery_date": "2025-01-15",
+        "signature_name": "",
+        "signature_position": "",
+        "signature_image_path": None,
+        "gst_number": "",
+        "template": "classic",
+    }
+    vendor = {"name": "ACME Laboratories"}
+    items = [
+        {
+            "item": f"Reagent {i}",
+            "lot_number": f"LOT-{i:04d}",
+            "qty": 2,
+            "units": "ea",
+            "unit_price": 33.33,
+            "line_total": 66.66,
+        }
+        for i in range(item_count)
     ]
+    html = render_template(
+        "invoice/pdf_template.html", invoice=invoice, vendor=vendor, items=items
+    )
 
-    # Run wkhtmltopdf
-    try:
-        subprocess.run(command, check=True)
-    except Exception as e:
-        raise RuntimeError(f"wkhtmltopdf failed: {e}")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, renderer in RENDERERS.items():
+            if not renderer.available():
+                continue
+            pdf_path = os.path.join(tmp, f"{name}.pdf")
 
-    # Cleanup temp HTML
-    if os.path.exists(temp_html_path):
-        os.remove(temp_html_path)
+            started = time.perf_counter()
+            renderer.render(html, pdf_path)
+            first = time.perf_counter() - started
 
-    return filename, pdf_path
+            started = time.perf_counter()
+            for _ in range(count):
+                renderer.render(html, pdf_path)
+            per = (time.perf_counter() - started) / count
+
+            results[name] = {
+                "first_s": round(first, 4),
+                "per_invoice_s": round(per, 4),
+                "invoices_per_s": round(1 / per, 1) if per else None,
+            }
+    return results
+
+
+if __name__ == "__main__":
+    # python -m app.services.invoice_pdf [count]
+    import sys
+
+    from app import create_app
+
+    app = create_app(preload_models=False)
+    with app.test_request_context():
+        results = benchmark_renderers(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
+
+    if not results:
+        print("No PDF renderer available")
+    for name, r in results.items():
+        print(
+            f"{name:12s} first {r['first_s']}s, "
+            f"{r['per_invoice_s']}s/invoice ({r['invoices_per_s']} invoices/s)"
+        )
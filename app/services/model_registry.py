@@ -0,0 +1,235 @@
+"""
+model_registry.py – Loads the redactor's AI models once per process.
+
+Model locations come from settings.json ("spacy_model_dir",
+"yolo_model_path"); relative paths are resolved against BASE_DIR, and
+the defaults point at Ai/trained_model where the training backend
+writes its output.
+
+preload_models(app) loads both models in a background thread at
+startup and runs one warm-up inference on each, so the first
+suggestion request does not pay for model load and torch/spaCy
+initialisation. model_status() reports readiness and timings for the
+health endpoint.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from flask import current_app, has_app_context
+
+from app.services.pdf import file_digest
+from app.services.settings import load_settings
+
+DEFAULT_SPACY_MODEL_DIR = os.path.join("Ai", "trained_model", "spacy", "model-best")
+DEFAULT_YOLO_MODEL_PATH = os.path.join(
+    "Ai", "trained_model", "yolo", "sensitive_yolo2", "weights", "best.pt"
+)
+
+WARMUP_TEXT = "Invoice for John Smith, ACME Corp, 555-0100, john@example.com"
+
+_lock = threading.Lock()
+_loaded = False
+_nlp = None
+_yolo_model = None
+_version = None
+_status = {
+    "spacy": {"path": None, "loaded": False, "load_s": None, "warmup_s": None, "error": None},
+    "yolo": {"path": None, "loaded": False, "load_s": None, "warmup_s": None, "error": None},
+}
+_preload_thread = None
+
+
+def _base_dir():
+    if has_app_context():
+        return current_app.config["BASE_DIR"]
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def model_paths():
+    """Return (spacy_model_dir, yolo_model_path) from settings."""
+    spacy_dir = DEFAULT_SPACY_MODEL_DIR
+    yolo_path = DEFAULT_YOLO_MODEL_PATH
+    if has_app_context():
+        settings = load_settings()
+        spacy_dir = settings.get("spacy_model_dir") or spacy_dir
+        yolo_path = settings.get("yolo_model_path") or yolo_path
+
+    base = _base_dir()
+    return (
+        os.path.join(base, spacy_dir) if not os.path.isabs(spacy_dir) else spacy_dir,
+        os.path.join(base, yolo_path) if not os.path.isabs(yolo_path) else yolo_path,
+    )
+
+
+def _spacy_version(model_dir):
+    """
+    Identify a spaCy pipeline directory: meta.json version plus a hash
+    of every file's name, size and mtime (changes on each retrain).
+    """
+    version = "?"
+    try:
+        with open(os.path.join(model_dir, "meta.json"), encoding="utf-8") as f:
+            version = json.load(f).get("version", "?")
+    except (OSError, ValueError):
+        pass
+
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            st = os.stat(full)
+            h.update(f"{os.path.relpath(full, model_dir)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return f"{version}-{h.hexdigest()[:16]}"
+
+
+# spaCy and ultralytics (torch) are imported on first load rather than
+# with this module: importing the app, as spawned OCR and redaction
+# workers do, must not pay seconds and hundreds of MB for them
+
+def _import_spacy():
+    try:
+        import spacy
+    except ImportError:
+        return None
+    return spacy
+
+
+def _import_yolo():
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        return None
+    return YOLO
+
+
+def _load_spacy(path, warmup):
+    st = _status["spacy"]
+    st["path"] = path
+    spacy = _import_spacy()
+    if spacy is None:
+        st["error"] = "spaCy is not installed"
+        return None
+    if not os.path.isdir(path):
+        st["error"] = f"spaCy model directory not found: {path}"
+        print("❌", st["error"])
+        return None
+
+    try:
+        started = time.perf_counter()
+        nlp = spacy.load(path)
+        st["load_s"] = round(time.perf_counter() - started, 3)
+
+        if warmup:
+            started = time.perf_counter()
+            nlp(WARMUP_TEXT)
+            st["warmup_s"] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        st["error"] = f"spaCy load error: {e}"
+        print("❌", st["error"])
+        return None
+
+    st["loaded"] = True
+    return nlp
+
+
+def _load_yolo(path, warmup):
+    st = _status["yolo"]
+    st["path"] = path
+    YOLO = _import_yolo()
+    if YOLO is None:
+        st["error"] = "ultralytics is not installed"
+        return None
+    if not os.path.exists(path):
+        st["error"] = f"YOLO weights not found: {path}"
+        print("❌", st["error"])
+        return None
+
+    try:
+        started = time.perf_counter()
+        model = YOLO(path)
+        st["load_s"] = round(time.perf_counter() - started, 3)
+
+        if warmup:
+            started = time.perf_counter()
+            model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+            st["warmup_s"] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        st["error"] = f"YOLO load error: {e}"
+        print("❌", st["error"])
+        return None
+
+    st["loaded"] = True
+    return model
+
+
+def ensure_loaded(warmup=True):
+    """
+    Load the configured models once per process (blocking until a
+    preload already in progress finishes).
+    Returns (nlp or None, yolo_model or None, version or None).
+    """
+    global _loaded, _nlp, _yolo_model, _version
+
+    with _lock:
+        if not _loaded:
+            for st in _status.values():
+                st.update(loaded=False, load_s=None, warmup_s=None, error=None)
+
+            spacy_dir, yolo_path = model_paths()
+            _nlp = _load_spacy(spacy_dir, warmup)
+            _yolo_model = _load_yolo(yolo_path, warmup)
+
+            parts = []
+            try:
+                if _nlp is not None:
+                    parts.append("spacy=" + _spacy_version(spacy_dir))
+                if _yolo_model is not None:
+                    parts.append("yolo=" + file_digest(yolo_path)[:16])
+            except OSError as e:
+                print("❌ Model fingerprint error:", e)
+            _version = ";".join(parts) or None
+            _loaded = True
+
+        return _nlp, _yolo_model, _version
+
+
+def reload_models(warmup=True):
+    """Drop the loaded models and load them again (e.g. after retraining)."""
+    global _loaded
+    with _lock:
+        _loaded = False
+    return ensure_loaded(warmup=warmup)
+
+
+def preload_models(app):
+    """Load and warm up the models in a background thread."""
+    global _preload_thread
+
+    def run():
+        with app.app_context():
+            settings = load_settings()
+            ensure_loaded(warmup=settings.get("warmup_models", True))
+
+    with _lock:
+        if _preload_thread is not None or _loaded:
+            return
+        _preload_thread = threading.Thread(target=run, name="model-preload", daemon=True)
+        _preload_thread.start()
+
+
+def model_status():
+    """Readiness and timings for each model (never waits on a load)."""
+    models = {name: dict(st) for name, st in _status.items()}
+    loaded = _loaded
+    return {
+        "ready": loaded and any(st["loaded"] for st in models.values()),
+        "loading": not loaded and _preload_thread is not None and _preload_thread.is_alive(),
+        "version": _version,
+        "models": models,
+    }
@@ -1,69 +1,292 @@
-import io
+"""
+ocr.py – Tesseract OCR for scanned PDF pages.
+
+Pages are rendered straight to 8-bit grayscale and handed to Tesseract
+as raw samples, with no PNG encode/decode in between. Multi-page jobs
+(ocr_pages, ocr_document) are spread over a process pool (OCR_WORKERS,
+default: one per core); the suggestion engine sends each chunk's
+scanned pages through it.
+
+Each page keeps Tesseract's word boxes alongside the text (normalized
+0-1 page coordinates), so suggestions found in OCR text can be
+redacted on pages that have no text layer.
+
+Results are cached on disk in OUTPUT_FOLDER/ocr_cache, keyed by
+(sha256 of the PDF, page, dpi, lang), so a page is never OCR'd twice.
+"""
+
+import json
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import fitz
 import pytesseract
 from PIL import Image
 from flask import current_app
 
+from app.services.doc_pool import open_pdf
+from app.services.pdf import file_digest
 
-def ocr_page(pdf_path, page_num, dpi=300):
-    """Extract text from a scanned PDF page using OCR."""
+DEFAULT_LANG = "eng"
 
-    # Ensure PDF exists
-    if not os.path.exists(pdf_path):
-        return ""
+_executor = None
+_executor_workers = 1
+_executor_lock = threading.Lock()
 
-    try:
-        doc = fitz.open(pdf_path)
-    except Exception:
-        return ""
+
+# ------------------------------------------------------------
+# RENDER + RECOGNISE
+# ------------------------------------------------------------
+
+def _page_result(data, width, height):
+    """
+    Build {"text", "words"} from pytesseract.image_to_data() output.
+    Words are (x0, y0, x1, y1, word, block, line, word_no) like
+    page.get_text("words"), with the box normalized to the page; the
+    text has one line per Tesseract line and a blank line between blocks.
+    """
+    words = []
+    lines = []
+    last_block = last_line = None
+
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        if not word:
+            continue
+        block = data["block_num"][i]
+        line = (data["par_num"][i], data["line_num"][i])
+
+        if (block, line) != (last_block, last_line):
+            if last_block is not None and block != last_block:
+                lines.append([])
+            lines.append([])
+            last_block, last_line = block, line
+        lines[-1].append(word)
+
+        x0 = data["left"][i]
+        y0 = data["top"][i]
+        words.append((
+            x0 / width,
+            y0 / height,
+            (x0 + data["width"][i]) / width,
+            (y0 + data["height"][i]) / height,
+            word,
+            block,
+            line,
+            data["word_num"][i],
+        ))
+
+    return {"text": "\n".join(" ".join(ws) for ws in lines), "words": words}
+
+
+def _ocr_doc_page(doc, page_num, dpi, lang):
+    """
+    OCR one page of an open document.
+    Returns {"text", "words"} (see _page_result), or None if the page
+    could not be rendered or Tesseract failed (so failures are never
+    cached as empty pages).
+    """
 
     # Validate page index
     if page_num < 0 or page_num >= doc.page_count:
-        doc.close()
-        return ""
+        return None
 
     try:
-        # Render page as high-resolution image
-        pix = doc[page_num].get_pixmap(dpi=dpi)
-        img_bytes = pix.tobytes("png")
+        # Grayscale render (improves OCR accuracy); no alpha, no PNG
+        pix = doc[page_num].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+        img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
     except Exception:
-        doc.close()
-        return ""
+        return None
 
-    doc.close()
+    try:
+        data = pytesseract.image_to_data(
+            img, lang=lang, output_type=pytesseract.Output.DICT
+        )
+        return _page_result(data, pix.width, pix.height)
+    except Exception:
+        return None
 
-    # Convert to PIL image
+
+def _ocr_pages_worker(pdf_path, pages, dpi, lang):
+    """
+    Process-pool task: open the PDF once and OCR a run of pages.
+    Returns [(page, result or None), ...].
+    """
     try:
-        img = Image.open(io.BytesIO(img_bytes))
+        doc = fitz.open(pdf_path)
     except Exception:
-        return ""
+        return [(p, None) for p in pages]
+
+    try:
+        return [(p, _ocr_doc_page(doc, p, dpi, lang)) for p in pages]
+    finally:
+        doc.close()
+
+
+def _get_executor():
+    """Return (executor, worker count), starting the pool on first use."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None:
+            _executor_workers = current_app.config.get("OCR_WORKERS") or os.cpu_count() or 1
+            # First use is on a request or suggestion-job thread: spawn, so
+            # workers never inherit a lock another thread was holding
+            _executor = ProcessPoolExecutor(
+                max_workers=_executor_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor, _executor_workers
+
+
+def _reset_executor(broken):
+    """Discard a broken pool so _get_executor() builds a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
 
-    # Convert to grayscale (improves OCR accuracy)
-    img = img.convert("L")
+# ------------------------------------------------------------
+# DISK CACHE
+# ------------------------------------------------------------
 
-    # OCR
+def _cache_path(digest, page_num, dpi, lang):
+    cache_dir = os.path.join(current_app.config["OUTPUT_FOLDER"], "ocr_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"{digest}_p{page_num}_{dpi}_{lang}.json")
+
+
+def _cache_get(path):
     try:
-        text = pytesseract.image_to_string(img)
+        with open(path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # JSON has no tuples: restore the word and line-key shapes
+    result["words"] = [
+        (*w[:6], tuple(w[6]), w[7]) for w in result["words"]
+    ]
+    return result
+
+
+def _cache_put(path, result):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(tmp, path)
+
+
+# ------------------------------------------------------------
+# PUBLIC API
+# ------------------------------------------------------------
+
+def _empty_result():
+    return {"text": "", "words": []}
+
+
+def _ocr_page_result(pdf_path, page_num, dpi, lang):
+    """OCR one page in process, through the disk cache."""
+
+    # Ensure PDF exists
+    if not os.path.exists(pdf_path):
+        return _empty_result()
+
+    cache = _cache_path(file_digest(pdf_path), page_num, dpi, lang)
+    result = _cache_get(cache)
+    if result is not None:
+        return result
+
+    try:
+        with open_pdf(pdf_path) as doc:
+            result = _ocr_doc_page(doc, page_num, dpi, lang)
     except Exception:
-        text = ""
+        return _empty_result()
 
-    return text
+    if result is None:
+        return _empty_result()
 
+    _cache_put(cache, result)
+    return result
 
-def ocr_document(pdf_path, dpi=300):
-    """Extract OCR text for all pages."""
+
+def ocr_page(pdf_path, page_num, dpi=300, lang=DEFAULT_LANG):
+    """Extract text from a scanned PDF page using OCR."""
+    return _ocr_page_result(pdf_path, page_num, dpi, lang)["text"]
+
+
+def ocr_page_results(pdf_path, pages, dpi=300, lang=DEFAULT_LANG):
+    """
+    OCR several pages of one PDF. Cached pages are read from disk; the
+    rest are split into runs of consecutive pages and OCR'd on the
+    process pool (a single page is done in process).
+    Returns {page: {"text", "words"}} (see _page_result); pages that
+    fail map to empty text and no words.
+    """
+    pages = list(pages)
+
+    # Ensure PDF exists
+    if not pages or not os.path.exists(pdf_path):
+        return {p: _empty_result() for p in pages}
+
+    digest = file_digest(pdf_path)
+    caches = {p: _cache_path(digest, p, dpi, lang) for p in pages}
+    found = {p: _cache_get(caches[p]) for p in pages}
+    missing = [p for p in pages if found[p] is None]
+
+    if len(missing) == 1:
+        found[missing[0]] = _ocr_page_result(pdf_path, missing[0], dpi, lang)
+    elif missing:
+        executor, workers = _get_executor()
+
+        # Runs of pages, a couple per worker, so each task parses the
+        # PDF once and the pool stays evenly loaded
+        size = max(1, -(-len(missing) // (workers * 2)))
+        runs = [missing[i:i + size] for i in range(0, len(missing), size)]
+
+        try:
+            futures = [
+                executor.submit(_ocr_pages_worker, pdf_path, run, dpi, lang)
+                for run in runs
+            ]
+            results = [item for fut in futures for item in fut.result()]
+        except BrokenProcessPool:
+            # A worker died (e.g. crashed on a malformed page); start a
+            # fresh pool next time instead of failing every later call
+            _reset_executor(executor)
+            results = [(p, None) for p in missing]
+
+        for p, result in results:
+            if result is None:
+                found[p] = _empty_result()
+                continue
+            found[p] = result
+            _cache_put(caches[p], result)
+
+    return found
+
+
+def ocr_pages(pdf_path, pages, dpi=300, lang=DEFAULT_LANG):
+    """Like ocr_page_results(), but returns {page: text}."""
+    results = ocr_page_results(pdf_path, pages, dpi=dpi, lang=lang)
+    return {p: r["text"] for p, r in results.items()}
+
+
+def ocr_document(pdf_path, dpi=300, lang=DEFAULT_LANG):
+    """Extract OCR text for all pages, OCR'ing uncached pages in parallel."""
 
     # Ensure PDF exists
     if not os.path.exists(pdf_path):
         return []
 
     try:
-        doc = fitz.open(pdf_path)
+        with open_pdf(pdf_path) as doc:
+            pages = doc.page_count
     except Exception:
         return []
 
-    pages = doc.page_count
-    doc.close()
-
-    return [ocr_page(pdf_path, p, dpi=dpi) for p in range(pages)]
+    texts = ocr_pages(pdf_path, range(pages), dpi=dpi, lang=lang)
+    return [texts[p] for p in range(pages)]
@@ -0,0 +1,74 @@
+"""
+pagination.py – Keyset (cursor) pagination helpers for list views.
+
+Listings pass ?cursor=<last key seen>&limit=<page size> instead of an
+OFFSET, so every page is an indexed range scan that costs the same on
+page 1 and page 5,000. Routes fetch limit + 1 rows; the extra look-ahead
+row tells us whether a next page exists.
+
+Any listing also answers ?format=json with the same page as JSON.
+"""
+
+from flask import current_app, request, url_for
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def page_args(cast=int):
+    """
+    Read ?cursor= and ?limit= from the current request.
+    Returns (cursor, limit). cursor is None on the first page (or when it
+    cannot be parsed with `cast`); limit is clamped to 1..MAX_PAGE_SIZE.
+    The default page size can be set with app.config["PAGE_SIZE"].
+    """
+    default = current_app.config.get("PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(request.args.get("limit", default))
+    except ValueError:
+        limit = default
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    cursor = request.args.get("cursor")
+    if cursor is not None and cast is not None:
+        try:
+            cursor = cast(cursor)
+        except ValueError:
+            cursor = None
+
+    return cursor, limit
+
+
+def split_page(rows, limit, key="id"):
+    """
+    Trim the look-ahead row fetched with LIMIT limit + 1.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1][key]
+
+
+def wants_json():
+    """True when the caller asked for the JSON variant of a listing."""
+    return request.args.get("format") == "json"
+
+
+def _listing_url(cursor):
+    args = request.args.to_dict()
+    args.pop("cursor", None)
+    if cursor is not None:
+        args["cursor"] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def pager(cursor, next_cursor):
+    """
+    Build the context used by templates/partials/pagination.html.
+    Links keep every other query arg (filters, limit) intact.
+    """
+    return {
+        "first_url": _listing_url(None) if cursor is not None else None,
+        "next_url": _listing_url(next_cursor) if next_cursor is not None else None,
+    }
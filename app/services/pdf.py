@@ -1,54 +1,204 @@
+"""
+pdf.py – Page rendering for the redactor viewer.
+
+Rendered pages are cached in OUTPUT_FOLDER/temp under content-addressed
+names (<sha256 of the PDF>_p<page>_<dpi>.png), so the same page of the
+same document is rasterized once no matter how often the viewer asks for
+it. The folder is capped at app.config["RENDER_CACHE_MAX_BYTES"]; the
+least recently served files are evicted first. A running byte count of
+the folder means it is only scanned when a new render pushes it past
+the cap, and each eviction trims it to RENDER_CACHE_LOW_WATER of the cap
+so the next misses do not scan again.
+"""
+
 import os
-import fitz
+import hashlib
+import threading
+from collections import OrderedDict
 from flask import current_app
 
+from app.services.doc_pool import open_pdf
+
+DEFAULT_RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Eviction trims the cache to this fraction of its cap
+RENDER_CACHE_LOW_WATER = 0.9
+
+# Digests remembered at most (a few hundred bytes each)
+DIGEST_MEMO_SIZE = 4096
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+# temp dir -> bytes in it, as of the last scan plus renders written since
+_cache_bytes = {}
+
+# path -> (mtime_ns, size, sha256 hex), least recently used first; saves
+# re-hashing big PDFs per page
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
 
-def temp_image_path(filename, page_num):
+def render_cache_stats():
+    """Return hit/miss/eviction counters and the hit ratio."""
+    with _lock:
+        stats = dict(_stats)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / total, 3) if total else 0.0
+    return stats
+
+
+def file_digest(path):
     """
-    Return a consistent temp thumbnail path:
-    BASE/output/temp/<filename>_page_<n>.png
+    SHA-256 of a file's contents, memoized on (mtime, size) so each
+    upload is hashed once rather than on every page request.
     """
-    temp_dir = os.path.join(
-        current_app.config["OUTPUT_FOLDER"],
-        "temp"
-    )
-    os.makedirs(temp_dir, exist_ok=True)
+    st = os.stat(path)
+    with _digests_lock:
+        cached = _digests.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            _digests.move_to_end(path)
+            return cached[2]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    _store_digest(path, st, digest)
+    return digest
+
+
+def _store_digest(path, st, digest):
+    with _digests_lock:
+        _digests[path] = (st.st_mtime_ns, st.st_size, digest)
+        _digests.move_to_end(path)
+        while len(_digests) > DIGEST_MEMO_SIZE:
+            _digests.popitem(last=False)
 
-    safe_name = filename.replace("/", "_").replace("\\", "_")
-    return os.path.join(temp_dir, f"{safe_name}_page_{page_num}.png")
+
+def remember_digest(path, digest):
+    """Record a digest computed elsewhere (e.g. while an upload was written)."""
+    _store_digest(path, os.stat(path), digest)
+
+
+def temp_dir():
+    path = os.path.join(current_app.config["OUTPUT_FOLDER"], "temp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def temp_image_path(key):
+    """
+    Return the cache path for a render key:
+    BASE/output/temp/<key>.png
+    """
+    return os.path.join(temp_dir(), f"{key}.png")
+
+
+def _max_cache_bytes():
+    return current_app.config.get("RENDER_CACHE_MAX_BYTES", DEFAULT_RENDER_CACHE_MAX_BYTES)
+
+
+def evict_renders(max_bytes=None):
+    """
+    Trim OUTPUT_FOLDER/temp to max_bytes, oldest-served files first, and
+    reset the running byte count from the scan.
+    Returns the number of files removed.
+    """
+    if max_bytes is None:
+        max_bytes = _max_cache_bytes()
+
+    directory = temp_dir()
+    entries = []
+    total = 0
+    for e in os.scandir(directory):
+        if not e.is_file() or e.name.endswith(".tmp"):
+            continue
+        st = e.stat()
+        entries.append((st.st_mtime, st.st_size, e.path))
+        total += st.st_size
+
+    removed = 0
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+
+    with _lock:
+        _cache_bytes[directory] = total
+    if removed:
+        _count("evictions", removed)
+    return removed
+
+
+def _note_render(size):
+    """Count a newly written render; evict once the cache passes its cap."""
+    directory = temp_dir()
+    max_bytes = _max_cache_bytes()
+    with _lock:
+        total = _cache_bytes.get(directory)
+        if total is not None:
+            total = _cache_bytes[directory] = total + size
+    if total is None:
+        # First render since startup: one scan learns the folder's size
+        evict_renders(max_bytes)
+    elif total > max_bytes:
+        evict_renders(int(max_bytes * RENDER_CACHE_LOW_WATER))
 
 
 def render_page(pdf_path, page_num, dpi=150):
     """
     Render a PDF page to a PNG image at the given DPI.
-    Returns the output PNG path or None.
+    Returns the cached PNG path or None. The file name (minus .png)
+    is stable for the same content, page and DPI and doubles as an ETag.
     """
 
     # Ensure PDF exists
-    if not os.path.exists(pdf_path):
+    if not os.path.exists(pdf_path) or page_num < 0:
         return None
 
-    try:
-        doc = fitz.open(pdf_path)
-    except Exception:
-        return None
+    key = f"{file_digest(pdf_path)}_p{page_num}_{dpi}"
+    out = temp_image_path(key)
 
-    # Validate page number
-    if page_num < 0 or page_num >= doc.page_count:
-        doc.close()
-        return None
+    # Cache hit: bump mtime so eviction sees it as recently used
+    if os.path.exists(out):
+        try:
+            os.utime(out)
+        except OSError:
+            pass
+        _count("hits")
+        return out
 
-    # Render page
-    pix = doc[page_num].get_pixmap(dpi=dpi)
+    _count("misses")
 
-    # Extract filename only
-    fname = os.path.basename(pdf_path)
+    try:
+        with open_pdf(pdf_path) as doc:
+            # Validate page number
+            if page_num >= doc.page_count:
+                return None
 
-    # Build output path
-    out = temp_image_path(fname, page_num)
+            # Render page
+            png = doc[page_num].get_pixmap(dpi=dpi).tobytes("png")
+    except Exception:
+        return None
 
-    # Save PNG
-    pix.save(out)
+    # Write via a temp name so concurrent requests never see a partial PNG
+    tmp = f"{out}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(png)
+    os.replace(tmp, out)
 
-    doc.close()
+    _note_render(len(png))
     return out
@@ -3,7 +3,7 @@ import fitz
 from flask import current_app
 
 
-def apply_redactions(pdf_path, changes):
+def apply_redactions(pdf_path, changes, output_dir=None):
     """
     Apply redactions to a PDF and save the result.
     'changes' is a list of dicts with normalized coordinates:
@@ -14,9 +14,17 @@ def apply_redactions(pdf_path, changes):
         "width": 0.3,
         "height": 0.1,
         "type": "area" or "text",
-        "text": "optional"
+        "text": "optional",
+        "rects": [[x0, y0, x1, y1]]   # optional, normalized word boxes
       }
 
+    Text changes with rects (e.g. from suggestions, including OCR'd
+    pages with no text layer) redact those boxes; the rest fall back to
+    searching the page text.
+
+    The result goes to output_dir (default: OUTPUT_FOLDER/redactions);
+    pass it explicitly when calling outside an app context.
+
     Returns: (output_filename, output_path) or (None, None) on failure.
     """
 
@@ -28,36 +36,52 @@ def apply_redactions(pdf_path, changes):
     except Exception:
         return None, None
 
-    # Apply all redactions
+    # Group by page so each page is processed once; pages without
+    # changes are never touched
+    by_page = {}
     for ch in changes:
         page_index = ch.get("page", 0)
 
         if page_index < 0 or page_index >= doc.page_count:
             continue
 
-        page = doc[page_index]
-
-        if ch.get("type") == "area":
-            x = ch.get("x", 0.0)
-            y = ch.get("y", 0.0)
-            w = ch.get("width", 0.0)
-            h = ch.get("height", 0.0)
-
-            rect = fitz.Rect(
-                x * page.rect.width,
-                y * page.rect.height,
-                (x + w) * page.rect.width,
-                (y + h) * page.rect.height,
-            )
-            page.add_redact_annot(rect, fill=(0, 0, 0))
-
-        elif ch.get("type") == "text":
-            text = ch.get("text", "")
-            if text:
-                for inst in page.search_for(text):
-                    page.add_redact_annot(inst, fill=(0, 0, 0))
+        by_page.setdefault(page_index, []).append(ch)
 
-        # Apply redactions for this page
+    for page_index, page_changes in by_page.items():
+        page = doc[page_index]
+        width = page.rect.width
+        height = page.rect.height
+        searched = set()
+
+        for ch in page_changes:
+            if ch.get("type") == "area":
+                x = ch.get("x", 0.0)
+                y = ch.get("y", 0.0)
+                w = ch.get("width", 0.0)
+                h = ch.get("height", 0.0)
+
+                rect = fitz.Rect(
+                    x * width,
+                    y * height,
+                    (x + w) * width,
+                    (y + h) * height,
+                )
+                page.add_redact_annot(rect, fill=(0, 0, 0))
+
+            elif ch.get("type") == "text" and ch.get("rects"):
+                for x0, y0, x1, y1 in ch["rects"]:
+                    rect = fitz.Rect(x0 * width, y0 * height, x1 * width, y1 * height)
+                    page.add_redact_annot(rect, fill=(0, 0, 0))
+
+            elif ch.get("type") == "text":
+                text = ch.get("text", "")
+                # One search per distinct text on this page
+                if text and text not in searched:
+                    searched.add(text)
+                    for inst in page.search_for(text):
+                        page.add_redact_annot(inst, fill=(0, 0, 0))
+
+        # Apply all of this page's redactions in one pass
         page.apply_redactions()
 
     # Build output name
@@ -65,19 +89,100 @@ def apply_redactions(pdf_path, changes):
     base, ext = os.path.splitext(original_name)
     output_filename = f"{base}_Redacted{ext}"
 
-    output_dir = os.path.join(
-        current_app.config["OUTPUT_FOLDER"],
-        "redactions",
-    )
+    if output_dir is None:
+        output_dir = os.path.join(
+            current_app.config["OUTPUT_FOLDER"],
+            "redactions",
+        )
     os.makedirs(output_dir, exist_ok=True)
 
     output_path = os.path.join(output_dir, output_filename)
 
+    # garbage=3 drops the unreferenced objects left behind by
+    # apply_redactions (including the original, unredacted content
+    # streams) and merges duplicates; deflate keeps the output small.
     try:
-        doc.save(output_path)
+        doc.save(output_path, garbage=3, deflate=True)
     except Exception:
         doc.close()
         return None, None
 
     doc.close()
     return output_filename, output_path
+
+
+def benchmark_redactions(boxes=500, pages=10):
+    """
+    Redact a generated `pages`-page document with `boxes` area boxes,
+    first applying each change on its own (the old loop), then with
+    apply_redactions(). Returns seconds and output sizes for both.
+    """
+    import random
+    import tempfile
+    import time
+
+    rng = random.Random(0)
+    changes = [
+        {
+            "page": i % pages,
+            "x": rng.uniform(0.05, 0.8),
+            "y": rng.uniform(0.05, 0.9),
+            "width": 0.1,
+            "height": 0.02,
+            "type": "area",
+        }
+        for i in range(boxes)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "bench.pdf")
+        doc = fitz.open()
+        for p in range(pages):
+            page = doc.new_page()
+            for line in range(60):
+                page.insert_text((40, 40 + line * 12), f"Page {p} line {line} " + "lorem ipsum " * 6)
+        doc.save(src)
+        doc.close()
+
+        # Old behaviour: re-process the page for every change
+        started = time.perf_counter()
+        doc = fitz.open(src)
+        for ch in changes:
+            page = doc[ch["page"]]
+            w, h = page.rect.width, page.rect.height
+            page.add_redact_annot(
+                fitz.Rect(ch["x"] * w, ch["y"] * h, (ch["x"] + ch["width"]) * w,
+                          (ch["y"] + ch["height"]) * h),
+                fill=(0, 0, 0),
+            )
+            page.apply_redactions()
+        old_path = os.path.join(tmp, "old.pdf")
+        doc.save(old_path)
+        doc.close()
+        per_change = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, new_path = apply_redactions(src, changes, output_dir=os.path.join(tmp, "out"))
+        per_page = time.perf_counter() - started
+
+        return {
+            "boxes": boxes,
+            "pages": pages,
+            "per_change_s": round(per_change, 3),
+            "per_page_s": round(per_page, 3),
+            "per_change_bytes": os.path.getsize(old_path),
+            "per_page_bytes": os.path.getsize(new_path),
+        }
+
+
+if __name__ == "__main__":
+    # python -m app.services.redaction [boxes] [pages]
+    import sys
+
+    args = [int(a) for a in sys.argv[1:3]]
+    boxes, pages = args + [500, 10][len(args):]
+
+    r = benchmark_redactions(boxes, pages)
+    print(f"{r['boxes']} boxes, {r['pages']} page(s)")
+    print(f"apply per change   {r['per_change_s']}s, {r['per_change_bytes']} bytes")
+    print(f"apply per page     {r['per_page_s']}s, {r['per_page_bytes']} bytes")
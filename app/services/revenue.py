@@ -0,0 +1,166 @@
+"""
+revenue.py – Revenue analytics over precomputed rollups.
+
+revenue_rollup holds revenue and invoice counts per
+(day, vendor_id, invoice_type). Triggers on invoices keep it current
+(migration 009), so a chart over a year reads at most
+365 x vendors x types small rows instead of scanning invoices.
+Weekly and monthly buckets are summed from the daily rows.
+
+rebuild_rollups() recomputes the table from invoices, to repair it if
+invoices were ever written with the triggers missing (e.g. a restored
+backup). It aggregates in chunks with pandas when available and falls
+back to a SQL GROUP BY:
+
+    python -m app.services.revenue rebuild
+"""
+
+import time
+from datetime import date, timedelta
+
+from app.database import get_conn
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+# Bucket start date for each granularity (weeks start on Monday)
+BUCKETS = {
+    "day": "r.day",
+    "week": "date(r.day, 'weekday 0', '-6 days')",
+    "month": "substr(r.day, 1, 7) || '-01'",
+}
+
+GROUP_COLUMNS = ("vendor", "invoice_type")
+
+BACKFILL_CHUNK = 100_000
+
+
+def rebuild_rollups(conn, chunksize=BACKFILL_CHUNK):
+    """
+    Recompute revenue_rollup from the invoices table.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    conn.execute("DELETE FROM revenue_rollup")
+
+    if pd is None:
+        conn.execute("""
+            INSERT INTO revenue_rollup (day, vendor_id, invoice_type, revenue, invoices)
+            SELECT substr(date, 1, 10), COALESCE(vendor_id, 0), COALESCE(invoice_type, ''),
+                   COALESCE(SUM(total), 0), COUNT(*)
+            FROM invoices
+            WHERE date IS NOT NULL
+            GROUP BY 1, 2, 3
+        """)
+        return
+
+    parts = []
+    for chunk in pd.read_sql_query(
+        """
+        SELECT substr(date, 1, 10) AS day,
+               COALESCE(vendor_id, 0) AS vendor_id,
+               COALESCE(invoice_type, '') AS invoice_type,
+               COALESCE(total, 0) AS total
+        FROM invoices
+        WHERE date IS NOT NULL
+        """,
+        conn,
+        chunksize=chunksize,
+    ):
+        parts.append(
+            chunk.groupby(["day", "vendor_id", "invoice_type"], sort=False)["total"]
+            .agg(["sum", "count"])
+        )
+    if not parts:
+        return
+
+    totals = pd.concat(parts).groupby(level=[0, 1, 2], sort=False).sum()
+    conn.executemany(
+        """
+        INSERT INTO revenue_rollup (day, vendor_id, invoice_type, revenue, invoices)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            (day, int(vendor_id), invoice_type, float(s), int(n))
+            for (day, vendor_id, invoice_type), s, n in zip(
+                totals.index, totals["sum"], totals["count"]
+            )
+        ),
+    )
+
+
+def revenue_series(granularity="month", start=None, end=None,
+                   vendor_id=None, invoice_type=None, group_by=()):
+    """
+    Revenue per time bucket between start and end (ISO dates, inclusive;
+    default: the last 365 days), optionally filtered by vendor_id and
+    invoice_type and split by any of GROUP_COLUMNS.
+    Returns [{"bucket", "revenue", "invoices", ...group columns}, ...].
+    """
+    bucket = BUCKETS[granularity]
+    end = end or date.today().isoformat()
+    start = start or (date.fromisoformat(end) - timedelta(days=365)).isoformat()
+
+    select = [f"{bucket} AS bucket"]
+    group = ["bucket"]
+    join = ""
+    if "vendor" in group_by:
+        select += ["r.vendor_id", "v.name AS vendor"]
+        group.append("r.vendor_id")
+        join = "LEFT JOIN vendors v ON v.id = r.vendor_id"
+    if "invoice_type" in group_by:
+        select.append("r.invoice_type")
+        group.append("r.invoice_type")
+
+    where = ["r.day BETWEEN ? AND ?"]
+    params = [start, end]
+    if vendor_id is not None:
+        where.append("r.vendor_id = ?")
+        params.append(vendor_id)
+    if invoice_type is not None:
+        where.append("r.invoice_type = ?")
+        params.append(invoice_type)
+
+    rows = get_conn().execute(f"""
+        SELECT {", ".join(select)},
+               ROUND(SUM(r.revenue), 2) AS revenue,
+               SUM(r.invoices) AS invoices
+        FROM revenue_rollup r
+        {join}
+        WHERE {" AND ".join(where)}
+        GROUP BY {", ".join(group)}
+        ORDER BY {", ".join(group)}
+    """, params).fetchall()
+
+    return [dict(r) for r in rows]
+
+
+def rebuild(conn):
+    """Rebuild revenue_rollup in its own transaction. Returns (rows, seconds)."""
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rebuild_rollups(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    rows = conn.execute("SELECT COUNT(*) FROM revenue_rollup").fetchone()[0]
+    return rows, round(time.perf_counter() - started, 3)
+
+
+if __name__ == "__main__":
+    # python -m app.services.revenue rebuild
+    import sys
+
+    from app import create_app
+
+    if sys.argv[1:2] != ["rebuild"]:
+        print("usage: python -m app.services.revenue rebuild")
+        raise SystemExit(2)
+
+    app = create_app(preload_models=False)
+    with app.app_context():
+        rows, seconds = rebuild(get_conn())
+    print(f"revenue_rollup rebuilt: {rows} rows in {seconds}s")
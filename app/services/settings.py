@@ -1,5 +1,8 @@
 import os
+import copy
 import json
+import tempfile
+import threading
 from flask import Blueprint, jsonify, request, current_app
 
 settings_bp = Blueprint("settings", __name__, url_prefix="/settings")
@@ -9,6 +12,11 @@ def settings_file():
     return os.path.join(current_app.config["BASE_DIR"], "settings.json")
 
 
+# settings.json path -> ((mtime_ns, size) or None, merged settings)
+_cache = {}
+_lock = threading.Lock()
+
+
 # Default settings structure
 DEFAULT_SETTINGS = {
     "theme": "light",
@@ -27,6 +35,8 @@ DEFAULT_SETTINGS = {
     "default_template": "classic",
     "default_signature_id": "",
     "default_gst": "",
+    "pdf_renderer": "auto",         # auto | weasyprint | xhtml2pdf | wkhtmltopdf
+    "wkhtmltopdf_path": "",         # empty: PATH, then the Windows default
 
     # -------------------------
     # NEW: Email Settings
@@ -37,6 +47,14 @@ DEFAULT_SETTINGS = {
     "smtp_password": "",
     "smtp_from": "",
 
+    # -------------------------
+    # AI Models (relative paths are under the app folder)
+    # -------------------------
+    "spacy_model_dir": "Ai/trained_model/spacy/model-best",
+    "yolo_model_path": "Ai/trained_model/yolo/sensitive_yolo2/weights/best.pt",
+    "preload_models": True,
+    "warmup_models": True,
+
     # -------------------------
     # Shortcuts
     # -------------------------
@@ -79,31 +97,67 @@ def merge_defaults(existing):
 
 
 def load_settings():
-    """Load settings.json or create defaults."""
+    """
+    Return the settings (settings.json merged with defaults).
+    The parsed file is cached until its mtime or size changes, and
+    reading never writes: a missing or unreadable file yields the
+    defaults until the next save_settings().
+    Callers get their own copy and may modify it freely.
+    """
     path = settings_file()
 
-    if not os.path.exists(path):
-        save_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS
-
     try:
-        with open(path, "r") as f:
-            data = json.load(f)
-    except Exception:
-        save_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == stamp:
+            return copy.deepcopy(cached[1])
+
+    data = {}
+    if stamp is not None:
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except Exception:
+            data = {}
 
     # Merge new defaults without overwriting user settings
     merged = merge_defaults(data)
-    save_settings(merged)
-    return merged
+
+    with _lock:
+        _cache[path] = (stamp, merged)
+    return copy.deepcopy(merged)
 
 
 def save_settings(data):
-    """Save settings.json."""
+    """
+    Save settings.json atomically: write a temp file in the same folder
+    and rename it over the old one, so readers never see half a file.
+    """
     path = settings_file()
-    with open(path, "w") as f:
-        json.dump(data, f, indent=4)
+    merged = merge_defaults(data)
+
+    with _lock:
+        fd, tmp = tempfile.mkstemp(
+            prefix=".settings-", suffix=".tmp", dir=os.path.dirname(path)
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(merged, f, indent=4)
+            if os.path.exists(path):
+                os.chmod(tmp, os.stat(path).st_mode & 0o777)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        st = os.stat(path)
+        _cache[path] = ((st.st_mtime_ns, st.st_size), copy.deepcopy(merged))
 
 
 # -------------------------
@@ -117,6 +171,8 @@ def api_get_settings():
 
 @settings_bp.post("/save")
 def api_save_settings():
-    data = request.json
+    # Keep keys the settings form does not edit (e.g. model paths)
+    data = load_settings()
+    data.update(request.json or {})
     save_settings(data)
     return jsonify({"success": True})
@@ -0,0 +1,110 @@
+"""
+suggestion_cache.py – Persistent cache of finished suggestion runs.
+
+A run is stored in the suggestion_cache table under a key built from
+the PDF's SHA-256, the loaded models' fingerprint (model_version()) and
+the options (ocr flag, min_conf). Reopening a document or switching
+workspace tabs replays the stored pages instead of running YOLO, spaCy
+and OCR again. Retraining either model changes the fingerprint, so old
+entries stop matching and are dropped the next time a run is stored.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+
+from app.database import get_conn
+from app.services.doc_pool import open_pdf
+from app.services.pdf import file_digest
+from app.services.suggestions import RESULT_FORMAT, iter_suggestions, model_version
+
+
+def _options(use_ocr, min_conf):
+    ocr = "force" if use_ocr == "force" else ("1" if use_ocr else "0")
+    return json.dumps(
+        {"ocr": ocr, "min_conf": round(float(min_conf), 3), "format": RESULT_FORMAT},
+        sort_keys=True,
+    )
+
+
+def cache_key(pdf_sha256, models, options):
+    return hashlib.sha256(f"{pdf_sha256}|{models}|{options}".encode()).hexdigest()
+
+
+def iter_cached_suggestions(pdf_path, use_ocr=False, min_conf=0.0, hit=None):
+    """
+    Same contract as iter_suggestions(), served from the cache when this
+    document was already analysed with the same models and options.
+    A complete fresh run is stored on the way through.
+    If `hit` is a dict, hit["cached"] is set to True or False.
+    """
+    try:
+        pdf_sha256 = file_digest(pdf_path)
+    except OSError:
+        pdf_sha256 = None
+
+    models = model_version()
+    options = _options(use_ocr, min_conf)
+    conn = get_conn()
+
+    if hit is not None:
+        hit["cached"] = False
+
+    if pdf_sha256 is None or models == "none":
+        yield from iter_suggestions(pdf_path, use_ocr=use_ocr, min_conf=min_conf)
+        return
+
+    key = cache_key(pdf_sha256, models, options)
+    row = conn.execute(
+        "SELECT pages FROM suggestion_cache WHERE cache_key = ?", (key,)
+    ).fetchone()
+    if row:
+        if hit is not None:
+            hit["cached"] = True
+        yield from json.loads(row["pages"])
+        return
+
+    pages = []
+    for result in iter_suggestions(pdf_path, use_ocr=use_ocr, min_conf=min_conf):
+        pages.append(result)
+        yield result
+
+    # Only complete runs are stored; a run cut short by a bad page is not
+    try:
+        with open_pdf(pdf_path) as doc:
+            complete = len(pages) == doc.page_count
+    except Exception:
+        complete = False
+    if not pages or not complete:
+        return
+
+    # Entries for older models can never match again
+    conn.execute("DELETE FROM suggestion_cache WHERE model_version != ?", (models,))
+    conn.execute("""
+        INSERT OR REPLACE INTO suggestion_cache
+            (cache_key, pdf_sha256, model_version, options, pages, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (
+        key,
+        pdf_sha256,
+        models,
+        options,
+        json.dumps(pages),
+        datetime.now().isoformat(timespec="seconds"),
+    ))
+    conn.commit()
+
+
+def cached_suggestions(pdf_path, use_ocr=False, min_conf=0.0, report=None, hit=None):
+    """
+    Cached counterpart of extract_suggestions(): returns the flat list of
+    suggestions and appends per-page reports to `report` if given.
+    """
+    all_suggestions = []
+
+    for result in iter_cached_suggestions(pdf_path, use_ocr=use_ocr, min_conf=min_conf, hit=hit):
+        all_suggestions.extend(result["suggestions"])
+        if report is not None:
+            report.append(result["report"])
+
+    return all_suggestions
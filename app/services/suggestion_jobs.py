@@ -0,0 +1,147 @@
+"""
+suggestion_jobs.py – Background suggestion runs for the redactor.
+
+start_job() records a job in suggestion_jobs, hands it to a small local
+worker pool (SUGGESTION_WORKERS, default 2) and returns the job id at
+once. The worker stores each page's suggestions in suggestion_job_pages
+as soon as that page is finished, so the viewer can poll job_status()
+and show the first pages while the rest are still running. Runs already
+in the suggestion cache complete immediately.
+
+Jobs older than JOB_RETENTION are pruned whenever a new job starts.
+"""
+
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app.database import get_conn
+from app.services.doc_pool import open_pdf
+from app.services.suggestion_cache import iter_cached_suggestions
+
+DEFAULT_WORKERS = 2
+JOB_RETENTION = timedelta(days=1)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get("SUGGESTION_WORKERS", DEFAULT_WORKERS),
+                thread_name_prefix="suggestions",
+            )
+        return _executor
+
+
+def _prune(conn):
+    cutoff = (datetime.now() - JOB_RETENTION).isoformat(timespec="seconds")
+    conn.execute("""
+        DELETE FROM suggestion_job_pages
+        WHERE job_id IN (SELECT id FROM suggestion_jobs WHERE created_at < ?)
+    """, (cutoff,))
+    conn.execute("DELETE FROM suggestion_jobs WHERE created_at < ?", (cutoff,))
+
+
+def _set_status(conn, job_id, status, **fields):
+    fields["status"] = status
+    fields["updated_at"] = _now()
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    conn.execute(f"UPDATE suggestion_jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+
+
+def _run_job(app, job_id, pdf_path, use_ocr, min_conf):
+    """Worker body: run the engine and persist every finished page."""
+    with app.app_context():
+        conn = get_conn()
+        try:
+            with open_pdf(pdf_path) as doc:
+                pages_total = doc.page_count
+            _set_status(conn, job_id, "running", pages_total=pages_total)
+
+            for result in iter_cached_suggestions(pdf_path, use_ocr=use_ocr, min_conf=min_conf):
+                conn.execute("""
+                    INSERT OR REPLACE INTO suggestion_job_pages (job_id, page, suggestions, report)
+                    VALUES (?, ?, ?, ?)
+                """, (
+                    job_id,
+                    result["page"],
+                    json.dumps(result["suggestions"]),
+                    json.dumps(result["report"]),
+                ))
+                conn.execute("""
+                    UPDATE suggestion_jobs
+                    SET pages_done = pages_done + 1, updated_at = ?
+                    WHERE id = ?
+                """, (_now(), job_id))
+                conn.commit()
+
+            _set_status(conn, job_id, "done")
+        except Exception as e:
+            conn.rollback()
+            _set_status(conn, job_id, "error", error=str(e))
+
+
+def start_job(pdf_path, filename, use_ocr=False, min_conf=0.0):
+    """Queue a suggestion run for pdf_path and return its job id."""
+    job_id = uuid.uuid4().hex
+    now = _now()
+
+    conn = get_conn()
+    _prune(conn)
+    conn.execute("""
+        INSERT INTO suggestion_jobs (id, filename, options, status, created_at, updated_at)
+        VALUES (?, ?, ?, 'queued', ?, ?)
+    """, (job_id, filename, json.dumps({"ocr": use_ocr, "min_conf": min_conf}), now, now))
+    conn.commit()
+
+    app = current_app._get_current_object()
+    _get_executor().submit(_run_job, app, job_id, pdf_path, use_ocr, min_conf)
+    return job_id
+
+
+def job_status(job_id, after=-1):
+    """
+    Return the job's progress plus the suggestions of every finished
+    page numbered above `after`, or None if the job does not exist.
+    Poll again with after=<last_page> to receive only new pages.
+    """
+    conn = get_conn()
+    job = conn.execute("SELECT * FROM suggestion_jobs WHERE id = ?", (job_id,)).fetchone()
+    if not job:
+        return None
+
+    rows = conn.execute("""
+        SELECT page, suggestions, report
+        FROM suggestion_job_pages
+        WHERE job_id = ? AND page > ?
+        ORDER BY page
+    """, (job_id, after)).fetchall()
+
+    suggestions = []
+    for r in rows:
+        suggestions.extend(json.loads(r["suggestions"]))
+
+    return {
+        "job_id": job["id"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "error": job["error"],
+        "pages_total": job["pages_total"],
+        "pages_done": job["pages_done"],
+        "suggestions": suggestions,
+        "pages": [json.loads(r["report"]) for r in rows],
+        "last_page": rows[-1]["page"] if rows else after,
+    }
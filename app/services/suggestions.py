@@ -11,140 +11,256 @@ Output format matches what the frontend expects:
     "text": "John Doe",
     "page": 0,
     "bbox": [x1, y1, x2, y2],   # for area-based redactions (YOLO)
+    "rects": [[x0, y0, x1, y1]],  # normalized 0-1 page boxes, one per line
     "mode": "area" or "text"
   }
+
+Text entities are resolved to word boxes from the page's text layer,
+or from Tesseract's word boxes for text found by OCR; only entities
+matching no word keep rects None and fall back to text search when
+applied.
 """
 
-import io
+import bisect
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import fitz
 import numpy as np
-from PIL import Image
-
-from app.services.ocr import ocr_page
+from flask import current_app, has_app_context
+
+from app.services.doc_pool import open_pdf
+from app.services.model_registry import ensure_loaded
+from app.services.ocr import ocr_page_results
+
+# A page needs OCR when its text layer has fewer than MIN_TEXT_CHARS
+# non-blank characters, or when images cover at least IMAGE_COVERAGE_OCR
+# of it and the text layer is still thinner than SPARSE_TEXT_CHARS
+# (a scan with only a stamped header or page number on top).
+MIN_TEXT_CHARS = 25
+SPARSE_TEXT_CHARS = 200
+IMAGE_COVERAGE_OCR = 0.5
+
+# Batching knobs; each can be overridden in app.config
+YOLO_BATCH_SIZE = 8
+YOLO_IMGSZ = 640
+SPACY_BATCH_SIZE = 16
+SPACY_N_PROCESS = 1
+
+# Only these spaCy components are needed for entities; any others the
+# pipeline ships with (tagger, parser, lemmatizer...) are skipped.
+SPACY_NER_PIPES = ("tok2vec", "transformer", "ner", "entity_ruler", "span_ruler")
+
+# Bumped whenever the suggestion dicts change shape, so cached results
+# from an older engine are not replayed
+RESULT_FORMAT = 3
 
-try:
-    import spacy
-    from ultralytics import YOLO
-except ImportError:
-    spacy = None
-    YOLO = None
+_nlp = None
+_yolo_model = None
+_model_version = None
 
-# -------------------------------------------------------------------
-# MODEL PATHS – YOUR TRAINED MODELS
-# -------------------------------------------------------------------
-# spaCy: use the trained pipeline directory (model-best)
-SPACY_MODEL_DIR = r"C:\projects\Rasesh_software\Ai\trained_model\spacy\model-best"
+# One inference thread: the YOLO predictor is not thread-safe, and it
+# lets OCR and spaCy carry on while a batch is being scored.
+_yolo_executor = None
+_yolo_executor_lock = threading.Lock()
 
-# YOLO: use the trained weights file
-YOLO_MODEL_PATH = r"C:\projects\Rasesh_software\Ai\trained_model\yolo\sensitive_yolo2\weights\best.pt"
 
-_nlp = None
-_yolo_model = None
+def model_version():
+    """
+    Fingerprint of the models currently loaded, e.g.
+    "spacy=1.0.0-ab12...;yolo=cd34..." (see model_registry). Cached
+    results are keyed by it, so they follow whatever this process runs.
+    """
+    _load_models()
+    return _model_version or "none"
 
 
 def _load_models():
     """
-    Lazy-load spaCy + YOLO models once per process.
+    Fetch spaCy + YOLO from the model registry, which loads them once
+    per process (usually already preloaded at startup).
     If anything fails, we fall back to no suggestions.
     """
-    global _nlp, _yolo_model
+    global _nlp, _yolo_model, _model_version
+    _nlp, _yolo_model, _model_version = ensure_loaded()
 
-    if spacy is None or YOLO is None:
-        return
 
-    # spaCy
-    if _nlp is None:
-        try:
-            if os.path.isdir(SPACY_MODEL_DIR):
-                _nlp = spacy.load(SPACY_MODEL_DIR)
-            else:
-                print("❌ spaCy model directory not found:", SPACY_MODEL_DIR)
-                _nlp = None
-        except Exception as e:
-            print("❌ spaCy load error:", e)
-            _nlp = None
+def _engine_option(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
 
-    # YOLO
-    if _yolo_model is None:
-        try:
-            if os.path.exists(YOLO_MODEL_PATH):
-                _yolo_model = YOLO(YOLO_MODEL_PATH)
-            else:
-                print("❌ YOLO weights not found:", YOLO_MODEL_PATH)
-                _yolo_model = None
-        except Exception as e:
-            print("❌ YOLO load error:", e)
-            _yolo_model = None
+
+def _get_yolo_executor():
+    global _yolo_executor
+    with _yolo_executor_lock:
+        if _yolo_executor is None:
+            _yolo_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo")
+        return _yolo_executor
 
 
-def _page_image(doc, page_index, dpi=150):
+def _page_array(doc, page_index, dpi=150):
     """
-    Render a single PDF page to a PIL image.
-    Returns PIL.Image or None.
+    Render a single PDF page straight into an HxWx3 BGR uint8 array
+    (the channel order YOLO expects for numpy input).
+    Returns np.ndarray or None.
     """
     try:
-        page = doc[page_index]
-        pix = page.get_pixmap(dpi=dpi)
-        img_bytes = pix.tobytes("png")
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-        return img
+        pix = doc[page_index].get_pixmap(dpi=dpi, alpha=False)
+        rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        return np.ascontiguousarray(rgb[:, :, 2::-1])
     except Exception as e:
         print("❌ Page render error:", e)
         return None
 
 
-def _run_yolo_on_page(img, page_index):
+def _word_spans(text, words, width, height):
     """
-    Run YOLO on a PIL image and return area-based suggestions.
-    Each suggestion has a bounding box in pixel coordinates.
+    Locate each of page.get_text("words") in the page text.
+    Returns (starts, spans): spans are (start, end, line_key, rect) in
+    text order with rect normalized to the page size; starts is the list
+    of span starts for bisecting.
     """
-    if _yolo_model is None or img is None:
-        return []
+    spans = []
+    cursor = 0
+    for x0, y0, x1, y1, word, block, line, _ in words:
+        pos = text.find(word, cursor)
+        if pos < 0:
+            continue
+        cursor = pos + len(word)
+        rect = (x0 / width, y0 / height, x1 / width, y1 / height)
+        spans.append((pos, cursor, (block, line), rect))
+    return [sp[0] for sp in spans], spans
 
-    suggestions = []
+
+def _entity_rects(word_index, start, end):
+    """
+    Union the word boxes overlapping text[start:end], one normalized
+    rect per text line. Returns a list of rects or None if no word
+    overlaps.
+    """
+    starts, spans = word_index
+    i = max(bisect.bisect_right(starts, start) - 1, 0)
+
+    lines = {}
+    while i < len(spans) and spans[i][0] < end:
+        s, e, key, (x0, y0, x1, y1) = spans[i]
+        if e > start:
+            if key in lines:
+                a0, b0, a1, b1 = lines[key]
+                lines[key] = (min(a0, x0), min(b0, y0), max(a1, x1), max(b1, y1))
+            else:
+                lines[key] = (x0, y0, x1, y1)
+        i += 1
+
+    if not lines:
+        return None
+    return [[round(v, 5) for v in r] for r in lines.values()]
+
+
+def text_layer_info(page, text):
+    """
+    Decide whether a page needs OCR from its existing text layer.
+    Returns {"chars", "image_coverage", "needs_ocr"}.
+    """
+    chars = sum(1 for ch in text if not ch.isspace())
+
+    coverage = 0.0
+    area = abs(page.rect)
+    if area:
+        try:
+            for info in page.get_image_info():
+                bbox = page.rect & info["bbox"]
+                coverage += abs(bbox)
+        except Exception:
+            pass
+        coverage = min(coverage / area, 1.0)
+
+    needs_ocr = chars < MIN_TEXT_CHARS or (
+        coverage >= IMAGE_COVERAGE_OCR and chars < SPARSE_TEXT_CHARS
+    )
+    return {
+        "chars": chars,
+        "image_coverage": round(coverage, 3),
+        "needs_ocr": needs_ocr,
+    }
+
+
+def _run_yolo_batch(batch, min_conf=0.0, imgsz=YOLO_IMGSZ):
+    """
+    Run YOLO on a batch of (page_index, array) pairs and return
+    area-based suggestions. Each suggestion has a bounding box in pixel
+    coordinates. Boxes scoring below min_conf are dropped.
+    """
+    batch = [(p, arr) for p, arr in batch if arr is not None]
+    if _yolo_model is None or not batch:
+        return []
 
     try:
-        arr = np.array(img)
-        results = _yolo_model(arr)
+        results = _yolo_model([arr for _, arr in batch], imgsz=imgsz, verbose=False)
     except Exception as e:
         print("❌ YOLO inference error:", e)
         return []
 
-    if not results:
-        return suggestions
-
-    res = results[0]
-    if not hasattr(res, "boxes") or res.boxes is None:
-        return suggestions
+    suggestions = []
 
-    for box in res.boxes:
-        try:
-            xyxy = box.xyxy[0].tolist()
-            x1, y1, x2, y2 = xyxy
-            cls_idx = int(box.cls[0])
-            label = _yolo_model.names.get(cls_idx, f"class_{cls_idx}")
-        except Exception:
+    for (page_index, arr), res in zip(batch, results or []):
+        if not hasattr(res, "boxes") or res.boxes is None:
             continue
+        height, width = arr.shape[:2]
 
-        suggestions.append(
-            {
-                "label": label,
-                "text": label,
-                "page": page_index,
-                "bbox": [float(x1), float(y1), float(x2), float(y2)],
-                "mode": "area",
-            }
-        )
+        for box in res.boxes:
+            try:
+                xyxy = box.xyxy[0].tolist()
+                x1, y1, x2, y2 = xyxy
+                cls_idx = int(box.cls[0])
+                label = _yolo_model.names.get(cls_idx, f"class_{cls_idx}")
+                conf = float(box.conf[0])
+            except Exception:
+                continue
+
+            if conf < min_conf:
+                continue
+
+            suggestions.append(
+                {
+                    "label": label,
+                    "text": label,
+                    "page": page_index,
+                    "bbox": [float(x1), float(y1), float(x2), float(y2)],
+                    "rects": [[x1 / width, y1 / height, x2 / width, y2 / height]],
+                    "mode": "area",
+                    "confidence": conf,
+                }
+            )
 
     return suggestions
 
 
+def _entity_suggestions(doc, page_index):
+    """
+    Turn a spaCy Doc into text-based suggestions. These do NOT have
+    bounding boxes; start/end are char offsets into the page text.
+    """
+    return [
+        {
+            "label": ent.label_,
+            "text": ent.text,
+            "page": page_index,
+            "bbox": None,
+            "rects": None,
+            "mode": "text",
+            "start": ent.start_char,
+            "end": ent.end_char,
+        }
+        for ent in doc.ents
+    ]
+
+
 def _run_spacy_on_page(text, page_index):
     """
-    Run spaCy NER on text and return text-based suggestions.
-    These do NOT have bounding boxes; they rely on text search.
+    Run spaCy NER on one page of text and return text-based suggestions.
     """
     if _nlp is None or not text:
         return []
@@ -155,78 +271,252 @@ def _run_spacy_on_page(text, page_index):
         print("❌ spaCy inference error:", e)
         return []
 
+    return _entity_suggestions(doc, page_index)
+
+
+def _run_spacy_batch(page_texts):
+    """
+    Run spaCy NER over [(page_index, text), ...] with nlp.pipe and
+    return text-based suggestions for all pages.
+    """
+    page_texts = [(p, t) for p, t in page_texts if t]
+    if _nlp is None or not page_texts:
+        return []
+
+    disable = [name for name in _nlp.pipe_names if name not in SPACY_NER_PIPES]
     suggestions = []
-    for ent in doc.ents:
-        suggestions.append(
-            {
-                "label": ent.label_,
-                "text": ent.text,
-                "page": page_index,
-                "bbox": None,
-                "mode": "text",
-            }
+
+    try:
+        docs = _nlp.pipe(
+            (t for _, t in page_texts),
+            batch_size=int(_engine_option("SPACY_BATCH_SIZE", SPACY_BATCH_SIZE)),
+            n_process=int(_engine_option("SPACY_N_PROCESS", SPACY_N_PROCESS)),
+            disable=disable,
         )
+        for (p, _), doc in zip(page_texts, docs):
+            suggestions.extend(_entity_suggestions(doc, p))
+    except Exception as e:
+        print("❌ spaCy inference error:", e)
+        return []
 
     return suggestions
 
 
-def extract_suggestions(pdf_path, use_ocr=False):
+def _page_count(pdf_path):
+    with open_pdf(pdf_path) as doc:
+        return doc.page_count
+
+
+def iter_suggestions(pdf_path, use_ocr=False, min_conf=0.0):
     """
-    Main entry point used by routes.py.
+    Generate suggestions page by page, in page order.
 
-    - pdf_path: full path to the uploaded PDF
-    - use_ocr: if True, also run OCR and feed that text into spaCy
+    Pages are processed in chunks of YOLO_BATCH_SIZE. A chunk is
+    rendered and its text extracted while holding the pooled document,
+    then YOLO scores it on the inference thread while the next chunk is
+    rendered and OCR and spaCy (nlp.pipe over the chunk) run here. The
+    document is released between chunks so the viewer is never blocked
+    for a whole run.
 
-    Returns a flat list of suggestion dicts.
+    Yields {"page", "suggestions", "report"} for each page; see
+    extract_suggestions for the options and the report fields.
     """
     if not os.path.exists(pdf_path):
         print("❌ PDF not found:", pdf_path)
-        return []
+        return
 
     _load_models()
 
     # If both models failed to load, just return empty.
     if _nlp is None and _yolo_model is None:
         print("❌ No AI models loaded.")
-        return []
+        return
 
     try:
-        doc = fitz.open(pdf_path)
+        page_count = _page_count(pdf_path)
     except Exception as e:
         print("❌ PDF open error:", e)
-        return []
+        return
 
-    all_suggestions = []
+    chunk_size = max(1, int(_engine_option("YOLO_BATCH_SIZE", YOLO_BATCH_SIZE)))
+    imgsz = _engine_option("YOLO_IMGSZ", YOLO_IMGSZ)
+    yolo = _get_yolo_executor() if _yolo_model is not None else None
 
-    try:
-        page_count = doc.page_count
-        for p in range(page_count):
-            # 1) Render page image for YOLO
-            img = _page_image(doc, p)
+    def start_chunk(pages):
+        """Render + extract text under the pooled doc; queue YOLO."""
+        batch = []
+        texts = {}
+        word_index = {}
+        reports = {}
 
-            # 2) Extract text for spaCy
-            try:
-                page = doc[p]
-                text = page.get_text("text") or ""
-            except Exception:
-                text = ""
+        with open_pdf(pdf_path) as doc:
+            for p in pages:
+                started = time.perf_counter()
+
+                # 1) Render page image for YOLO
+                if yolo is not None:
+                    batch.append((p, _page_array(doc, p)))
 
-            # Optional OCR text
-            if use_ocr:
+                # 2) Extract text for spaCy
                 try:
-                    ocr_text = ocr_page(pdf_path, p)
-                    if ocr_text:
-                        text = text + "\n" + ocr_text
-                except Exception as e:
-                    print("❌ OCR error:", e)
+                    page = doc[p]
+                    texts[p] = page.get_text("text") or ""
+                    layer = text_layer_info(page, texts[p])
+
+                    # Word boxes, so entities resolve to rects in one pass
+                    word_index[p] = _word_spans(
+                        texts[p], page.get_text("words"), page.rect.width, page.rect.height
+                    )
+                except Exception:
+                    texts[p] = ""
+                    word_index[p] = ([], [])
+                    layer = {"chars": 0, "image_coverage": 0.0, "needs_ocr": True}
+
+                reports[p] = dict(
+                    layer,
+                    page=p,
+                    ocr=False,
+                    ocr_ms=0.0,
+                    ms=(time.perf_counter() - started) * 1000,
+                )
+
+        pending = yolo.submit(_run_yolo_batch, batch, min_conf, imgsz) if batch else None
+        return pages, texts, word_index, reports, pending
+
+    def finish_chunk(pages, texts, word_index, reports, pending):
+        """OCR + spaCy for the chunk, then collect YOLO and yield pages."""
+
+        # Optional OCR text, only where the text layer is missing; the
+        # chunk's scanned pages go to the OCR process pool together
+        ocr_wanted = [
+            p for p in pages
+            if use_ocr == "force" or (use_ocr and reports[p]["needs_ocr"])
+        ]
+        if ocr_wanted:
+            ocr_started = time.perf_counter()
+            try:
+                ocr_results = ocr_page_results(pdf_path, ocr_wanted)
+            except Exception as e:
+                print("❌ OCR error:", e)
+                ocr_results = {}
+            # Pages are OCR'd in parallel; each is charged an equal share
+            ocr_ms = (time.perf_counter() - ocr_started) * 1000 / len(ocr_wanted)
+
+            for p in ocr_wanted:
+                result = ocr_results.get(p)
+                if result and result["text"]:
+                    # OCR words are already normalized; shift their
+                    # offsets past the text layer they are appended to
+                    offset = len(texts[p]) + 1
+                    texts[p] = texts[p] + "\n" + result["text"]
+                    _, ocr_spans = _word_spans(result["text"], result["words"], 1.0, 1.0)
+                    starts, spans = word_index[p]
+                    for s, e, key, rect in ocr_spans:
+                        starts.append(s + offset)
+                        spans.append((s + offset, e + offset, ("ocr",) + key, rect))
+                rep = reports[p]
+                rep["ocr"] = True
+                rep["ocr_ms"] = ocr_ms
+                rep["ms"] += ocr_ms
+
+        # spaCy suggestions (text-based), YOLO (area-based) first per page
+        text_suggestions = _run_spacy_batch([(p, texts[p]) for p in pages])
+        for sugg in text_suggestions:
+            sugg["rects"] = _entity_rects(word_index[sugg["page"]], sugg["start"], sugg["end"])
+        area_suggestions = pending.result() if pending is not None else []
+
+        by_page = {p: [] for p in pages}
+        for sugg in area_suggestions + text_suggestions:
+            by_page[sugg["page"]].append(sugg)
+
+        for p in pages:
+            rep = reports[p]
+            rep["ocr_ms"] = round(rep["ocr_ms"], 1)
+            rep["ms"] = round(rep["ms"], 1)
+            yield {"page": p, "suggestions": by_page[p], "report": rep}
+
+    # Chunk k+1 is rendered before chunk k is finished, so rendering
+    # overlaps YOLO inference; at most two chunks of images are held.
+    previous = None
+    for start in range(0, page_count, chunk_size):
+        try:
+            current = start_chunk(range(start, min(start + chunk_size, page_count)))
+        except Exception as e:
+            print("❌ PDF open error:", e)
+            current = None
 
-            # YOLO suggestions (area-based)
-            all_suggestions.extend(_run_yolo_on_page(img, p))
+        if previous is not None:
+            yield from finish_chunk(*previous)
+        if current is None:
+            return
+        previous = current
 
-            # spaCy suggestions (text-based)
-            all_suggestions.extend(_run_spacy_on_page(text, p))
+    if previous is not None:
+        yield from finish_chunk(*previous)
 
-    finally:
-        doc.close()
+
+def extract_suggestions(pdf_path, use_ocr=False, min_conf=0.0, report=None):
+    """
+    Main entry point used by routes.py.
+
+    - pdf_path: full path to the uploaded PDF
+    - use_ocr: False (no OCR), True (OCR only pages without a usable
+      text layer, see text_layer_info) or "force" (OCR every page);
+      OCR text is fed into spaCy
+    - min_conf: drop YOLO boxes below this confidence
+    - report: optional list; one dict per page is appended with the
+      text-layer stats, whether OCR ran, and timings in ms
+
+    Returns a flat list of suggestion dicts, area suggestions first
+    within each page.
+    """
+    all_suggestions = []
+
+    for result in iter_suggestions(pdf_path, use_ocr=use_ocr, min_conf=min_conf):
+        all_suggestions.extend(result["suggestions"])
+        if report is not None:
+            report.append(result["report"])
 
     return all_suggestions
+
+
+def benchmark_spacy(pdf_path, pages=50):
+    """
+    Compare per-page nlp(text) calls against one batched nlp.pipe run
+    over the text of `pages` pages (cycling through shorter PDFs).
+    Returns {"pages", "per_page_s", "batched_s", "speedup"}.
+    """
+    _load_models()
+    if _nlp is None:
+        raise RuntimeError("spaCy model not loaded")
+
+    with open_pdf(pdf_path) as doc:
+        texts = [doc[p].get_text("text") or "" for p in range(doc.page_count)]
+    page_texts = [(i, texts[i % len(texts)]) for i in range(pages)]
+
+    started = time.perf_counter()
+    for p, text in page_texts:
+        _run_spacy_on_page(text, p)
+    per_page = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _run_spacy_batch(page_texts)
+    batched = time.perf_counter() - started
+
+    return {
+        "pages": pages,
+        "per_page_s": round(per_page, 3),
+        "batched_s": round(batched, 3),
+        "speedup": round(per_page / batched, 2) if batched else None,
+    }
+
+
+if __name__ == "__main__":
+    # python -m app.services.suggestions <file.pdf> [pages]
+    import sys
+
+    result = benchmark_spacy(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 50)
+    print(
+        f"{result['pages']} pages: per-page {result['per_page_s']}s, "
+        f"nlp.pipe {result['batched_s']}s ({result['speedup']}x)"
+    )
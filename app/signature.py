@@ -1,17 +1,10 @@
 import os
-import sqlite3
 from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash
+from app.database import get_conn
 
 signature_bp = Blueprint("signature", __name__, url_prefix="/signature")
 
 
-def get_conn():
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 # ---------------------------------------------------------
 # LIST
 # ---------------------------------------------------------
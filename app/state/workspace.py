@@ -1,14 +1,5 @@
-import sqlite3
 from datetime import datetime
-from flask import current_app
-
-
-def get_conn():
-    """Return a SQLite connection using the app's configured DB path."""
-    db_path = current_app.config["DATABASE"]
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+from app.database import get_conn
 
 
 def open_document(filename, display_name):
@@ -23,17 +14,6 @@ def open_document(filename, display_name):
     with get_conn() as conn:
         c = conn.cursor()
 
-        # Ensure table exists
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS open_documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT,
-                display_name TEXT,
-                active INTEGER,
-                opened TEXT
-            )
-        """)
-
         # Deactivate all
         c.execute("UPDATE open_documents SET active=0")
 
@@ -68,17 +48,6 @@ def list_documents():
     with get_conn() as conn:
         c = conn.cursor()
 
-        # Ensure table exists
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS open_documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT,
-                display_name TEXT,
-                active INTEGER,
-                opened TEXT
-            )
-        """)
-
         rows = c.execute(
             "SELECT id, filename, display_name, active FROM open_documents ORDER BY opened ASC"
         ).fetchall()
@@ -100,17 +69,6 @@ def set_active(filename):
     with get_conn() as conn:
         c = conn.cursor()
 
-        # Ensure table exists
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS open_documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT,
-                display_name TEXT,
-                active INTEGER,
-                opened TEXT
-            )
-        """)
-
         c.execute("UPDATE open_documents SET active=0")
         c.execute("UPDATE open_documents SET active=1 WHERE filename=?", (filename,))
         conn.commit()
@@ -122,26 +80,6 @@ def close_document(filename):
     with get_conn() as conn:
         c = conn.cursor()
 
-        # Ensure tables exist
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS open_documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT,
-                display_name TEXT,
-                active INTEGER,
-                opened TEXT
-            )
-        """)
-
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS redaction_preview (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT,
-                page INTEGER,
-                preview_path TEXT
-            )
-        """)
-
         # Remove document
         c.execute("DELETE FROM open_documents WHERE filename=?", (filename,))
 
@@ -1,20 +1,38 @@
 import os
 import uuid
+import hashlib
 from flask import current_app
 from werkzeug.utils import secure_filename
 
+from app.services.blob_store import add_alias, has_blob
+
+DEFAULT_MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """Raised by save_upload() when a file exceeds the size limit."""
+
 
 # ------------------------------------------------------------
 # SAVE UPLOAD
 # ------------------------------------------------------------
 
-def save_upload(file, module="default"):
+def save_upload(file, module="default", max_bytes=None):
     """
     Save an uploaded PDF or image into the uploads folder.
+    The file is streamed to disk in chunks and hashed on the way, then
+    handed to the blob store: content seen before is not stored again,
+    the new filename just becomes another alias of the existing blob.
+    Files larger than max_bytes (default: app.config["MAX_UPLOAD_BYTES"])
+    are discarded and UploadTooLarge is raised.
     Returns: (filename, full_path)
     """
     fname = secure_filename(file.filename)
-    ext = os.path.splitext(fname)[1]
+    ext = os.path.splitext(fname)[1].lower()
+
+    if max_bytes is None:
+        max_bytes = current_app.config.get("MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES)
 
     # Unique filename
     new_name = f"{module}_{uuid.uuid4().hex[:8]}{ext}"
@@ -23,11 +41,57 @@ def save_upload(file, module="default"):
     os.makedirs(upload_dir, exist_ok=True)
 
     full_path = os.path.join(upload_dir, new_name)
-    file.save(full_path)
+    part_path = full_path + ".part"
+
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(part_path, "wb") as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(
+                        f"File too large (limit {max_bytes // (1024 * 1024)} MB)"
+                    )
+                h.update(chunk)
+                out.write(chunk)
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
 
+    add_alias(
+        new_name,
+        h.hexdigest(),
+        src_path=part_path,
+        size=size,
+        ext=ext,
+        original_name=file.filename,
+        module=module,
+    )
     return new_name, full_path
 
 
+def save_alias(sha256, original_name, module="default"):
+    """
+    Register a new upload for content already in the blob store, without
+    receiving the file again. Returns (filename, full_path), or
+    (None, None) if no blob with that SHA-256 exists.
+    """
+    blob = has_blob(sha256)
+    if not blob:
+        return None, None
+
+    new_name = f"{module}_{uuid.uuid4().hex[:8]}{blob['ext']}"
+    try:
+        add_alias(new_name, sha256, original_name=original_name, module=module)
+    except FileNotFoundError:
+        # Collected between the lookup and the link
+        return None, None
+
+    return new_name, os.path.join(current_app.config["UPLOAD_FOLDER"], new_name)
+
+
 # ------------------------------------------------------------
 # TEMP IMAGE PATH (for thumbnails)
 # ------------------------------------------------------------
@@ -360,51 +360,96 @@ document.getElementById('applyPreview').onclick = () => {
    AI SUGGESTIONS
    ============================================================ */
 
+// Only the most recent job updates the sidebar
+let suggestionJob = null;
+
+function addSuggestionButton(box, s) {
+  const btn = document.createElement('button');
+  btn.className = 'btn btn-sm btn-outline-primary me-2 mb-2';
+  btn.textContent = `${s.label}: ${s.text}`;
+
+  btn.onclick = () => {
+    if (s.rects && s.rects.length) {
+      // Normalized page boxes (one per line), no text search needed
+      const boxes = s.rects.map(r => ({
+        type: 'area',
+        page: s.page,
+        x: r[0],
+        y: r[1],
+        width: r[2] - r[0],
+        height: r[3] - r[1]
+      }));
+      previewBoxes.push(...boxes);
+      savePreview(boxes);
+      drawOverlay();
+    } else if (s.bbox && s.bbox.length === 4) {
+      const b = {
+        type: 'area',
+        page: s.page,
+        x: s.bbox[0] / canv.width,
+        y: s.bbox[1] / canv.height,
+        width: (s.bbox[2] - s.bbox[0]) / canv.width,
+        height: (s.bbox[3] - s.bbox[1]) / canv.height
+      };
+      previewBoxes.push(b);
+      savePreview([b]);
+      drawOverlay();
+    } else {
+      const b = {
+        type: 'text',
+        page: s.page,
+        x: 0,
+        y: 0,
+        width: 0,
+        height: 0,
+        text: s.text
+      };
+      previewBoxes.push(b);
+      savePreview([b]);
+      drawOverlay();
+    }
+  };
+
+  box.appendChild(btn);
+}
+
 function loadSuggestions() {
   const ocr = document.getElementById('ocrToggle').checked ? 1 : 0;
+  const box = document.getElementById('suggestions');
+  box.innerHTML = '';
 
-  fetch(`/redactor/suggestions/${filename}?ocr=${ocr}`)
+  // Runs as a background job; pages show up here as they finish
+  fetch(`/redactor/suggestions/start/${filename}?ocr=${ocr}`, { method: 'POST' })
     .then(r => r.json())
     .then(d => {
+      if (!d.success) return;
+      suggestionJob = d.job_id;
+      pollSuggestions(d.job_id, -1);
+    });
+}
+
+function pollSuggestions(jobId, after) {
+  if (jobId !== suggestionJob) return;
+
+  fetch(`/redactor/suggestions/status/${jobId}?after=${after}`)
+    .then(r => r.json())
+    .then(d => {
+      if (!d.success || jobId !== suggestionJob) return;
+
       const box = document.getElementById('suggestions');
-      box.innerHTML = '';
-
-      (d.suggestions || []).forEach(s => {
-        const btn = document.createElement('button');
-        btn.className = 'btn btn-sm btn-outline-primary me-2 mb-2';
-        btn.textContent = `${s.label}: ${s.text}`;
-
-        btn.onclick = () => {
-          if (s.bbox && s.bbox.length === 4) {
-            const b = {
-              type: 'area',
-              page: s.page,
-              x: s.bbox[0] / canv.width,
-              y: s.bbox[1] / canv.height,
-              width: (s.bbox[2] - s.bbox[0]) / canv.width,
-              height: (s.bbox[3] - s.bbox[1]) / canv.height
-            };
-            previewBoxes.push(b);
-            savePreview([b]);
-            drawOverlay();
-          } else {
-            const b = {
-              type: 'text',
-              page: s.page,
-              x: 0,
-              y: 0,
-              width: 0,
-              height: 0,
-              text: s.text
-            };
-            previewBoxes.push(b);
-            savePreview([b]);
-            drawOverlay();
-          }
-        };
-
-        box.appendChild(btn);
-      });
+      (d.suggestions || []).forEach(s => addSuggestionButton(box, s));
+
+      const progress = document.getElementById('suggestionsProgress');
+      const running = d.status === 'queued' || d.status === 'running';
+      if (progress) {
+        progress.textContent = running
+          ? `Analyzing page ${d.pages_done} of ${d.pages_total || '?'}…`
+          : (d.status === 'error' ? `Suggestions failed: ${d.error}` : '');
+      }
+
+      if (running) {
+        setTimeout(() => pollSuggestions(jobId, d.last_page), 1000);
+      }
     });
 }
 